@@ -24,11 +24,129 @@ class Settings(BaseSettings):
     # Paths
     project_root: Path = Field(default_factory=lambda: Path(__file__).resolve().parents[3])
     frontend_dir: Path = Field(default_factory=lambda: Path(__file__).resolve().parents[3] / "frontend")
+    # Local state (job journal, caches); ignored by git
+    data_dir: Path = Field(default_factory=lambda: Path(__file__).resolve().parents[2] / "data")
+
+    # State shared by uvicorn workers: rate limits, per-chat send locks, caches,
+    # idempotency keys and job claims. "memory" keeps it per process (one worker);
+    # "sqlite" shares it between the workers on this host through a WAL database
+    shared_state: str = Field(default="memory")
+    shared_state_path: Path | None = Field(default=None)  # defaults to <data_dir>/state.sqlite3
+    shared_state_lock_ttl: float = Field(default=30.0)  # locks of a crashed worker expire after this
+    # How often workers look for progress made by other workers (job events, scheduled posts)
+    shared_state_poll: float = Field(default=1.0)
 
     # Telegram
     telegram_bot_token: str | None = Field(default=None)
     telegram_channel_id: str | None = Field(default=None)
 
+    # Telegram HTTP client (shared, keep-alive)
+    telegram_api_base: str = Field(default="https://api.telegram.org")
+    telegram_http2: bool = Field(default=False)
+    telegram_timeout: float = Field(default=30.0)
+    telegram_upload_timeout: float = Field(default=60.0)
+    telegram_connect_timeout: float = Field(default=10.0)
+    telegram_max_connections: int = Field(default=100)
+    telegram_max_keepalive_connections: int = Field(default=20)
+    telegram_keepalive_expiry: float = Field(default=30.0)
+
+    # getMe/getChat cache used by channel status checks
+    telegram_info_cache_ttl: float = Field(default=300.0)
+    telegram_info_cache_stale_ttl: float = Field(default=3600.0)
+    telegram_info_cache_size: int = Field(default=1024)
+    channel_status_concurrency: int = Field(default=10)
+    # Channel registry: getChat metadata refreshed in the background, .env checked for channel changes
+    channels_refresh_interval: float = Field(default=300.0)
+    channels_config_poll: float = Field(default=5.0)
+
+    # Decoded data-URL images above this size are spooled to a temp file
+    media_spool_max_bytes: int = Field(default=1024 * 1024)
+
+    # orjson request decoding and response encoding on the publish and channels routers (needs orjson)
+    fast_json: bool = Field(default=True)
+
+    # Images uploaded to POST /api/media, stored by content hash
+    media_dir: Path | None = Field(default=None)  # defaults to <data_dir>/media
+    media_max_bytes: int = Field(default=20 * 1024 * 1024)
+    # Total size of stored uploads; uploads past it get 507 (0 = unlimited)
+    media_max_total_bytes: int = Field(default=2 * 1024 * 1024 * 1024)
+    # Images no draft, job or scheduled post refers to are deleted this long after their last use (0 = keep)
+    media_retention_seconds: float = Field(default=30 * 24 * 3600)
+    media_gc_interval: float = Field(default=3600.0)
+
+    # Downscale / re-encode uploads to Telegram photo limits (needs Pillow)
+    image_normalize: bool = Field(default=True)
+    image_workers: int = Field(default=2)
+    image_max_side: int = Field(default=2560)
+    image_reencode_min_bytes: int = Field(default=512 * 1024)  # larger non-JPEGs become JPEG
+    image_jpeg_quality: int = Field(default=87)
+    image_cache_size: int = Field(default=256)
+    image_cache_max_bytes: int = Field(default=64 * 1024 * 1024)
+
+    # Content hash -> Telegram file_id cache; set a path to persist it in SQLite
+    file_id_cache_size: int = Field(default=10000)
+    file_id_cache_path: Path | None = Field(default=None)
+
+    # Memoized /api/publish/validate results, keyed by content hash
+    validation_cache_size: int = Field(default=512)
+
+    # Text longer than one message or photo caption continues in up to this many messages
+    publish_max_text_parts: int = Field(default=10)
+
+    # Max channels delivered to in parallel by POST /api/publish/fanout
+    fanout_concurrency: int = Field(default=5)
+
+    # Idempotency-Key on POST /api/publish and /api/publish/fanout: keys remembered, and for how long
+    idempotency_max_keys: int = Field(default=1024)
+    idempotency_ttl: float = Field(default=24 * 3600)
+
+    # Outbound rate limiting (token buckets) and 429 retries
+    telegram_rate_limit: bool = Field(default=True)
+    telegram_global_rate: float = Field(default=30.0)  # messages/s per bot
+    telegram_group_chat_rate_per_minute: float = Field(default=20.0)
+    telegram_group_chat_burst: int = Field(default=20)
+    telegram_private_chat_rate: float = Field(default=1.0)  # messages/s
+    telegram_max_retries: int = Field(default=5)
+    telegram_max_retry_after: float = Field(default=120.0)
+
+    # Background publish jobs (POST /api/publish with "background": true)
+    jobs_enabled: bool = Field(default=True)
+    jobs_db_path: Path | None = Field(default=None)  # defaults to <data_dir>/jobs.sqlite3
+    jobs_workers: int = Field(default=4)
+    jobs_retention_seconds: float = Field(default=7 * 24 * 3600)
+    # Keep-alive comment interval on idle /api/publish/jobs/{id}/events streams
+    jobs_events_heartbeat: float = Field(default=15.0)
+
+    # Scheduled posts (/api/schedule), published through the job queue
+    scheduler_enabled: bool = Field(default=True)
+    scheduler_db_path: Path | None = Field(default=None)  # defaults to <data_dir>/schedule.sqlite3
+    scheduler_channel_concurrency: int = Field(default=1)  # publish jobs in flight per channel
+
+    # Message ids of published notes (SQLite), so republishing a note edits only the parts that changed
+    republish_enabled: bool = Field(default=True)
+    published_db_path: Path | None = Field(default=None)  # defaults to <data_dir>/published.sqlite3
+
+    # Server-side drafts at /api/drafts (SQLite); off keeps drafts in the browser only
+    drafts_enabled: bool = Field(default=False)
+    drafts_db_path: Path | None = Field(default=None)  # defaults to <data_dir>/drafts.sqlite3
+
+    # Frontend served from memory, precompressed; disable to pick up edits without a restart
+    frontend_precompress: bool = Field(default=True)
+    # Gzip API responses at least this large (0 disables)
+    gzip_minimum_size: int = Field(default=1024)
+    gzip_level: int = Field(default=6)
+
+    # Prometheus metrics at GET /metrics
+    metrics_enabled: bool = Field(default=True)
+
+    # Sampling profiles of slow requests (needs pyinstrument), written to <data_dir>/profiles
+    profiling_enabled: bool = Field(default=False)  # profile requests matching profiling_paths
+    profiling_header: bool = Field(default=False)  # also profile requests sending "X-Profile: 1"
+    profiling_paths: List[str] = Field(default_factory=lambda: ["/api/publish"])
+    profiling_min_seconds: float = Field(default=1.0)  # keep only profiles of requests this slow
+    profiling_interval: float = Field(default=0.001)  # sampling interval in seconds
+    profiling_max_files: int = Field(default=50)
+
     # Channels config (stateless)
     # Provide channels via env var TELEGRAM_CHANNELS as JSON, e.g.:
     #   [{"id":"-100123456","name":"My Channel"}, {"id":"@mychannel","name":"Public"}]
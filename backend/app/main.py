@@ -1,14 +1,24 @@
 from __future__ import annotations
 
+import asyncio
 import os
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from .core.config import settings
-from .routers import channels, publish
+from .routers import channels, drafts, media, publish, schedule
+from .services import drafts as draft_store, metrics, published, telegram
+from .services.channels import channel_registry
+from .services.frontend import FrontendFiles
+from .services.images import image_normalizer
+from .services.jobs import publish_jobs
+from .services.media_gc import media_collector
+from .services.profiling import ProfilingMiddleware
+from .services.scheduler import post_scheduler
+from .services.sse import EventStreamGZipMiddleware
 
 
 app = FastAPI(title=settings.app_name, debug=settings.debug)
@@ -20,17 +30,66 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile"],
 )
+# Compresses large responses; images and precompressed static files (Content-Encoding set) are skipped
+# and event streams pass through uncompressed
+if settings.gzip_minimum_size > 0:
+    app.add_middleware(EventStreamGZipMiddleware, minimum_size=settings.gzip_minimum_size, compresslevel=settings.gzip_level)
+# The last middleware added runs outermost, so metrics include profiling overhead
+app.add_middleware(ProfilingMiddleware)
+if settings.metrics_enabled:
+    app.add_middleware(metrics.MetricsMiddleware)
 
 # Routers under /api
 app.include_router(channels.router, prefix="/api")
 app.include_router(publish.router, prefix="/api")
+app.include_router(drafts.router, prefix="/api")
+app.include_router(schedule.router, prefix="/api")
+# POST /api/media and GET /media/<sha256>
+app.include_router(media.router)
+
+
+if settings.metrics_enabled:
+    @app.get("/metrics", include_in_schema=False)
+    def get_metrics() -> Response:
+        body, content_type = metrics.render()
+        return Response(content=body, media_type=content_type)
 
 
 @app.on_event("startup")
-def on_startup() -> None:
-    # stateless backend - nothing to initialize
-    pass
+async def on_startup() -> None:
+    # Shared keep-alive client for all Telegram API calls
+    await telegram.init_client()
+    # Parse TELEGRAM_CHANNELS once and warm channel metadata in the background
+    await channel_registry.start()
+    if frontend_files is not None:
+        # Read and compress the frontend once, off the event loop
+        await asyncio.to_thread(frontend_files.load)
+    if settings.drafts_enabled:
+        await asyncio.to_thread(draft_store.init_store)
+    if settings.republish_enabled:
+        await asyncio.to_thread(published.init_store)
+    if settings.jobs_enabled:
+        # Also resumes jobs left unfinished by a previous run
+        await publish_jobs.start()
+        if settings.scheduler_enabled:
+            # Rebuilds the timer heap from the store; due posts go out right away
+            await post_scheduler.start()
+    # Expires unused uploads; started last so it sees every store that can refer to them
+    await media_collector.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    await channel_registry.stop()
+    await media_collector.stop()
+    await post_scheduler.stop()
+    await publish_jobs.stop()
+    draft_store.close_store()
+    published.close_store()
+    image_normalizer.shutdown()
+    await telegram.close_client()
 
 # Static files (frontend) and media
 frontend_dir = settings.frontend_dir
@@ -39,4 +98,6 @@ if not frontend_dir.exists():
     candidate = Path(__file__).resolve().parents[3] / "frontend"
     frontend_dir = candidate if candidate.exists() else Path(os.getcwd()) / "frontend"
 
-app.mount("/", StaticFiles(directory=frontend_dir, html=True), name="frontend")
+# Served from memory with gzip/brotli variants and hashed, immutable asset URLs
+frontend_files = FrontendFiles(frontend_dir) if settings.frontend_precompress else None
+app.mount("/", frontend_files or StaticFiles(directory=frontend_dir, html=True), name="frontend")
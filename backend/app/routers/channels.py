@@ -1,26 +1,61 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, Header, HTTPException, Response
+from typing import Dict, Any, Optional
 from pydantic import BaseModel
 
 from ..core.config import settings
-from ..services.telegram import get_bot_info, verify_channel_access
+from ..services.channels import channel_registry, check_channels, content_version
+from ..services.etag import etag_matches
+from ..services.fastjson import FastJSONResponse, FastJSONRoute
+from ..services.telegram import verify_channel_access
 
-router = APIRouter(prefix="/channels", tags=["channels"])
+router = APIRouter(prefix="/channels", tags=["channels"], route_class=FastJSONRoute)
 
 
 class ChannelStatusRequest(BaseModel):
     channels: list[dict[str, str]]
     token: str
+    refresh: bool = False  # Bypass the getMe/getChat cache
+    # Version of a status this client already has; answered with just the version if unchanged
+    version: str | None = None
+
+
+def _versioned(content: Any, version: str, if_none_match: Optional[str]) -> Response:
+    # Returning a Response (not a model) keeps these on FastJSONRoute's one-pass encoding path
+    headers = {"ETag": f'"{version}"', "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(content, headers=headers)
+
 
 @router.get("/")
-def list_channels() -> list[dict[str, str]]:
-    return settings.get_channels()
+def list_channels(if_none_match: Optional[str] = Header(default=None)) -> Response:
+    """Configured channels with their ``getChat`` title, username and photo, once known.
+
+    Served from the channel registry; ``If-None-Match`` answers ``304`` while
+    the list is unchanged.
+    """
+    channels, version = channel_registry.channels()
+    return _versioned(channels, version, if_none_match)
+
+
+@router.get("/status")
+async def get_configured_status(refresh: bool = False, if_none_match: Optional[str] = Header(default=None)) -> Response:
+    """Status of the configured bot and channels, from memory."""
+    status = await channel_registry.configured_status(refresh=refresh)
+    return _versioned(status, status["version"], if_none_match)
+
 
 @router.post("/status")
 async def get_channels_status(payload: ChannelStatusRequest) -> Dict[str, Any]:
-    """Get status of all configured channels including bot verification."""
+    """Get status of all configured channels including bot verification.
+
+    Channels already checked for this token are answered from the channel
+    registry, which refreshes them in the background. Send the ``version``
+    of an earlier response to get ``{"version", "unchanged": true}`` back
+    while nothing changed.
+    """
     channels = payload.channels
     token = payload.token
     
@@ -30,56 +65,15 @@ async def get_channels_status(payload: ChannelStatusRequest) -> Dict[str, Any]:
             "error": "Telegram bot token not configured",
             "channels": []
         }
-    
-    # Verify bot token
-    try:
-        bot_info = await get_bot_info(token)
-        bot_configured = bot_info.get("ok", False)
-        bot_username = bot_info.get("result", {}).get("username", "Unknown")
-    except Exception as e:
-        return {
-            "bot_configured": False,
-            "error": f"Failed to verify bot token: {str(e)}",
-            "channels": []
-        }
-    
-    # Check each channel
-    channel_statuses = []
-    for channel in channels:
-        channel_id = channel.get("id")
-        channel_name = channel.get("name")
-        
-        if not channel_id:
-            channel_statuses.append({
-                "id": channel_id,
-                "name": channel_name,
-                "accessible": False,
-                "error": "Channel ID not provided"
-            })
-            continue
-            
-        try:
-            access_result = await verify_channel_access(token, channel_id)
-            channel_statuses.append({
-                "id": channel_id,
-                "name": channel_name,
-                "accessible": access_result.get("accessible", False),
-                "chat_info": access_result.get("chat", {}),
-                "error": access_result.get("error") if not access_result.get("accessible") else None
-            })
-        except Exception as e:
-            channel_statuses.append({
-                "id": channel_id,
-                "name": channel_name,
-                "accessible": False,
-                "error": f"Failed to check channel access: {str(e)}"
-            })
-    
-    return {
-        "bot_configured": bot_configured,
-        "bot_username": bot_username,
-        "channels": channel_statuses
-    }
+
+    if all(channel.get("id") for channel in channels):
+        status = await channel_registry.status(token, channels, refresh=payload.refresh)
+    else:
+        status = await check_channels(token, channels, refresh=payload.refresh)
+        status["version"] = content_version(status)
+    if payload.version and payload.version == status["version"]:
+        return {"version": status["version"], "unchanged": True}
+    return status
 
 @router.post("/verify/{channel_id}")
 async def verify_channel(channel_id: str) -> Dict[str, Any]:
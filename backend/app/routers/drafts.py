@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Response
+from pydantic import BaseModel
+
+from ..services.drafts import DraftStore, VersionConflict, get_store
+from ..services.etag import etag_matches
+
+router = APIRouter(prefix="/drafts", tags=["drafts"])
+
+
+class DraftRequest(BaseModel):
+    channel_id: str
+    title: str = ""
+    content_html: str = ""
+    is_pinned: bool = False
+    created_at: float | None = None
+
+
+def _store() -> DraftStore:
+    store = get_store()
+    if store is None:
+        raise HTTPException(status_code=404, detail="Server-side drafts are disabled")
+    return store
+
+
+def _etag(value: int) -> str:
+    return f'"{value}"'
+
+
+def _if_version(if_match: Optional[str]) -> Optional[int]:
+    """Version from an ``If-Match: "<version>"`` header; ``None`` when absent or ``*``."""
+    if not if_match or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a draft version ETag")
+
+
+def _conflict(e: VersionConflict) -> HTTPException:
+    return HTTPException(status_code=412, detail={"message": "Draft was modified", "draft": e.current})
+
+
+@router.get("")
+def list_drafts(channel_id: str, response: Response, since: int = 0,
+                if_none_match: Optional[str] = Header(default=None)):
+    """Drafts of a channel changed after cursor ``since`` (all drafts for ``since=0``).
+
+    The ETag is the channel's latest cursor, so ``If-None-Match`` answers
+    ``304`` when nothing changed. Deleted drafts are listed by id in ``deleted``.
+    """
+    store = _store()
+    etag = _etag(store.cursor(channel_id))
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    drafts, deleted, cursor = store.changes(channel_id, since)
+    response.headers["ETag"] = _etag(cursor)
+    return {"cursor": cursor, "full": since == 0, "drafts": drafts, "deleted": deleted}
+
+
+@router.get("/{draft_id}")
+def get_draft(draft_id: str, response: Response, if_none_match: Optional[str] = Header(default=None)):
+    draft = _store().get(draft_id)
+    if draft is None:
+        raise HTTPException(status_code=404, detail="Draft not found")
+    etag = _etag(draft["version"])
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return draft
+
+
+@router.put("/{draft_id}")
+def put_draft(draft_id: str, payload: DraftRequest, response: Response,
+              if_match: Optional[str] = Header(default=None)) -> dict:
+    """Create or replace a draft. Send ``If-Match`` with its ETag to avoid overwriting newer edits."""
+    try:
+        draft = _store().put(
+            draft_id,
+            channel_id=payload.channel_id,
+            title=payload.title,
+            content_html=payload.content_html,
+            is_pinned=payload.is_pinned,
+            created_at=payload.created_at,
+            if_version=_if_version(if_match),
+        )
+    except VersionConflict as e:
+        raise _conflict(e)
+    response.headers["ETag"] = _etag(draft["version"])
+    return draft
+
+
+@router.delete("/{draft_id}")
+def delete_draft(draft_id: str, if_match: Optional[str] = Header(default=None)) -> dict:
+    try:
+        deleted = _store().delete(draft_id, if_version=_if_version(if_match))
+    except VersionConflict as e:
+        raise _conflict(e)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Draft not found")
+    return {"success": True}
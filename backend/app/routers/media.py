@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from ..core.config import settings
+from ..services.blobs import BlobTooLarge, BlobWriter, UnsupportedMedia, blob_store, sniff_image_type
+from ..services.etag import etag_matches
+from ..services.media_gc import media_collector
+
+router = APIRouter(tags=["media"])
+
+# Blobs never change under their hash
+_IMMUTABLE = "public, max-age=31536000, immutable"
+# Room for multipart boundaries and part headers on top of the file itself
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+async def _read_multipart(request: Request, writer: BlobWriter, boundary: bytes) -> None:
+    """Stream the first file part of a multipart body into ``writer``."""
+    state = {"header_field": b"", "header_value": b"", "is_file": False, "found": False}
+    headers: dict = {}
+    # File data from the last chunk, written once the parser returns
+    pending: list = []
+
+    def on_part_begin() -> None:
+        headers.clear()
+        state["is_file"] = False
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        state["header_value"] += data[start:end]
+
+    def on_header_end() -> None:
+        headers[state["header_field"].lower()] = state["header_value"]
+        state["header_field"] = state["header_value"] = b""
+
+    def on_headers_finished() -> None:
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        if b"filename" in options and not state["found"]:
+            state["is_file"] = state["found"] = True
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if state["is_file"]:
+            pending.append(data[start:end])
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+    async for chunk in request.stream():
+        parser.write(chunk)
+        for data in pending:
+            await writer.write(data)
+        pending.clear()
+    parser.finalize()
+    if not state["found"]:
+        raise ValueError("No file part in multipart body")
+
+
+@router.post("/api/media")
+async def upload_media(request: Request) -> JSONResponse:
+    """Store an image under its SHA-256 and return its ``/media/<sha256>`` URL.
+
+    Accepts ``multipart/form-data`` (the first file part is used) or the raw
+    image bytes as the body. The body is streamed to disk and hashed on the
+    way; identical uploads are stored once (``201`` when new, ``200`` when the
+    bytes were already there). ``507`` means the store is full of images
+    still in use.
+    """
+    max_bytes = settings.media_max_bytes
+    content_type = request.headers.get("content-type", "")
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes + _MULTIPART_OVERHEAD:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+
+    writer = await blob_store.writer(max_bytes)
+    try:
+        if content_type.startswith("multipart/form-data"):
+            _, options = parse_options_header(content_type)
+            boundary = options.get(b"boundary")
+            if not boundary:
+                raise ValueError("Missing multipart boundary")
+            await _read_multipart(request, writer, boundary)
+        else:
+            async for chunk in request.stream():
+                await writer.write(chunk)
+        # Re-uploads of stored bytes take no room
+        if not blob_store.exists(writer.digest) and not await media_collector.reserve(writer.size):
+            raise HTTPException(status_code=507, detail="Media storage is full")
+        blob = await writer.commit()
+    except BlobTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedMedia as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid upload: {e}")
+    finally:
+        await writer.abort()
+
+    return JSONResponse(status_code=201 if blob.created else 200, content={
+        "success": True,
+        "sha256": blob.sha256,
+        "url": blob.url,
+        "size": blob.size,
+        "mime": blob.mime,
+        "created": blob.created,
+    })
+
+
+@router.api_route("/media/{digest}", methods=["GET", "HEAD"], include_in_schema=False)
+def get_media(digest: str, if_none_match: Optional[str] = Header(default=None)) -> Response:
+    """Serve a stored blob; clients can also ``HEAD`` it to skip re-uploading."""
+    if not blob_store.exists(digest):
+        raise HTTPException(status_code=404, detail="Media not found")
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": _IMMUTABLE}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    path = blob_store.path(digest)
+    with open(path, "rb") as f:
+        mime = sniff_image_type(f.read(16)) or "application/octet-stream"
+    return FileResponse(path, media_type=mime, headers=headers)
@@ -1,13 +1,48 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
+import hashlib
+import json
+import re
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Awaitable, Callable, Optional, Tuple
 
-from ..services.telegram import publish_content, verify_channel_access, validate_content_length, extract_image_srcs
+from ..services.cache import LRUCache, token_hash
+from ..services.drafts import get_store as get_draft_store
+from ..services.fastjson import FastJSONResponse, FastJSONRoute
+from ..services.formatting import convert_html
+from ..services.idempotency import IdempotencyConflict, publish_idempotency, request_fingerprint
+from ..services.jobs import publish_jobs
+from ..services.sse import EVENT_STREAM, KEEP_ALIVE, format_event
+from ..services.state import shared_state
+from ..services.telegram import publish_content, publish_to_channels, validate_converted, verify_channel_access
 from ..core.config import settings
 
-router = APIRouter(prefix="/publish", tags=["publish"])
+router = APIRouter(prefix="/publish", tags=["publish"], route_class=FastJSONRoute)
+
+# content hash -> /validate response; shared by workers through shared_state when it is shared
+_validation_cache = LRUCache(settings.validation_cache_size)
+_VALIDATION_SHARED_TTL = 24 * 3600
+# A numeric chat id (-100... for channels) or an @username
+_CHAT_ID_RE = re.compile(r"-?\d+|@\w+")
+
+
+async def _cached_validation(key: str) -> dict | None:
+    cached = _validation_cache.get(key)
+    if cached is None and shared_state.shared:
+        raw = await shared_state.get(f"validate:{key}")
+        if raw is not None:
+            cached = json.loads(raw)
+            _validation_cache.put(key, cached)
+    return cached
+
+
+async def _cache_validation(key: str, response: dict) -> None:
+    _validation_cache.put(key, response)
+    if shared_state.shared:
+        await shared_state.set(f"validate:{key}", json.dumps(response), _VALIDATION_SHARED_TTL)
 
 
 class PublishRequest(BaseModel):
@@ -16,26 +51,129 @@ class PublishRequest(BaseModel):
     channel_id: str
     title: str | None = None
     content_html: str | None = None
+    draft_id: str | None = None  # Publish a server-side draft instead of content_html
     token: str | None = None
     verify_channel: bool = True  # Whether to verify channel access before publishing
+    background: bool = False  # Return 202 with a job id and publish in the background
+    # Republishing a note edits the messages it was sent as; defaults to draft_id
+    note_id: str | None = None
+    edit_published: bool = True
+
+
+class FanoutRequest(BaseModel):
+    telegram_bot_token: str
+    channel_ids: list[str]
+    title: str | None = None
+    content_html: str | None = None
+    draft_id: str | None = None
+    verify_channel: bool = True
+    note_id: str | None = None
+    edit_published: bool = True
+
+
+class ValidateRequest(BaseModel):
+    title: str | None = None
+    content_html: str | None = None
+    draft_id: str | None = None
+    # Hash returned by an earlier validate call; enough on its own if the content is unchanged
+    content_hash: str | None = None
+    # Number of images the client removed from content_html before sending it
+    image_count: int | None = None
+
+
+def _content_html(content_html: str | None, draft_id: str | None) -> str:
+    """Note HTML from the request, or from the server-side draft it names."""
+    if not draft_id:
+        return content_html or ""
+    store = get_draft_store()
+    draft = store.get(draft_id) if store is not None else None
+    if draft is None:
+        raise HTTPException(status_code=404, detail="Draft not found")
+    return draft["content_html"]
 
 
 @router.post("")
-async def publish_endpoint(payload: PublishRequest) -> dict:
+async def publish_endpoint(payload: PublishRequest, request: Request,
+                           idempotency_key: Optional[str] = Header(default=None)) -> FastJSONResponse:
+    """Publish a note to one channel.
+
+    With an ``Idempotency-Key`` header, a retry with the same key and request
+    attaches to the publish still running (or its background job) or returns
+    its stored response, marked ``Idempotent-Replayed: true``, instead of
+    sending the post again.
+    """
+    if not idempotency_key:
+        status_code, content = await _publish(payload, request)
+        return FastJSONResponse(content, status_code=status_code)
+    return await _idempotent(
+        f"publish:{token_hash(payload.telegram_bot_token)}:{idempotency_key}",
+        payload.model_dump(exclude={"background", "verify_channel"}),
+        lambda: _publish(payload, request),
+    )
+
+
+async def _idempotent(key: str, request_fields: dict, call: Callable[[], Awaitable[Tuple[int, dict]]]) -> FastJSONResponse:
+    # Only successes are stored; an error (raised as HTTPException) forgets the key, so a fixed retry runs again
+    try:
+        (status_code, content), replayed = await publish_idempotency.run(key, request_fingerprint(request_fields), call)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    headers = {}
+    if replayed:
+        headers["Idempotent-Replayed"] = "true"
+        job = await publish_jobs.get(content["job_id"]) if "job_id" in content else None
+        if job is not None:
+            content = {**content, "job": job}
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
+
+
+def _channel_id(telegram_channel: str) -> str:
+    """Chat id of a ``"<name>=<chat id>"`` channel entry, as listed by ``/api/channels``."""
+    # Names may contain "=", chat ids never do
+    _, sep, channel_id = telegram_channel.rpartition("=")
+    channel_id = channel_id.strip()
+    if not sep or not channel_id:
+        raise HTTPException(status_code=400, detail="telegram_channel must be '<name>=<channel id>'")
+    if not _CHAT_ID_RE.fullmatch(channel_id):
+        raise HTTPException(status_code=400, detail=f"Invalid channel id: {channel_id!r}")
+    return channel_id
+
+
+async def _publish(payload: PublishRequest, request: Request) -> Tuple[int, dict]:
     # Use provided token or fall back to settings
     token = payload.telegram_bot_token
-    chennel_id = payload.telegram_channel.split("=")[1]
-    
+
     if not token:
         raise HTTPException(status_code=400, detail="Telegram bot token not provided")
-    
-    if not chennel_id:
-        raise HTTPException(status_code=400, detail="Channel ID is required")
+
+    channel_id = _channel_id(payload.telegram_channel)
+
+    content_html = _content_html(payload.content_html, payload.draft_id)
+
+    if payload.background:
+        if not publish_jobs.running:
+            raise HTTPException(status_code=503, detail="Background publishing is disabled")
+        job = await publish_jobs.submit(
+            token=token,
+            chat_id=channel_id,
+            html_content=content_html,
+            title=payload.title or "",
+            verify_channel=payload.verify_channel,
+            note_id=payload.note_id or payload.draft_id,
+            edit=payload.edit_published,
+        )
+        return 202, {
+            "success": True,
+            "message": "Publish job queued",
+            "job_id": job["id"],
+            "status_url": request.url_for("get_publish_job", job_id=job["id"]).path,
+            "job": job
+        }
     
     # Verify channel access if requested
     if payload.verify_channel:
         try:
-            verification = await verify_channel_access(token, chennel_id)
+            verification = await verify_channel_access(token, channel_id)
             if not verification.get("accessible", False):
                 raise HTTPException(
                     status_code=403, 
@@ -48,12 +186,14 @@ async def publish_endpoint(payload: PublishRequest) -> dict:
     
     try:
         result = await publish_content(
-            html_content=payload.content_html or "",
+            html_content=content_html,
             title=payload.title or "",
-            chat_id=chennel_id,
+            chat_id=channel_id,
             token=token,
+            note_id=payload.note_id or payload.draft_id,
+            edit=payload.edit_published,
         )
-        return {
+        return 200, {
             "success": True,
             "message": "Content published successfully",
             "result": result
@@ -64,6 +204,86 @@ async def publish_endpoint(payload: PublishRequest) -> dict:
         raise HTTPException(status_code=500, detail=f"Failed to publish content: {str(e)}")
 
 
+@router.get("/jobs/{job_id}")
+async def get_publish_job(job_id: str) -> dict:
+    """Status and per-part progress of a background publish job."""
+    job = await publish_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def publish_job_events(job_id: str) -> StreamingResponse:
+    """Server-Sent Events with a job's progress, one ``part`` event per sent part.
+
+    The stream opens with a ``job`` snapshot, so a reconnecting ``EventSource``
+    catches up, and closes after the final ``done`` or ``failed`` event.
+    """
+    if await publish_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        async for event, data in publish_jobs.watch(job_id, heartbeat=settings.jobs_events_heartbeat):
+            yield KEEP_ALIVE if event is None else format_event(event, data)
+
+    return StreamingResponse(stream(), media_type=EVENT_STREAM, headers={
+        "Cache-Control": "no-cache",
+        # Stop nginx from buffering the stream
+        "X-Accel-Buffering": "no",
+    })
+
+
+@router.post("/fanout")
+async def publish_fanout(payload: FanoutRequest, idempotency_key: Optional[str] = Header(default=None)) -> FastJSONResponse:
+    """Publish one note to several channels, preparing the content once.
+
+    Accepts an ``Idempotency-Key`` header like ``POST /api/publish``.
+    """
+    if not idempotency_key:
+        status_code, content = await _fanout(payload)
+        return FastJSONResponse(content, status_code=status_code)
+    return await _idempotent(
+        f"fanout:{token_hash(payload.telegram_bot_token)}:{idempotency_key}",
+        payload.model_dump(exclude={"verify_channel"}),
+        lambda: _fanout(payload),
+    )
+
+
+async def _fanout(payload: FanoutRequest) -> Tuple[int, dict]:
+    token = payload.telegram_bot_token
+    channel_ids = [c.strip() for c in payload.channel_ids if c and c.strip()]
+
+    if not token:
+        raise HTTPException(status_code=400, detail="Telegram bot token not provided")
+
+    if not channel_ids:
+        raise HTTPException(status_code=400, detail="At least one channel ID is required")
+
+    content_html = _content_html(payload.content_html, payload.draft_id)
+    try:
+        results = await publish_to_channels(
+            content_html,
+            payload.title or "",
+            token=token,
+            chat_ids=channel_ids,
+            verify_channel=payload.verify_channel,
+            note_id=payload.note_id or payload.draft_id,
+            edit=payload.edit_published,
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to publish content: {str(e)}")
+
+    published = sum(1 for r in results if r["ok"])
+    return 200, {
+        "success": published == len(results),
+        "message": f"Published to {published} of {len(results)} channels",
+        "results": results
+    }
+
+
 @router.post("/test")
 async def test_publish(payload: PublishRequest) -> dict:
     """Test publishing without actually sending the message."""
@@ -87,39 +307,59 @@ async def test_publish(payload: PublishRequest) -> dict:
         raise HTTPException(status_code=500, detail=f"Failed to test channel access: {str(e)}")
 
 
+def _content_hash(title: str, content_html: str, image_count: int) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{image_count}\0{title}\0".encode("utf-8"))
+    digest.update(content_html.encode("utf-8", "surrogatepass"))
+    return digest.hexdigest()
+
+
 @router.post("/validate")
-async def validate_content(payload: PublishRequest) -> dict:
-    """Validate content length against Telegram limits."""
+async def validate_content(payload: ValidateRequest) -> dict:
+    """Validate content length against Telegram limits.
+
+    Results are memoized by content hash. Clients can strip images and send
+    ``image_count`` instead, send only the ``content_hash`` of a previous call,
+    or name a server-side ``draft_id``.
+    """
+    if payload.content_html is None and payload.content_hash and not payload.draft_id:
+        cached = await _cached_validation(payload.content_hash)
+        if cached is None:
+            raise HTTPException(status_code=409, detail="Unknown content hash; resend content_html")
+        return cached
+
+    title = payload.title or ""
+    content_html = _content_html(payload.content_html, payload.draft_id)
+    image_count = max(0, payload.image_count or 0) if not payload.draft_id else 0
+    key = _content_hash(title, content_html, image_count)
+    cached = await _cached_validation(key)
+    if cached is not None:
+        return cached
+
     try:
-        # Extract images to determine if content has images
-        image_srcs = extract_image_srcs(payload.content_html or "")
-        has_images = len(image_srcs) > 0
-        
-        # Validate content length
-        validation = validate_content_length(
-            payload.content_html or "", 
-            payload.title or "", 
-            has_images
-        )
+        # One pass yields both the image list and the visible text length
+        converted = convert_html(content_html)
+        validation = validate_converted(converted, title, has_images=converted.has_images or image_count > 0)
         
-        return {
+        response = {
             "success": True,
             "validation": validation,
-            "recommendation": get_recommendation(validation)
+            "recommendation": get_recommendation(validation),
+            "content_hash": key
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to validate content: {str(e)}")
+    await _cache_validation(key, response)
+    return response
 
 
 def get_recommendation(validation: dict) -> str:
     """Get recommendation based on validation result."""
+    limit_type = validation["limit_type"]
     if validation["is_valid"]:
+        if validation["parts"] > 1:
+            return f"Content is longer than one {limit_type} ({validation['limit']:,} characters) and will be sent as {validation['parts']} messages. Ready to publish!"
         return "Content is within Telegram limits. Ready to publish!"
     
     exceeded_by = validation["exceeded_by"]
-    limit_type = validation["limit_type"]
-    
-    if limit_type == "image caption":
-        return f"⚠️ Content exceeds Telegram limit for image captions (1,024 characters). Please reduce content by {exceeded_by} characters, or remove images to use the 4,096 character limit for text-only messages."
-    else:
-        return f"⚠️ Content exceeds Telegram limit for text messages (4,096 characters). Please reduce content by {exceeded_by} characters."
+    return f"⚠️ Content would need {validation['parts']} messages (at most {validation['max_parts']} per post). Please reduce content by {exceeded_by} characters."
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+
+from ..services.formatting import convert_html
+from ..services.scheduler import ScheduleConflict, ScheduleStore, post_scheduler
+from ..services.telegram import validate_converted
+from .publish import _content_html, get_recommendation
+
+router = APIRouter(prefix="/schedule", tags=["schedule"])
+
+
+class ScheduleRequest(BaseModel):
+    telegram_bot_token: str
+    channel_id: str
+    # Unix timestamp or ISO 8601; naive times are UTC
+    publish_at: datetime
+    title: str | None = None
+    content_html: str | None = None
+    draft_id: str | None = None  # Snapshot of a server-side draft, taken now
+    verify_channel: bool = True
+
+
+class RescheduleRequest(BaseModel):
+    publish_at: datetime
+
+
+def _timestamp(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _store() -> ScheduleStore:
+    if not post_scheduler.running:
+        raise HTTPException(status_code=503, detail="Scheduled publishing is disabled")
+    return post_scheduler.store
+
+
+def _cursor(post: dict) -> str:
+    return f"{post['publish_at']!r}:{post['id']}"
+
+
+def _parse_cursor(cursor: str) -> tuple[float, str]:
+    publish_at, _, post_id = cursor.partition(":")
+    try:
+        return float(publish_at), post_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.post("", status_code=201)
+async def schedule_post(payload: ScheduleRequest, request: Request) -> dict:
+    """Schedule a note for ``publish_at``; posts due in the past go out right away.
+
+    The note is validated now, so a post that could never be sent is rejected
+    up front. Follow a handed-off post at ``/api/publish/jobs/{id}``.
+    """
+    _store()
+    if not payload.telegram_bot_token:
+        raise HTTPException(status_code=400, detail="Telegram bot token not provided")
+    if not payload.channel_id:
+        raise HTTPException(status_code=400, detail="Channel ID is required")
+    title = payload.title or ""
+    content_html = _content_html(payload.content_html, payload.draft_id)
+    converted = convert_html(content_html)
+    validation = validate_converted(converted, title)
+    if not validation["is_valid"]:
+        raise HTTPException(status_code=400, detail=get_recommendation(validation))
+
+    post = post_scheduler.schedule(
+        token=payload.telegram_bot_token,
+        chat_id=payload.channel_id,
+        html_content=content_html,
+        title=title,
+        publish_at=_timestamp(payload.publish_at),
+        verify_channel=payload.verify_channel,
+    )
+    return {**post, "job_url": request.url_for("get_publish_job", job_id=post["id"]).path}
+
+
+@router.get("")
+def list_scheduled(channel_id: Optional[str] = None, status: Optional[str] = "scheduled",
+                   after: Optional[str] = None, limit: int = 100) -> dict:
+    """Posts in publish order, ``limit`` at a time.
+
+    Pass the returned ``next`` as ``after`` for the following page. ``status``
+    defaults to pending posts; send an empty value to list every status.
+    """
+    limit = max(1, min(limit, 1000))
+    posts = _store().list(
+        channel_id=channel_id,
+        status=status or None,
+        after=_parse_cursor(after) if after else None,
+        limit=limit,
+    )
+    return {"posts": posts, "next": _cursor(posts[-1]) if len(posts) == limit else None}
+
+
+@router.get("/{post_id}")
+def get_scheduled(post_id: str) -> dict:
+    post = _store().get(post_id)
+    if post is None:
+        raise HTTPException(status_code=404, detail="Scheduled post not found")
+    return post
+
+
+# Async so the timer heap is only touched from the event loop
+@router.patch("/{post_id}")
+async def reschedule_post(post_id: str, payload: RescheduleRequest) -> dict:
+    """Move a pending post to a new ``publish_at``."""
+    _store()
+    try:
+        post = post_scheduler.reschedule(post_id, _timestamp(payload.publish_at))
+    except ScheduleConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if post is None:
+        raise HTTPException(status_code=404, detail="Scheduled post not found")
+    return post
+
+
+@router.delete("/{post_id}")
+async def cancel_post(post_id: str) -> dict:
+    """Cancel a pending post. Posts already handed to the job queue can't be cancelled."""
+    _store()
+    try:
+        post = post_scheduler.cancel(post_id)
+    except ScheduleConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if post is None:
+        raise HTTPException(status_code=404, detail="Scheduled post not found")
+    return post
@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AbstractSet, Any, BinaryIO, Callable, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
+
+from ..core.config import settings
+
+# /media/<sha256>, optionally as an absolute URL on this server
+_MEDIA_URL_RE = re.compile(r"^(?:https?://[^/]+)?/media/([0-9a-f]{64})$")
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+# /media/<sha256> anywhere in stored HTML or JSON
+_MEDIA_REF_RE = re.compile(r"/media/([0-9a-f]{64})")
+# Leading bytes -> mime; only formats Telegram accepts as photos are stored
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+_SNIFF_BYTES = 16
+# A fresh upload may not be saved in a draft yet, so sweeps leave it alone for a while
+_SWEEP_MIN_AGE = 3600.0
+# Temp files of uploads cut off by a crash
+_STALE_UPLOAD_AGE = 24 * 3600.0
+
+T = TypeVar("T")
+
+
+class BlobTooLarge(Exception):
+    pass
+
+
+class UnsupportedMedia(Exception):
+    pass
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    for signature, mime in _SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def media_digest(src: str) -> Optional[str]:
+    """Content hash referenced by a ``/media/<sha256>`` image URL, if any."""
+    m = _MEDIA_URL_RE.match(src)
+    return m.group(1) if m else None
+
+
+def is_digest(value: str) -> bool:
+    return bool(_DIGEST_RE.match(value))
+
+
+def referenced_digests(texts: Iterable[str]) -> Set[str]:
+    """Content hashes of every ``/media/<sha256>`` URL in ``texts``."""
+    found: Set[str] = set()
+    for text in texts:
+        found.update(_MEDIA_REF_RE.findall(text))
+    return found
+
+
+@dataclass
+class StoredBlob:
+    sha256: str
+    size: int
+    mime: str
+    created: bool  # False when identical bytes were already stored
+
+    @property
+    def url(self) -> str:
+        return f"/media/{self.sha256}"
+
+
+class StoredImage:
+    """A stored blob opened for upload; same interface as ``media.DecodedImage``.
+
+    The file is streamed from disk into the multipart body by httpx, so memory
+    use does not grow with image size.
+    """
+
+    in_memory = False
+
+    def __init__(self, path: Path, sha256: str) -> None:
+        self.file: BinaryIO = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.mime = sniff_image_type(self.file.read(_SNIFF_BYTES)) or "application/octet-stream"
+        self.closed = False
+        self._sha256 = sha256
+
+    @property
+    def filename(self) -> str:
+        return f"image.{self.mime.split('/')[-1]}"
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256
+
+    def rewind(self) -> BinaryIO:
+        self.file.seek(0)
+        return self.file
+
+    def read(self) -> bytes:
+        return self.rewind().read()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.file.close()
+
+    def __enter__(self) -> "StoredImage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class BlobWriter:
+    """Streams an upload to a temp file, hashing and size-checking as it goes.
+
+    Created with ``await BlobStore.writer()``; file I/O runs on the store's thread.
+    """
+
+    def __init__(self, store: "BlobStore", max_bytes: int) -> None:
+        self._store = store
+        self._max_bytes = max_bytes
+        self._hash = hashlib.sha256()
+        self._head = b""
+        self.size = 0
+        store.tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(dir=store.tmp_dir, prefix="upload-")
+        self._file = os.fdopen(fd, "wb")
+        self._tmp_path = Path(name)
+
+    async def write(self, chunk: bytes) -> None:
+        if chunk:
+            await self._store._run(self._write, chunk)
+
+    async def commit(self) -> StoredBlob:
+        return await self._store._run(self._commit)
+
+    async def abort(self) -> None:
+        """Discard the upload; a no-op after ``commit``."""
+        await self._store._run(self._abort)
+
+    def _write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self._max_bytes:
+            raise BlobTooLarge(f"Upload exceeds {self._max_bytes} bytes")
+        if len(self._head) < _SNIFF_BYTES:
+            self._head += chunk[:_SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= _SNIFF_BYTES and sniff_image_type(self._head) is None:
+                # Reject early instead of storing the rest of a non-image
+                raise UnsupportedMedia("Only JPEG, PNG, GIF and WebP images are accepted")
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    @property
+    def digest(self) -> str:
+        """SHA-256 of the bytes written so far."""
+        return self._hash.hexdigest()
+
+    def _commit(self) -> StoredBlob:
+        mime = sniff_image_type(self._head)
+        if mime is None:
+            raise UnsupportedMedia("Only JPEG, PNG, GIF and WebP images are accepted")
+        self._file.close()
+        digest = self.digest
+        target = self._store.path(digest)
+        if self._store.touch(digest):
+            # Same bytes already stored: dedupe
+            self._tmp_path.unlink(missing_ok=True)
+            return StoredBlob(digest, self.size, mime, created=False)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self._tmp_path, target)
+        self._store._stored(self.size)
+        return StoredBlob(digest, self.size, mime, created=True)
+
+    def _abort(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+class BlobStore:
+    """Content-addressed files under ``root/<sha[:2]>/<sha>``.
+
+    A blob's mtime is its last use (upload or publish), which is what
+    ``sweep`` ages it by. Uploads are written and usage is first scanned
+    on one dedicated thread, off the event loop.
+    """
+
+    def __init__(self, root: Optional[Path] = None) -> None:
+        self._root = Path(root) if root is not None else None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="media-store")
+        # Bytes stored, scanned on first use; other workers' uploads show up at the next sweep
+        self._usage: Optional[int] = None
+
+    @property
+    def root(self) -> Path:
+        return self._root or settings.media_dir or settings.data_dir / "media"
+
+    @property
+    def tmp_dir(self) -> Path:
+        return self.root / "tmp"
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def exists(self, digest: str) -> bool:
+        return is_digest(digest) and self.path(digest).is_file()
+
+    async def _run(self, call: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, call, *args)
+
+    async def writer(self, max_bytes: Optional[int] = None) -> BlobWriter:
+        return await self._run(BlobWriter, self, settings.media_max_bytes if max_bytes is None else max_bytes)
+
+    def touch(self, digest: str) -> bool:
+        """Mark a blob as just used; ``False`` if it is not stored."""
+        try:
+            os.utime(self.path(digest))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def open(self, digest: str) -> StoredImage:
+        if not is_digest(digest):
+            raise FileNotFoundError(digest)
+        self.touch(digest)
+        return StoredImage(self.path(digest), digest)
+
+    async def usage(self) -> int:
+        """Total bytes stored. Scans the directory the first time."""
+        with self._lock:
+            if self._usage is not None:
+                return self._usage
+        return await self._run(self._scan_usage)
+
+    def _scan_usage(self) -> int:
+        with self._lock:
+            if self._usage is None:
+                self._usage = sum(size for _, _, size, _ in self._scan())
+            return self._usage
+
+    def _stored(self, size: int) -> None:
+        with self._lock:
+            if self._usage is not None:
+                self._usage += size
+
+    def _scan(self) -> Iterator[Tuple[str, Path, int, float]]:
+        """``(digest, path, size, mtime)`` of every stored blob."""
+        try:
+            prefixes = [e for e in os.scandir(self.root) if len(e.name) == 2 and e.is_dir()]
+        except FileNotFoundError:
+            return
+        for prefix in prefixes:
+            for entry in os.scandir(prefix.path):
+                if is_digest(entry.name) and entry.is_file():
+                    st = entry.stat()
+                    yield entry.name, Path(entry.path), st.st_size, st.st_mtime
+
+    def sweep(self, keep: AbstractSet[str], *, max_bytes: int = 0, retention: float = 0) -> Tuple[int, int]:
+        """Delete blobs not in ``keep``, least recently used first.
+
+        A blob goes when it was last used more than ``retention`` seconds ago,
+        or while the store is over ``max_bytes``; either check is off when 0.
+        Blobs used in the last hour are always kept. Returns ``(blobs, bytes)``
+        deleted.
+        """
+        now = time.time()
+        blobs = sorted(self._scan(), key=lambda blob: blob[3])
+        total = sum(size for _, _, size, _ in blobs)
+        removed: List[int] = []
+        for digest, path, size, mtime in blobs:
+            if mtime > now - _SWEEP_MIN_AGE:
+                break
+            expired = retention > 0 and mtime < now - retention
+            if not expired and not (max_bytes > 0 and total > max_bytes):
+                # Oldest first: nothing after this one is expired either
+                break
+            if digest in keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            removed.append(size)
+        try:
+            for entry in os.scandir(self.tmp_dir):
+                if entry.is_file() and entry.stat().st_mtime < now - _STALE_UPLOAD_AGE:
+                    os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._usage = total
+        return len(removed), sum(removed)
+
+
+blob_store = BlobStore()
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from .state import SharedState
+
+
+def token_hash(token: str) -> str:
+    """Stable, non-reversible cache key for a bot token."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+
+class TTLCache:
+    """Small async TTL cache with stale-while-revalidate.
+
+    Entries younger than ``ttl`` are served as-is. Entries older than ``ttl`` but
+    younger than ``ttl + stale_ttl`` are served immediately while a single
+    background refresh runs. Older entries are fetched inline. Concurrent misses
+    for the same key share one fetch. Only successful fetches are stored.
+
+    With a shared ``state``, fetched values (which must be JSON) are also
+    stored there under ``namespace``, and a local miss or expired entry is
+    looked up there before fetching, so a value fetched by one worker serves
+    the others.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0.0, maxsize: int = 1024,
+                 state: Optional["SharedState"] = None, namespace: str = "cache") -> None:
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self.state = state if state is not None and state.shared else None
+        self.namespace = namespace
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    def _store(self, key: Hashable, value: Any, stored_at: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() if stored_at is None else stored_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def invalidate(self, key: Optional[Hashable] = None) -> None:
+        if key is None:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+            if self.state is not None:
+                await self.state.delete(self._shared_key(key))
+
+    def _shared_key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{json.dumps(key)}"
+
+    async def _load_shared(self, key: Hashable) -> Optional[Tuple[float, Any]]:
+        raw = await self.state.get(self._shared_key(key))
+        if raw is None:
+            return None
+        fetched_at, value = json.loads(raw)
+        # Age the entry as of the worker that fetched it
+        stored_at = time.monotonic() - max(0.0, time.time() - fetched_at)
+        self._store(key, value, stored_at)
+        return stored_at, value
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await fetch()
+            if self.state is not None:
+                await self.state.set(self._shared_key(key), json.dumps([time.time(), value]), self.ttl + self.stale_ttl)
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure does not log a warning
+            future.exception()
+            raise
+        else:
+            self._store(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def _revalidate(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> None:
+        if key in self._inflight:
+            return
+
+        async def run() -> None:
+            try:
+                await self._fetch(key, fetch)
+            except Exception:
+                # Keep serving the stale value; next read past the stale window retries inline
+                pass
+
+        task = asyncio.create_task(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], *, refresh: bool = False) -> Any:
+        entry = None if refresh else self._data.get(key)
+        if not refresh and self.state is not None and (entry is None or time.monotonic() - entry[0] >= self.ttl):
+            entry = await self._load_shared(key) or entry
+        if entry is not None:
+            stored_at, value = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttl:
+                self._data.move_to_end(key)
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self._revalidate(key, fetch)
+                return value
+        return await self._fetch(key, fetch)
+
+
+class LRUCache:
+    """Size-bounded mapping evicting the least recently used entry."""
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        return self._data.pop(key, default)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
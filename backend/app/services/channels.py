@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import dotenv_values
+
+from ..core.config import env_file, settings
+from .cache import token_hash
+from .telegram import get_bot_info_cached, verify_channel_access
+
+logger = logging.getLogger(__name__)
+
+# Bots whose channels clients check with their own token; least recently used dropped first
+_MAX_CLIENT_BOTS = 64
+# A client bot nobody asked about for this long is no longer refreshed
+_CLIENT_IDLE_SECONDS = 3600.0
+# getChat fields listed with each configured channel
+_CHAT_FIELDS = ("title", "username", "type", "photo", "description")
+# .env variables re-read when the file changes
+_RELOADED_VARS = ("TELEGRAM_CHANNELS", "TELEGRAM_BOT_TOKEN")
+
+
+def content_version(content: Any) -> str:
+    """Short hash of a response body, used as its version and ETag."""
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+async def check_channels(token: str, channels: List[Dict[str, str]], *, refresh: bool = False) -> Dict[str, Any]:
+    """Bot and per-channel access status, checked with ``getMe`` and ``getChat``."""
+    try:
+        bot_info = await get_bot_info_cached(token, refresh=refresh)
+        bot_configured = bot_info.get("ok", False)
+        bot_username = bot_info.get("result", {}).get("username", "Unknown")
+    except Exception as e:
+        return {
+            "bot_configured": False,
+            "error": f"Failed to verify bot token: {str(e)}",
+            "channels": []
+        }
+
+    # Check channels concurrently, capped so large lists don't burst Telegram
+    semaphore = asyncio.Semaphore(max(1, settings.channel_status_concurrency))
+
+    async def check(channel: Dict[str, str]) -> Dict[str, Any]:
+        channel_id = channel.get("id")
+        channel_name = channel.get("name")
+
+        if not channel_id:
+            return {
+                "id": channel_id,
+                "name": channel_name,
+                "accessible": False,
+                "error": "Channel ID not provided"
+            }
+
+        try:
+            async with semaphore:
+                access_result = await verify_channel_access(token, channel_id, cached=True, refresh=refresh)
+            return {
+                "id": channel_id,
+                "name": channel_name,
+                "accessible": access_result.get("accessible", False),
+                "chat_info": access_result.get("chat", {}),
+                "error": access_result.get("error") if not access_result.get("accessible") else None
+            }
+        except Exception as e:
+            return {
+                "id": channel_id,
+                "name": channel_name,
+                "accessible": False,
+                "error": f"Failed to check channel access: {str(e)}"
+            }
+
+    return {
+        "bot_configured": bot_configured,
+        "bot_username": bot_username,
+        "channels": await asyncio.gather(*(check(channel) for channel in channels))
+    }
+
+
+@dataclass
+class _Bot:
+    """One bot token and the last known status of each of its channels."""
+    token: str
+    names: Dict[str, str] = field(default_factory=dict)  # channel id -> name, in order
+    bot: Dict[str, Any] = field(default_factory=dict)  # bot_configured, bot_username or error
+    checked: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # channel id -> status entry
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    used_at: float = field(default_factory=time.monotonic)
+
+    def missing(self, ids: List[str]) -> List[str]:
+        if not self.bot.get("bot_configured"):
+            return ids
+        return [i for i in ids if i not in self.checked]
+
+    def status(self, ids: List[str], names: Dict[str, str]) -> Dict[str, Any]:
+        if "error" in self.bot:
+            return {**self.bot, "channels": []}
+        channels = [{**self.checked[i], "name": names.get(i, self.checked[i]["name"])} for i in ids if i in self.checked]
+        return {**self.bot, "channels": channels}
+
+
+class ChannelRegistry:
+    """Configured channels and channel status, answered from memory.
+
+    ``TELEGRAM_CHANNELS`` is parsed once on startup and its channels are
+    checked concurrently with ``TELEGRAM_BOT_TOKEN``, keeping ``getChat``
+    metadata (title, username, photo). Channels clients check with their own
+    token are kept the same way after the first request. A background task
+    refreshes every bot's channels each ``CHANNELS_REFRESH_INTERVAL`` seconds
+    and reloads the configuration when ``.env`` changes, without a restart.
+
+    Every answer carries a ``version`` (a hash of its content) for ETags.
+    """
+
+    def __init__(self) -> None:
+        self._loaded = False
+        self._configured: List[Dict[str, str]] = []
+        self._configured_bot: Optional[_Bot] = None
+        self._channels: List[Dict[str, Any]] = []
+        self._channels_version = content_version([])
+        self._clients: "OrderedDict[str, _Bot]" = OrderedDict()
+        self._env_mtime: Optional[int] = None
+        # Reloaded variables as last read from .env; ones set only in the process environment are not here
+        self._env_values: Dict[str, Optional[str]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._env_mtime = _env_mtime()
+        self._env_values = _read_env() if self._env_mtime is not None else {}
+        self._load()
+        self._task = asyncio.create_task(self._main())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _load(self) -> None:
+        self._configured = [c for c in settings.get_channels() if c.get("id")]
+        token = settings.telegram_bot_token
+        bot = None
+        if token:
+            previous = self._configured_bot
+            bot = previous if previous is not None and previous.token == token else self._clients.pop(token_hash(token), None)
+            bot = bot or _Bot(token)
+        if bot is not None:
+            bot.names = {c["id"]: c["name"] for c in self._configured}
+        self._configured_bot = bot
+        self._loaded = True
+        self._update_channels()
+
+    def _update_channels(self) -> None:
+        checked = self._configured_bot.checked if self._configured_bot is not None else {}
+        channels = []
+        for channel in self._configured:
+            chat = (checked.get(channel["id"]) or {}).get("chat_info") or {}
+            channels.append({**channel, **{name: chat[name] for name in _CHAT_FIELDS if name in chat}})
+        self._channels = channels
+        self._channels_version = content_version(channels)
+
+    def channels(self) -> Tuple[List[Dict[str, Any]], str]:
+        """Configured channels with their chat metadata, and the list's version."""
+        if not self._loaded:
+            self._load()
+        return self._channels, self._channels_version
+
+    async def configured_status(self, *, refresh: bool = False) -> Dict[str, Any]:
+        """Status of the configured bot and channels, with its ``version``."""
+        if not self._loaded:
+            self._load()
+        bot = self._configured_bot
+        if bot is None:
+            content = {"bot_configured": False, "error": "Telegram bot token not configured", "channels": []}
+        else:
+            ids = list(bot.names)
+            await self._ensure_checked(bot, ids, refresh)
+            content = bot.status(ids, bot.names)
+        return {**content, "version": content_version(content)}
+
+    async def status(self, token: str, channels: List[Dict[str, str]], *, refresh: bool = False) -> Dict[str, Any]:
+        """Status of ``channels`` for ``token``, checking only channels not seen before."""
+        if not self._loaded:
+            self._load()
+        bot = self._bot(token)
+        names = {c["id"]: c.get("name") or c["id"] for c in channels}
+        if bot is self._configured_bot:
+            # Only the configuration decides which channels the configured bot keeps;
+            # others are checked per request (getChat answers are still cached)
+            if any(channel_id not in bot.names for channel_id in names):
+                content = await check_channels(token, [{"id": i, "name": n} for i, n in names.items()], refresh=refresh)
+                return {**content, "version": content_version(content)}
+        else:
+            for channel_id, name in names.items():
+                bot.names.setdefault(channel_id, name)
+        ids = list(names)
+        await self._ensure_checked(bot, ids, refresh)
+        content = bot.status(ids, names)
+        return {**content, "version": content_version(content)}
+
+    def _bot(self, token: str) -> _Bot:
+        if self._configured_bot is not None and self._configured_bot.token == token:
+            return self._configured_bot
+        key = token_hash(token)
+        bot = self._clients.get(key)
+        if bot is None:
+            bot = self._clients[key] = _Bot(token)
+            while len(self._clients) > _MAX_CLIENT_BOTS:
+                self._clients.popitem(last=False)
+        self._clients.move_to_end(key)
+        return bot
+
+    async def _ensure_checked(self, bot: _Bot, ids: List[str], refresh: bool) -> None:
+        bot.used_at = time.monotonic()
+        if not refresh and not bot.missing(ids):
+            return
+        async with bot.lock:
+            # A concurrent request may have checked them while this one waited
+            ids = ids if refresh else bot.missing(ids)
+            if ids:
+                await self._check(bot, ids, refresh)
+
+    async def _check(self, bot: _Bot, ids: List[str], refresh: bool) -> None:
+        result = await check_channels(bot.token, [{"id": i, "name": bot.names[i]} for i in ids], refresh=refresh)
+        channels = result.pop("channels")
+        bot.bot = result
+        for channel in channels:
+            bot.checked[channel["id"]] = channel
+        if bot is self._configured_bot:
+            self._update_channels()
+
+    async def _refresh(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, bot in self._clients.items() if now - bot.used_at > _CLIENT_IDLE_SECONDS]:
+            del self._clients[key]
+        bots = list(self._clients.values())
+        if self._configured_bot is not None:
+            bots.append(self._configured_bot)
+
+        async def refresh(bot: _Bot) -> None:
+            async with bot.lock:
+                await self._check(bot, list(bot.names), True)
+
+        await asyncio.gather(*(refresh(bot) for bot in bots if bot.names))
+
+    def _reload_env(self) -> bool:
+        """Re-read the channel variables from ``.env`` if the file changed since the last look."""
+        mtime = _env_mtime()
+        if mtime == self._env_mtime:
+            return False
+        self._env_mtime = mtime
+        values = _read_env() if mtime is not None else {}
+        previous, self._env_values = self._env_values, values
+        changed = False
+        for name in _RELOADED_VARS:
+            value = values.get(name)
+            if value is not None:
+                if os.environ.get(name) == value:
+                    continue
+                os.environ[name] = value
+            elif name in previous and name in os.environ:
+                # Removed from .env (or the file is gone)
+                del os.environ[name]
+            else:
+                continue
+            changed = True
+            if name == "TELEGRAM_BOT_TOKEN":
+                settings.telegram_bot_token = value or None
+        return changed
+
+    async def _main(self) -> None:
+        # Warm up: check every configured channel once
+        if self._configured_bot is not None:
+            try:
+                await self._ensure_checked(self._configured_bot, list(self._configured_bot.names), False)
+            except Exception:
+                logger.exception("Channel warm-up failed")
+        next_refresh = time.monotonic() + settings.channels_refresh_interval
+        while True:
+            await asyncio.sleep(min(settings.channels_config_poll, settings.channels_refresh_interval))
+            try:
+                if self._reload_env():
+                    logger.info("Channel configuration changed; reloading")
+                    self._load()
+                    if self._configured_bot is not None:
+                        await self._ensure_checked(self._configured_bot, list(self._configured_bot.names), False)
+                if time.monotonic() >= next_refresh:
+                    next_refresh = time.monotonic() + settings.channels_refresh_interval
+                    await self._refresh()
+            except Exception:
+                logger.exception("Channel refresh failed")
+
+
+def _read_env() -> Dict[str, Optional[str]]:
+    values = dotenv_values(env_file)
+    return {name: values[name] for name in _RELOADED_VARS if values.get(name) is not None}
+
+
+def _env_mtime() -> Optional[int]:
+    try:
+        return env_file.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+channel_registry = ChannelRegistry()
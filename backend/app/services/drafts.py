@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..core.config import settings
+
+
+class VersionConflict(Exception):
+    """The draft changed since the version the client based its edit on."""
+
+    def __init__(self, current: Optional[Dict[str, Any]]) -> None:
+        super().__init__("Draft was modified")
+        self.current = current
+
+
+class DraftStore:
+    """SQLite store of note drafts with versioned delta sync.
+
+    Every write bumps the draft's ``version`` and stamps it with the next value
+    of a store-wide sequence, so a client holding cursor ``n`` fetches exactly
+    the drafts changed after ``n``. Deletes leave a content-free tombstone so
+    they sync too. Writes check the version and take ``MAX(seq) + 1`` inside
+    one ``BEGIN IMMEDIATE`` transaction, so workers sharing the database never
+    reuse a sequence number or both pass the same ``If-Match``.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), timeout=10.0, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS drafts ("
+            " id TEXT PRIMARY KEY, channel_id TEXT NOT NULL,"
+            " title TEXT NOT NULL DEFAULT '', content_html TEXT NOT NULL DEFAULT '',"
+            " is_pinned INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL,"
+            " version INTEGER NOT NULL, seq INTEGER NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS drafts_channel_seq ON drafts (channel_id, seq)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS drafts_seq ON drafts (seq)")
+
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        """One write transaction; other processes wait for the database lock."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _next_seq(self) -> int:
+        # Tombstones keep their seq, so MAX(seq) never goes back
+        return self._db.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM drafts").fetchone()[0]
+
+    def cursor(self, channel_id: str) -> int:
+        """Sequence number of the latest change in ``channel_id`` (0 if none)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM drafts WHERE channel_id = ?", (channel_id,)
+            ).fetchone()
+        return row[0]
+
+    def changes(self, channel_id: str, since: int = 0) -> Tuple[List[Dict[str, Any]], List[str], int]:
+        """Drafts changed after ``since`` as ``(drafts, deleted_ids, cursor)``."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM drafts WHERE channel_id = ? AND seq > ? ORDER BY seq", (channel_id, since)
+            ).fetchall()
+        drafts = [_row_to_draft(row) for row in rows if not row["deleted"]]
+        # A full sync (since=0) has nothing to delete on the client
+        deleted = [row["id"] for row in rows if row["deleted"]] if since else []
+        cursor = rows[-1]["seq"] if rows else since
+        return drafts, deleted, cursor
+
+    def get(self, draft_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM drafts WHERE id = ? AND deleted = 0", (draft_id,)).fetchone()
+        return _row_to_draft(row) if row else None
+
+    def put(self, draft_id: str, *, channel_id: str, title: str, content_html: str, is_pinned: bool = False,
+            created_at: Optional[float] = None, if_version: Optional[int] = None) -> Dict[str, Any]:
+        """Create or replace a draft. ``if_version`` rejects the write unless it matches."""
+        now = time.time()
+        with self._write():
+            row = self._db.execute("SELECT * FROM drafts WHERE id = ?", (draft_id,)).fetchone()
+            current = row if row is not None and not row["deleted"] else None
+            if if_version is not None and (current["version"] if current else 0) != if_version:
+                raise VersionConflict(_row_to_draft(current) if current else None)
+            if current is not None and (current["channel_id"], current["title"], current["content_html"], bool(current["is_pinned"])) == (channel_id, title, content_html, bool(is_pinned)):
+                # Unchanged: keep version and cursor so other clients have nothing to fetch
+                return _row_to_draft(current)
+            version = (row["version"] if row is not None else 0) + 1
+            created = row["created_at"] if current is not None else (created_at or now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO drafts"
+                " (id, channel_id, title, content_html, is_pinned, created_at, updated_at, version, seq, deleted)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (draft_id, channel_id, title, content_html, int(bool(is_pinned)), created, now, version, self._next_seq()),
+            )
+            row = self._db.execute("SELECT * FROM drafts WHERE id = ?", (draft_id,)).fetchone()
+        return _row_to_draft(row)
+
+    def delete(self, draft_id: str, *, if_version: Optional[int] = None) -> bool:
+        with self._write():
+            row = self._db.execute("SELECT * FROM drafts WHERE id = ? AND deleted = 0", (draft_id,)).fetchone()
+            if row is None:
+                return False
+            if if_version is not None and row["version"] != if_version:
+                raise VersionConflict(_row_to_draft(row))
+            self._db.execute(
+                "UPDATE drafts SET deleted = 1, title = '', content_html = '', version = version + 1,"
+                " seq = ?, updated_at = ? WHERE id = ?",
+                (self._next_seq(), time.time(), draft_id),
+            )
+        return True
+
+    def contents(self) -> List[str]:
+        """``content_html`` of every live draft that embeds an uploaded image."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT content_html FROM drafts WHERE deleted = 0 AND content_html LIKE '%/media/%'"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def _row_to_draft(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "channel_id": row["channel_id"],
+        "title": row["title"],
+        "content_html": row["content_html"],
+        "is_pinned": bool(row["is_pinned"]),
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "version": row["version"],
+    }
+
+
+# Opened on startup when DRAFTS_ENABLED is set
+_store: Optional[DraftStore] = None
+
+
+def init_store(path: Optional[Path] = None) -> DraftStore:
+    global _store
+    if _store is None:
+        _store = DraftStore(path or settings.drafts_db_path or settings.data_dir / "drafts.sqlite3")
+    return _store
+
+
+def get_store() -> Optional[DraftStore]:
+    return _store
+
+
+def close_store() -> None:
+    global _store
+    store, _store = _store, None
+    if store is not None:
+        store.close()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import functools
+from typing import Any, Callable
+
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.dependencies.models import Dependant
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.responses import Response
+
+from ..core.config import settings
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; routes fall back to FastAPI's stdlib JSON
+    orjson = None
+
+
+def fast_json_enabled() -> bool:
+    return orjson is not None and settings.fast_json
+
+
+def _default(value: Any) -> Any:
+    # Whatever orjson can't encode natively (pydantic models, sets, paths, ...)
+    return jsonable_encoder(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` encoded with orjson when it is installed."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(jsonable_encoder(content))
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONRequest(Request):
+    """Request whose ``json()`` parses the body with orjson."""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            # orjson.JSONDecodeError subclasses json.JSONDecodeError, so FastAPI
+            # still answers malformed bodies with 422
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+
+def _respond(call: Callable[..., Any], status_code: int) -> Callable[..., Any]:
+    """Wrap an endpoint so plain return values go straight to ``FastJSONResponse``."""
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def endpoint(*args: Any, **kwargs: Any) -> Any:
+            result = await call(*args, **kwargs)
+            return result if isinstance(result, Response) else FastJSONResponse(result, status_code=status_code)
+    else:
+        @functools.wraps(call)
+        def endpoint(*args: Any, **kwargs: Any) -> Any:
+            result = call(*args, **kwargs)
+            return result if isinstance(result, Response) else FastJSONResponse(result, status_code=status_code)
+    return endpoint
+
+
+def _uses_response_param(dependant: Dependant) -> bool:
+    return dependant.response_param_name is not None or any(
+        _uses_response_param(dep) for dep in dependant.dependencies
+    )
+
+
+class FastJSONRoute(APIRoute):
+    """Route decoding request bodies and encoding results with orjson.
+
+    FastAPI's default path parses bodies with ``json.loads``, then runs the
+    endpoint's result through ``jsonable_encoder`` before ``json.dumps``; for
+    multi-megabyte notes and nested Telegram results those passes dominate.
+    Here the body is parsed by orjson (pydantic still validates the request
+    model) and responses are rendered by ``FastJSONResponse``.
+
+    Everything FastAPI does with a result still applies: ``response_model``
+    validation and filtering, and headers, cookies and status codes set on an
+    injected ``Response``. Only endpoints that opt out of all of that (no
+    response model, as with ``-> Response`` or ``response_model=None``, and no
+    ``Response`` parameter) skip ``jsonable_encoder`` and hand their result to
+    orjson directly. Without orjson, or with ``FAST_JSON=false``, this behaves
+    exactly like ``APIRoute``.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        if fast_json_enabled() and isinstance(kwargs.get("response_class"), DefaultPlaceholder):
+            kwargs["response_class"] = FastJSONResponse
+        super().__init__(path, endpoint, **kwargs)
+
+    def _encodes_directly(self) -> bool:
+        return self.response_field is None and not _uses_response_param(self.dependant)
+
+    def get_route_handler(self) -> Callable[[Request], Any]:
+        if not fast_json_enabled():
+            return super().get_route_handler()
+        if self._encodes_directly():
+            dependant = self.dependant
+            self.dependant = copy.copy(dependant)
+            self.dependant.call = _respond(dependant.call, self.status_code or 200)
+            try:
+                handler = super().get_route_handler()
+            finally:
+                self.dependant = dependant
+        else:
+            handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            return await handler(FastJSONRequest(request.scope, request.receive))
+
+        return route_handler
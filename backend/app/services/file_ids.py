@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Tuple
+
+from ..core.config import settings
+from .cache import token_hash
+from .state import SharedState, shared_state
+
+# Shared entries outlive any local LRU; Telegram keeps file_ids valid for a long time
+_SHARED_TTL = 30 * 24 * 3600
+
+
+class FileIdCache:
+    """Content hash -> Telegram ``file_id``, per bot token.
+
+    An in-memory LRU bounded by ``maxsize``. With ``path`` set, entries are
+    written through to SQLite so re-sends survive restarts; the database mirrors
+    the LRU (evicted entries are deleted there too), written on a dedicated
+    thread rather than the event loop. With a shared ``state``,
+    a local miss is looked up there, so a photo uploaded by one worker is
+    reused by the others.
+    """
+
+    def __init__(self, maxsize: int = 10000, path: Optional[Path] = None, state: Optional[SharedState] = None) -> None:
+        self.maxsize = maxsize
+        self.state = state if state is not None and state.shared else None
+        self._data: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if path is not None:
+            self._open(Path(path))
+
+    def _open(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS file_ids ("
+            " token_hash TEXT NOT NULL, digest TEXT NOT NULL, file_id TEXT NOT NULL,"
+            " used_at REAL NOT NULL DEFAULT (julianday('now')),"
+            " PRIMARY KEY (token_hash, digest))"
+        )
+        rows = db.execute(
+            "SELECT token_hash, digest, file_id FROM file_ids ORDER BY used_at DESC LIMIT ?", (self.maxsize,)
+        ).fetchall()
+        for th, digest, file_id in reversed(rows):
+            self._data[(th, digest)] = file_id
+        db.execute(
+            "DELETE FROM file_ids WHERE rowid NOT IN (SELECT rowid FROM file_ids ORDER BY used_at DESC LIMIT ?)",
+            (self.maxsize,),
+        )
+        self._db = db
+        # One thread owns the connection, so writes apply in the order they were made
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="file-ids")
+
+    async def _write(self, call: Callable[..., None], *args: Any) -> None:
+        if self._executor is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, call, *args)
+
+    def _store(self, key: Tuple[str, str], file_id: str, evicted: List[Tuple[str, str]]) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO file_ids (token_hash, digest, file_id, used_at) VALUES (?, ?, ?, julianday('now'))",
+            (key[0], key[1], file_id),
+        )
+        if evicted:
+            self._db.executemany("DELETE FROM file_ids WHERE token_hash = ? AND digest = ?", evicted)
+
+    def _delete(self, key: Tuple[str, str]) -> None:
+        self._db.execute("DELETE FROM file_ids WHERE token_hash = ? AND digest = ?", key)
+
+    async def get(self, token: str, digest: str) -> Optional[str]:
+        key = (token_hash(token), digest)
+        with self._lock:
+            file_id = self._data.get(key)
+            if file_id is not None:
+                self._data.move_to_end(key)
+                return file_id
+        if self.state is not None:
+            return await self.state.get(f"file-id:{key[0]}:{digest}")
+        return None
+
+    async def put(self, token: str, digest: str, file_id: str) -> None:
+        key = (token_hash(token), digest)
+        with self._lock:
+            self._data[key] = file_id
+            self._data.move_to_end(key)
+            evicted = []
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False)[0])
+        await self._write(self._store, key, file_id, evicted)
+        if self.state is not None:
+            await self.state.set(f"file-id:{key[0]}:{digest}", file_id, _SHARED_TTL)
+
+    async def discard(self, token: str, digest: str) -> None:
+        key = (token_hash(token), digest)
+        with self._lock:
+            self._data.pop(key, None)
+        await self._write(self._delete, key)
+        if self.state is not None:
+            await self.state.delete(f"file-id:{key[0]}:{digest}")
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def close(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def photo_file_id(message: Any) -> Optional[str]:
+    """``file_id`` of the largest size in a sent photo message, if any."""
+    if not isinstance(message, dict):
+        return None
+    sizes = message.get("photo") or []
+    if not sizes:
+        return None
+    return sizes[-1].get("file_id")
+
+
+file_id_cache = FileIdCache(settings.file_id_cache_size, settings.file_id_cache_path, shared_state)
@@ -0,0 +1,476 @@
+from __future__ import annotations
+
+import html
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import conversion_duration, timed
+
+# Source tag -> Telegram HTML tag (https://core.telegram.org/bots/api#html-style)
+_FORMAT_TAGS = {
+    "b": "b", "strong": "b",
+    "i": "i", "em": "i",
+    "u": "u", "ins": "u",
+    "s": "s", "strike": "s", "del": "s",
+    "code": "code",
+    "pre": "pre",
+    "a": "a",
+    "blockquote": "blockquote",
+    "tg-spoiler": "tg-spoiler",
+    "h1": "b", "h2": "b", "h3": "b", "h4": "b", "h5": "b", "h6": "b",
+}
+# Tags that end the current line; values are the number of newlines they require
+_BLOCK_TAGS = {
+    "div": 1, "li": 1, "ul": 1, "ol": 1, "tr": 1, "pre": 1, "blockquote": 1,
+    "p": 2, "h1": 2, "h2": 2, "h3": 2, "h4": 2, "h5": 2, "h6": 2, "table": 2, "hr": 2,
+}
+# Tags whose text content is never shown
+_SKIP_TAGS = {"script", "style", "head", "title", "template", "noscript"}
+# Entities that cannot contain other entities in Telegram
+_VERBATIM_TAGS = {"code", "pre"}
+_SAFE_HREF = re.compile(r"^(?:https?|tg|mailto):", re.I)
+# Whitespace runs that need rewriting; lone spaces are left alone
+_WS_RUN_RE = re.compile(r" *[^\S ]\s*| {2,}")
+# One token per match: comment/doctype, tag, or a run of text. A tag never
+# spans another "<", so an unclosed "<tag" is scanned only up to the next "<"
+# and then read as text; this keeps tokenizing linear on hostile input.
+_TOKEN_RE = re.compile(
+    r"<!--.*?(?:-->|\Z)|<[!?][^>]*>?|<(/?)([a-zA-Z][\w:.-]*)((?:[^<>\"']|\"[^<\"]*\"|'[^<']*')*)>|[^<]+|<",
+    re.S,
+)
+# Formatting entities nested deeper than this are dropped (their text is kept)
+_MAX_DEPTH = 32
+_RAW_TEXT_CLOSE = {tag: re.compile(rf"</{tag}", re.I) for tag in ("script", "style")}
+_ATTR_RE = re.compile(r"""([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?""")
+
+
+# Markup that splitting never cuts: a tag or a character reference
+_SPLIT_MARKUP_RE = re.compile(r"<[^>]*>|&#?\w+;")
+_TAG_NAME_RE = re.compile(r"</?\s*([a-zA-Z][\w-]*)")
+_SPACE_RUN_RE = re.compile(r"\s+")
+# Break separators, strongest first; the converter emits only " " and "\n" outside <pre>
+_PARAGRAPH_BREAKS = ("\n\n",)
+_LINE_BREAKS = ("\n",)
+_SENTENCE_BREAKS = (". ", "! ", "? ", "… ")
+_WORD_BREAKS = (" ", "\n")
+
+
+def utf16_len(text: str) -> int:
+    """Length in UTF-16 code units, which is how Telegram counts message limits."""
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _parse_attrs(raw: str) -> List[Tuple[str, Optional[str]]]:
+    attrs: List[Tuple[str, Optional[str]]] = []
+    for m in _ATTR_RE.finditer(raw):
+        name, dq, sq, bare = m.groups()
+        value = dq if dq is not None else sq if sq is not None else bare
+        if value is not None and "&" in value:
+            value = html.unescape(value)
+        attrs.append((name.lower(), value))
+    return attrs
+
+
+def _collapse_ws(m: "re.Match[str]") -> str:
+    newlines = m.group().count("\n")
+    return "\n" * min(2, newlines) if newlines else " "
+
+
+@dataclass
+class ConvertedContent:
+    """Result of a single pass over the note HTML."""
+    text: str = ""  # Telegram HTML for parse_mode=HTML
+    images: List[str] = field(default_factory=list)
+    text_length: int = 0  # visible UTF-16 code units, i.e. what Telegram counts
+
+    @property
+    def has_images(self) -> bool:
+        return bool(self.images)
+
+    def full_text(self, title: str = "") -> str:
+        return f"{html.escape(title, quote=False)}\n\n{self.text}" if title else self.text
+
+    def full_length(self, title: str = "") -> int:
+        return utf16_len(title) + 2 + self.text_length if title else self.text_length
+
+
+class _TelegramConverter:
+    def __init__(self) -> None:
+        self.out: List[str] = []
+        self.images: List[str] = []
+        self.length = 0
+        # (source tag, telegram markup, telegram tag); stack[:emitted] are written out
+        self.stack: List[Tuple[str, str, str]] = []
+        self.emitted = 0
+        self.open_counts: Dict[str, int] = {}  # source tag -> entries on the stack
+        self.dropped: Dict[str, int] = {}  # source tag -> opens ignored past _MAX_DEPTH
+        self.pre_depth = 0
+        self.link_depth = 0
+        self.lists: List[Optional[int]] = []  # None for <ul>, running counter for <ol>
+        self.pending_newlines = 0
+        self.pending_space = False
+        self.started = False
+        self.skip_depth = 0
+        self.verbatim_depth = 0
+
+    # -- output helpers -------------------------------------------------
+    def _write_visible(self, text: str) -> None:
+        if self.started:
+            if self.pending_newlines:
+                sep = "\n" * self.pending_newlines
+                self.out.append(sep)
+                self.length += len(sep)
+            elif self.pending_space:
+                self.out.append(" ")
+                self.length += 1
+        self.pending_newlines = 0
+        self.pending_space = False
+        if self.emitted < len(self.stack):
+            self.out.extend(entry[1] for entry in self.stack[self.emitted:])
+            self.emitted = len(self.stack)
+        self.out.append(html.escape(text, quote=False))
+        self.length += utf16_len(text)
+        self.started = True
+
+    def _break(self, newlines: int) -> None:
+        if self.started:
+            self.pending_newlines = min(2, max(self.pending_newlines, newlines))
+
+    # -- tokenizer ------------------------------------------------------
+    def feed(self, source: str) -> None:
+        pos = 0
+        end = len(source)
+        while pos < end:
+            m = _TOKEN_RE.match(source, pos)
+            pos = m.end()
+            tag = m.group(2)
+            if tag is None:
+                token = m.group()
+                if token[0] != "<" or token == "<":
+                    self.handle_data(html.unescape(token) if "&" in token else token)
+                continue
+            tag = tag.lower()
+            if m.group(1):
+                self.handle_endtag(tag)
+                continue
+            raw_attrs = m.group(3)
+            self.handle_starttag(tag, _parse_attrs(raw_attrs) if tag in ("img", "a") else [])
+            if tag in _SKIP_TAGS and not raw_attrs.endswith("/"):
+                # Raw text elements: jump straight past the closing tag
+                close_re = _RAW_TEXT_CLOSE.get(tag)
+                close = close_re.search(source, pos) if close_re else None
+                if close:
+                    pos = close.start()
+
+    # -- token handlers -------------------------------------------------
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag in _SKIP_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth:
+            return
+        if tag == "img":
+            src = dict(attrs).get("src")
+            if src:
+                self.images.append(src)
+            return
+        if tag == "br":
+            if self.started:
+                self.pending_newlines = min(2, self.pending_newlines + 1)
+            return
+        if tag in _BLOCK_TAGS:
+            self._break(_BLOCK_TAGS[tag])
+        if tag in ("ul", "ol"):
+            self.lists.append(0 if tag == "ol" else None)
+        elif tag == "li":
+            counter = self.lists[-1] if self.lists else None
+            if counter is None:
+                bullet = "•"
+            else:
+                counter += 1
+                self.lists[-1] = counter
+                bullet = f"{counter}."
+            self._write_visible(bullet)
+            self.pending_space = True
+        tg_tag = _FORMAT_TAGS.get(tag)
+        if tg_tag is None or self.verbatim_depth:
+            return
+        if len(self.stack) >= _MAX_DEPTH:
+            self.dropped[tag] = self.dropped.get(tag, 0) + 1
+            return
+        if tg_tag == "a":
+            href = dict(attrs).get("href") or ""
+            if not _SAFE_HREF.match(href) or self.link_depth:
+                return
+            markup = f'<a href="{html.escape(href, quote=True)}">'
+        else:
+            markup = f"<{tg_tag}>"
+        self._push((tag, markup, tg_tag))
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in _SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.skip_depth:
+            return
+        if self.dropped.get(tag):
+            self.dropped[tag] -= 1
+        elif self.open_counts.get(tag):
+            for idx in range(len(self.stack) - 1, -1, -1):
+                if self.stack[idx][0] == tag:
+                    self._close_from(idx)
+                    break
+        if tag in ("ul", "ol") and self.lists:
+            self.lists.pop()
+        if tag in _BLOCK_TAGS:
+            self._break(_BLOCK_TAGS[tag])
+
+    def _push(self, entry: Tuple[str, str, str]) -> None:
+        self.stack.append(entry)
+        self._count(entry, 1)
+
+    def _count(self, entry: Tuple[str, str, str], delta: int) -> None:
+        self.open_counts[entry[0]] = self.open_counts.get(entry[0], 0) + delta
+        tg_tag = entry[2]
+        if tg_tag in _VERBATIM_TAGS:
+            self.verbatim_depth += delta
+        if tg_tag == "pre":
+            self.pre_depth += delta
+        elif tg_tag == "a":
+            self.link_depth += delta
+
+    def _close_from(self, idx: int) -> None:
+        # Close everything above idx too, then lazily reopen those entities
+        reopen = self.stack[idx + 1:]
+        for pos in range(len(self.stack) - 1, idx - 1, -1):
+            entry = self.stack[pos]
+            if pos < self.emitted:
+                self.out.append(f"</{entry[2]}>")
+            self._count(entry, -1)
+        del self.stack[idx:]
+        self.emitted = min(self.emitted, idx)
+        for entry in reopen:
+            self._push(entry)
+
+    def handle_data(self, data: str) -> None:
+        if self.skip_depth or not data:
+            return
+        if self.pre_depth:
+            self._write_visible(data)
+            return
+        text = data.strip()
+        if not text:
+            self._gap(data)
+            return
+        start = data.find(text[0])
+        self._gap(data[:start])
+        self._write_visible(_WS_RUN_RE.sub(_collapse_ws, text))
+        self._gap(data[start + len(text):])
+
+    def _gap(self, gap: str) -> None:
+        if not gap or not self.started:
+            return
+        newlines = gap.count("\n")
+        if newlines:
+            self.pending_newlines = min(2, self.pending_newlines + newlines)
+        else:
+            self.pending_space = True
+
+    def finish(self) -> ConvertedContent:
+        for entry in reversed(self.stack[:self.emitted]):
+            self.out.append(f"</{entry[2]}>")
+        self.stack.clear()
+        self.emitted = 0
+        return ConvertedContent(text="".join(self.out), images=self.images, text_length=self.length)
+
+
+def convert_html(html_content: str) -> ConvertedContent:
+    """Convert note HTML to Telegram HTML in one pass.
+
+    Collects image sources and the visible text length along the way. Bold,
+    italic, underline, strike, code, pre, blockquote and links are kept as
+    Telegram entities; everything else is reduced to text. All character
+    references are decoded and the output is re-escaped for ``parse_mode=HTML``.
+    """
+    if not html_content:
+        return ConvertedContent()
+    with timed(conversion_duration):
+        parser = _TelegramConverter()
+        parser.feed(html_content)
+        return parser.finish()
+
+
+class _SplitMarks:
+    """Markup positions in Telegram HTML with the visible units before each one."""
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.before: List[int] = []  # visible units before the mark
+        self.after: List[int] = []  # visible units up to the end of the mark
+        widths: Dict[str, int] = {}
+        ascii_only = text.isascii()
+        units = prev = 0
+        for m in _SPLIT_MARKUP_RE.finditer(text):
+            start, stop = m.span()
+            if ascii_only:
+                units += start - prev
+            else:
+                run = text[prev:start]
+                units += len(run) if run.isascii() else len(run.encode("utf-16-le")) // 2
+            self.before.append(units)
+            if text[start] == "&":
+                token = m.group()
+                width = widths.get(token)
+                if width is None:
+                    width = widths[token] = utf16_len(html.unescape(token))
+                units += width
+            self.after.append(units)
+            self.starts.append(start)
+            self.ends.append(stop)
+            prev = stop
+        self.total = units + utf16_len(text[prev:])
+
+    def units_at(self, pos: int, units: int, x: int) -> int:
+        """Visible units before ``x``, given ``units`` before ``pos`` <= ``x``."""
+        k = bisect_right(self.ends, x) - 1
+        if k >= 0 and self.ends[k] > pos:
+            return self.after[k] + utf16_len(self.text[self.ends[k]:x])
+        return units + utf16_len(self.text[pos:x])
+
+    def locate(self, pos: int, units: int, target: int) -> Optional[int]:
+        """First position from ``pos`` where the visible units would exceed ``target``.
+
+        ``None`` if the rest of the text fits. Character references are never
+        cut, so an overflowing one is excluded unless nothing precedes it.
+        """
+        if self.total <= target:
+            return None
+        first = bisect_left(self.starts, pos)
+        j = bisect_right(self.before, target, first)
+        prev = j - 1
+        if prev >= first:
+            if self.after[prev] > target:  # only a reference has width
+                return self.starts[prev] if self.before[prev] > units else self.ends[prev]
+            run_start, run_units = self.ends[prev], self.after[prev]
+        else:
+            run_start, run_units = pos, units
+        run_end = self.starts[j] if j < len(self.starts) else len(self.text)
+        return run_start + _fit(self.text, run_start, run_end, target - run_units)
+
+
+def _fit(text: str, start: int, end: int, budget: int) -> int:
+    """Number of characters of ``text[start:end]`` that fit in ``budget`` UTF-16 units."""
+    head = text[start:min(end, start + max(0, budget))]
+    if head.isascii() or utf16_len(head) <= budget:
+        return len(head)
+    encoded = head.encode("utf-16-le")[:2 * budget]
+    if 0xD8 <= encoded[-1] <= 0xDB:  # never keep half of a surrogate pair
+        encoded = encoded[:-2]
+    return len(encoded.decode("utf-16-le"))
+
+
+def _last_break(text: str, seps: Tuple[str, ...], start: int, end: int, marks: _SplitMarks) -> int:
+    """Latest cut for ``seps`` in ``text[start:end]`` outside markup, or -1.
+
+    The cut falls on the first whitespace character of the separator.
+    """
+    while end > start:
+        cut = -1
+        for sep in seps:
+            found = text.rfind(sep, start, end)
+            if found >= 0:
+                cut = max(cut, found + len(sep.rstrip()))
+        if cut < 0:
+            return -1
+        k = bisect_right(marks.starts, cut) - 1
+        if k < 0 or marks.ends[k] <= cut:
+            return cut
+        end = marks.starts[k]  # inside a tag: look before it
+    return -1
+
+
+def split_html(text: str, limit: int = 4096, first_limit: Optional[int] = None) -> List[str]:
+    """Split Telegram HTML into parts of at most ``limit`` visible UTF-16 units.
+
+    ``first_limit`` caps the first part instead (e.g. a 1024 unit photo
+    caption). Each part ends at the best boundary available: paragraph, then
+    line, sentence and word; a word is cut only when it alone exceeds the
+    limit. Tags and character references are never cut. Entities open at a cut
+    are closed at the end of the part and reopened at the start of the next.
+    Runs in time linear in ``len(text)``: each part is located by bisecting the
+    visible width before each tag and its boundaries are found with ``str.rfind``.
+    """
+    first = limit if first_limit is None else first_limit
+    # Markup only adds to the raw length, so this is a safe shortcut
+    if utf16_len(text) <= first:
+        return [text]
+    marks = _SplitMarks(text)
+    parts: List[str] = []
+    # Entities open at the start of the current part: (tag name, opening markup)
+    stack: Tuple[Tuple[str, str], ...] = ()
+    cap = first
+    pos = units = mark = 0
+    end = len(text)
+    while True:
+        space = _SPACE_RUN_RE.match(text, pos)
+        if space:
+            units = marks.units_at(pos, units, space.end())
+            pos = space.end()
+        if pos >= end:
+            break
+        over = marks.locate(pos, units, units + cap)
+        if over is None:
+            parts.append(_render_part(text, pos, end, stack, ()))
+            break
+        # The first visible character: leading tags add no units
+        mark = bisect_left(marks.starts, pos, mark)
+        visible = pos
+        k = mark
+        while k < len(marks.starts) and marks.starts[k] == visible and text[visible] == "<":
+            visible = marks.ends[k]
+            k += 1
+        half = marks.locate(pos, units, units + cap // 2)
+        # Prefer the strongest boundary that still fills half the part, else the latest one
+        for seps in (_PARAGRAPH_BREAKS, _LINE_BREAKS, _SENTENCE_BREAKS):
+            cut = _last_break(text, seps, max(half, visible + 1), over + 1, marks)
+            if cut >= 0:
+                break
+        else:
+            cut = _last_break(text, _WORD_BREAKS, visible + 1, over + 1, marks)
+            if cut < 0:
+                cut = max(over, visible + 1)
+        cut_stack = stack
+        end_mark = bisect_left(marks.starts, cut, mark)
+        for k in range(mark, end_mark):
+            start = marks.starts[k]
+            if text[start] == "&":
+                continue
+            tag = text[start:marks.ends[k]]
+            name = _TAG_NAME_RE.match(tag)
+            name = name.group(1).lower() if name else ""
+            if tag[1] != "/":
+                cut_stack += ((name, tag),)
+                continue
+            for idx in range(len(cut_stack) - 1, -1, -1):
+                if cut_stack[idx][0] == name:
+                    cut_stack = cut_stack[:idx] + cut_stack[idx + 1:]
+                    break
+        mark = end_mark
+        # Whitespace before the cut stays out of the part
+        parts.append(_render_part(text, pos, pos + len(text[pos:cut].rstrip()), stack, cut_stack))
+        units = marks.units_at(pos, units, cut)
+        pos, stack, cap = cut, cut_stack, limit
+    return parts or [text]
+
+
+def _render_part(text: str, start: int, end: int, reopen: tuple, close: tuple) -> str:
+    out = [markup for _, markup in reopen]
+    out.append(text[start:end])
+    out.extend(f"</{name}>" for name, _ in reversed(close))
+    return "".join(out).rstrip()
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+from .etag import etag_matches
+
+# One year; hashed URLs change whenever the content does
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Unhashed URLs (index.html, direct links) are revalidated with their ETag
+REVALIDATE = "no-cache"
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
+_MIN_COMPRESS_BYTES = 256
+# Local asset references in HTML (href="/assets/app.js", src="assets/app.js")
+_ASSET_REF_RE = re.compile(r"""(\b(?:href|src)\s*=\s*["'])(/?[^"':?#]+)(["'])""", re.I)
+
+
+@dataclass
+class _Asset:
+    media_type: str
+    cache_control: str
+    digest: str
+    # encoding ("identity", "br", "gzip") -> body
+    bodies: Dict[str, bytes] = field(default_factory=dict)
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+
+def _media_type(path: Path) -> str:
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+        media_type += "; charset=utf-8"
+    return media_type
+
+
+def _compress(body: bytes, media_type: str) -> Dict[str, bytes]:
+    bodies = {"identity": body}
+    if len(body) < _MIN_COMPRESS_BYTES or not media_type.startswith(_COMPRESSIBLE):
+        return bodies
+    # mtime=0 keeps the output (and so the ETag) identical across restarts
+    gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+    if len(gzipped) < len(body):
+        bodies["gzip"] = gzipped
+    if brotli is not None:
+        compressed = brotli.compress(body, quality=11)
+        if len(compressed) < len(body):
+            bodies["br"] = compressed
+    return bodies
+
+
+def _hashed_name(path: str, digest: str) -> str:
+    stem, dot, suffix = path.rpartition(".")
+    if not dot or "/" in suffix:
+        return f"{path}.{digest[:10]}"
+    return f"{stem}.{digest[:10]}.{suffix}"
+
+
+def _accepted_encodings(header: str) -> List[str]:
+    accepted = []
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.append(name.strip().lower())
+    return accepted
+
+
+class FrontendFiles:
+    """ASGI app serving the frontend from memory, precompressed.
+
+    ``load()`` reads every file once, builds gzip (and brotli, if installed)
+    variants and gives each asset a content-hashed alias such as
+    ``/assets/app.3f2a9c1d0b.js``. References in HTML files are rewritten to
+    the hashed URLs, which are cached as immutable; everything else is served
+    with ``no-cache`` and a strong ETag so revalidation is a cheap 304.
+
+    Files are snapshotted at load time; restart (or ``load()`` again) after
+    editing the frontend.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self._assets: Dict[str, _Asset] = {}
+        self._loaded = False
+
+    def load(self) -> None:
+        raw: Dict[str, Tuple[bytes, str]] = {}
+        for path in sorted(self.directory.rglob("*")):
+            relative = path.relative_to(self.directory)
+            if not path.is_file() or any(part.startswith(".") for part in relative.parts):
+                continue
+            raw["/" + relative.as_posix()] = (path.read_bytes(), _media_type(path))
+
+        assets: Dict[str, _Asset] = {}
+        hashed: Dict[str, str] = {}
+        # Non-HTML assets first so HTML can point at their hashed URLs
+        for url, (body, media_type) in raw.items():
+            if media_type.startswith("text/html"):
+                continue
+            digest = hashlib.sha256(body).hexdigest()[:32]
+            bodies = _compress(body, media_type)
+            assets[url] = _Asset(media_type, REVALIDATE, digest, bodies)
+            hashed[url] = _hashed_name(url, digest)
+            assets[hashed[url]] = _Asset(media_type, IMMUTABLE, digest, bodies)
+        for url, (body, media_type) in raw.items():
+            if not media_type.startswith("text/html"):
+                continue
+            base = url.rsplit("/", 1)[0] + "/"
+            body = self._rewrite(body, base, hashed)
+            digest = hashlib.sha256(body).hexdigest()[:32]
+            assets[url] = _Asset(media_type, REVALIDATE, digest, _compress(body, media_type))
+        self._assets = assets
+        self._loaded = True
+
+    @staticmethod
+    def _rewrite(body: bytes, base: str, hashed: Dict[str, str]) -> bytes:
+        def replace(m: "re.Match[str]") -> str:
+            ref = m.group(2)
+            url = ref if ref.startswith("/") else base + ref
+            target = hashed.get(url)
+            return f"{m.group(1)}{target}{m.group(3)}" if target else m.group()
+
+        return _ASSET_REF_RE.sub(replace, body.decode("utf-8")).encode("utf-8")
+
+    def _lookup(self, path: str) -> Optional[_Asset]:
+        if path.endswith("/"):
+            path += "index.html"
+        asset = self._assets.get(path)
+        if asset is None and "." not in path.rsplit("/", 1)[-1]:
+            # /dir -> /dir/index.html, like StaticFiles(html=True)
+            asset = self._assets.get(path + "/index.html")
+        return asset
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+        if not self._loaded:
+            self.load()
+        method = scope["method"]
+        if method not in ("GET", "HEAD"):
+            await self._send(send, 405, [(b"allow", b"GET, HEAD")], b"Method Not Allowed", head=False)
+            return
+        asset = self._lookup(scope["path"])
+        if asset is None:
+            await self._send(send, 404, [(b"content-type", b"text/plain; charset=utf-8")], b"Not Found", head=method == "HEAD")
+            return
+
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers") or ()}
+        encoding = "identity"
+        if len(asset.bodies) > 1:
+            accepted = _accepted_encodings(headers.get("accept-encoding", ""))
+            encoding = next((e for e in ("br", "gzip") if e in asset.bodies and (e in accepted or "*" in accepted)), "identity")
+        etag = asset.etag(encoding)
+        response_headers = [
+            (b"etag", etag.encode()),
+            (b"cache-control", asset.cache_control.encode()),
+            (b"vary", b"Accept-Encoding"),
+        ]
+        if etag_matches(headers.get("if-none-match"), etag):
+            await self._send(send, 304, response_headers, b"", head=True)
+            return
+        response_headers.append((b"content-type", asset.media_type.encode()))
+        if encoding != "identity":
+            response_headers.append((b"content-encoding", encoding.encode()))
+        await self._send(send, 200, response_headers, asset.bodies[encoding], head=method == "HEAD")
+
+    @staticmethod
+    async def _send(send, status: int, headers: list, body: bytes, *, head: bool) -> None:
+        if status != 304:
+            headers = [*headers, (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if head else body})
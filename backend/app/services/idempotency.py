@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional, Set, Tuple
+
+from ..core.config import settings
+from .state import Lease, SharedState, shared_state
+
+# How often a retry checks on a run held by another worker
+_SHARED_POLL = 0.1
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request."""
+
+
+def request_fingerprint(data: Any) -> str:
+    """Hash of the request fields that must match for a key to be replayed."""
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    future: asyncio.Future
+    expires_at: float = float("inf")  # Set once the result is known
+
+
+class IdempotencyStore:
+    """Bounded map of idempotency keys to in-flight and completed results.
+
+    The first request with a key runs; repeats with the same key and request
+    wait for that run (if still in flight) or get its stored result, so the
+    Telegram calls happen once. The run is a task of its own, so a client that
+    times out and disconnects does not cancel it; its retry attaches instead.
+
+    Results are kept for ``ttl`` seconds and at most ``maxsize`` completed
+    keys, oldest evicted first; runs still in flight are never evicted. A run
+    that raises forgets the key so a retry runs again.
+
+    With a shared ``state``, the key is also claimed there, so a retry that
+    lands on another worker waits for the first worker's run and replays its
+    result (which must be JSON) instead of running again.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 24 * 3600, state: Optional[SharedState] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.state = state if state is not None and state.shared else None
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        excess = len(self._entries) - self.maxsize
+        stale = []
+        for key, entry in self._entries.items():
+            if not entry.future.done():
+                # In flight: dropping it would let a retry run the call a second time
+                continue
+            if entry.expires_at > now and excess <= 0:
+                break
+            stale.append(key)
+            excess -= 1
+        for key in stale:
+            del self._entries[key]
+
+    async def run(self, key: str, fingerprint: str, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """``(result, replayed)`` of ``call`` run at most once per ``key``."""
+        self._evict()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyConflict("Idempotency key was already used for a different request")
+            return await asyncio.shield(entry.future), True
+
+        lease = None
+        if self.state is not None:
+            lease = Lease(self.state, f"idempotency:{key}", settings.shared_state_lock_ttl,
+                          json.dumps({"fingerprint": fingerprint, "owner": uuid.uuid4().hex}))
+            while not await lease.try_acquire():
+                stored = await self.state.get(lease.key)
+                if stored is None:
+                    continue  # Released between the two calls; try again
+                stored = json.loads(stored)
+                if stored["fingerprint"] != fingerprint:
+                    raise IdempotencyConflict("Idempotency key was already used for a different request")
+                if "result" in stored:
+                    return stored["result"], True
+                # Another worker is running it
+                await asyncio.sleep(_SHARED_POLL)
+
+        entry = _Entry(fingerprint, asyncio.get_running_loop().create_future())
+        self._entries[key] = entry
+        self._evict()
+
+        async def execute() -> None:
+            try:
+                result = await call()
+            except BaseException as e:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                entry.future.set_exception(e)
+                # Mark retrieved so a failure nobody awaits does not log a warning
+                entry.future.exception()
+                if lease is not None:
+                    await lease.release()
+            else:
+                entry.expires_at = time.monotonic() + self.ttl
+                entry.future.set_result(result)
+                if lease is not None:
+                    await lease.release(json.dumps({"fingerprint": fingerprint, "result": result}, default=str), self.ttl)
+
+        task = asyncio.create_task(execute())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return await asyncio.shield(entry.future), False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Keys of POST /api/publish and /api/publish/fanout
+publish_idempotency = IdempotencyStore(settings.idempotency_max_keys, settings.idempotency_ttl, shared_state)
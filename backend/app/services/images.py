@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import io
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from ..core.config import settings
+from .media import DecodedImage
+from .metrics import image_normalize_duration, timed
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; images are then uploaded as-is
+    Image = None
+    ImageOps = None
+
+# Telegram rejects photos over 10 MB or with width + height over 10000
+TELEGRAM_PHOTO_MAX_BYTES = 10 * 1024 * 1024
+TELEGRAM_PHOTO_MAX_DIMENSIONS = 10000
+
+
+def _normalize(data: bytes, max_side: int, reencode_min_bytes: int, quality: int) -> Optional[Tuple[bytes, str]]:
+    """Downscale / re-encode one image. Runs in a worker process.
+
+    Returns ``(jpeg_bytes, mime)`` or ``None`` when the original is fine as-is.
+    """
+    with Image.open(io.BytesIO(data)) as im:
+        width, height = im.size
+        max_side = min(max_side, TELEGRAM_PHOTO_MAX_DIMENSIONS // 2)
+        resize = max(width, height) > max_side
+        reencode = resize or len(data) > TELEGRAM_PHOTO_MAX_BYTES or (im.format != "JPEG" and len(data) > reencode_min_bytes)
+        if not reencode or getattr(im, "is_animated", False):
+            return None
+        im = ImageOps.exif_transpose(im)
+        if resize:
+            im.thumbnail((max_side, max_side), Image.LANCZOS)
+        if im.mode in ("RGBA", "LA", "P"):
+            im = im.convert("RGBA")
+            background = Image.new("RGB", im.size, (255, 255, 255))
+            background.paste(im, mask=im.getchannel("A"))
+            im = background
+        elif im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        out = io.BytesIO()
+        im.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+    encoded = out.getvalue()
+    if not resize and len(encoded) >= len(data):
+        return None
+    return encoded, "image/jpeg"
+
+
+class ImageNormalizer:
+    """Fits uploads to Telegram's photo constraints off the event loop.
+
+    Encoding runs on a ``ProcessPoolExecutor`` (created on first use) and
+    results are memoized by the source content hash in a byte-bounded LRU.
+    """
+
+    def __init__(self) -> None:
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Source digest -> result, least recently used first; bounded by count and bytes
+        self._cache: "OrderedDict[str, Optional[Tuple[bytes, str]]]" = OrderedDict()
+        self._cached_bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None and settings.image_normalize
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=max(1, settings.image_workers))
+        return self._executor
+
+    def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _remember(self, digest: str, value: Optional[Tuple[bytes, str]]) -> None:
+        size = len(value[0]) if value else 0
+        if size > settings.image_cache_max_bytes:
+            return
+        previous = self._cache.pop(digest, None)
+        if previous:
+            self._cached_bytes -= len(previous[0])
+        self._cache[digest] = value
+        self._cached_bytes += size
+        # Every eviction goes through here so the byte total stays exact
+        while self._cache and (len(self._cache) > settings.image_cache_size or self._cached_bytes > settings.image_cache_max_bytes):
+            _, evicted = self._cache.popitem(last=False)
+            if evicted:
+                self._cached_bytes -= len(evicted[0])
+
+    async def normalize(self, image: DecodedImage) -> DecodedImage:
+        """Return ``image`` or a re-encoded replacement. The caller closes both."""
+        if not self.enabled:
+            return image
+        digest = image.sha256
+        if digest in self._cache:
+            self._cache.move_to_end(digest)
+            result = self._cache[digest]
+        else:
+            data = await asyncio.to_thread(image.read)
+            loop = asyncio.get_running_loop()
+            try:
+                with timed(image_normalize_duration):
+                    result = await loop.run_in_executor(
+                        self._pool(), _normalize, data,
+                        settings.image_max_side, settings.image_reencode_min_bytes, settings.image_jpeg_quality,
+                    )
+            except Exception:
+                # Not an image Pillow understands; let Telegram decide
+                result = None
+            del data
+            self._remember(digest, result)
+        if result is None:
+            return image
+        encoded, mime = result
+        normalized = DecodedImage(mime)
+        normalized.write(encoded)
+        normalized.rewind()
+        return normalized
+
+
+image_normalizer = ImageNormalizer()
@@ -0,0 +1,395 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple, TypeVar
+
+from ..core.config import settings
+from .state import Lease, SharedState, shared_state
+from .telegram import deliver_note, describe_error, prepare_post, verify_channel_access
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+UNFINISHED = (QUEUED, RUNNING)
+FINISHED = (DONE, FAILED)
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class JobStore:
+    """SQLite journal of publish jobs.
+
+    The payload (including the bot token) is kept only until the job finishes,
+    so unfinished jobs can be resumed after a restart. Queries run on one
+    dedicated thread, never on the event loop.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        # One thread owns the connection, so calls never interleave and run in submission order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="publish-jobs")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS publish_jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, chat_id TEXT NOT NULL,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL,"
+            " payload TEXT, parts TEXT NOT NULL DEFAULT '[]', result TEXT, error TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS publish_jobs_status ON publish_jobs (status)")
+
+    async def _run(self, call: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, call, *args)
+
+    async def create(self, job_id: str, chat_id: str, payload: Dict[str, Any]) -> None:
+        await self._run(self._create, job_id, chat_id, json.dumps(payload))
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        await self._run(self._update, job_id, _encode(fields))
+
+    def update_nowait(self, job_id: str, **fields: Any) -> None:
+        """``update`` from synchronous code; still applied before any later call."""
+        # Encoded here, since the caller may change the values before the thread gets to them
+        future = self._executor.submit(self._update, job_id, _encode(fields))
+        future.add_done_callback(_log_failure)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get, job_id)
+
+    async def payload(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._payload, job_id)
+
+    async def unfinished(self) -> List[str]:
+        return await self._run(self._unfinished)
+
+    async def pending_payloads(self) -> List[str]:
+        """Raw JSON payloads of jobs that have not finished."""
+        return await self._run(self._pending_payloads)
+
+    async def prune(self, older_than: float) -> None:
+        await self._run(self._prune, older_than)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._db.close()
+
+    def _create(self, job_id: str, chat_id: str, payload: str) -> None:
+        now = time.time()
+        self._db.execute(
+            "INSERT INTO publish_jobs (id, status, chat_id, created_at, updated_at, payload) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, chat_id, now, now, payload),
+        )
+
+    def _update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._db.execute(f"UPDATE publish_jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._db.execute("SELECT * FROM publish_jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def _payload(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._db.execute("SELECT payload FROM publish_jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["payload"]) if row and row["payload"] else None
+
+    def _unfinished(self) -> List[str]:
+        rows = self._db.execute(
+            "SELECT id FROM publish_jobs WHERE status IN (?, ?) ORDER BY created_at", UNFINISHED
+        ).fetchall()
+        return [row["id"] for row in rows]
+
+    def _pending_payloads(self) -> List[str]:
+        rows = self._db.execute("SELECT payload FROM publish_jobs WHERE payload IS NOT NULL").fetchall()
+        return [row[0] for row in rows]
+
+    def _prune(self, older_than: float) -> None:
+        self._db.execute(
+            "DELETE FROM publish_jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, older_than)
+        )
+
+
+def _encode(fields: Dict[str, Any]) -> Dict[str, Any]:
+    if "parts" in fields:
+        fields["parts"] = json.dumps(fields["parts"])
+    if "result" in fields and fields["result"] is not None:
+        fields["result"] = json.dumps(fields["result"])
+    if fields.get("status") in (DONE, FAILED):
+        fields["payload"] = None
+    return fields
+
+
+def _log_failure(future: "Future[None]") -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Failed to record job progress", exc_info=future.exception())
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    parts = json.loads(row["parts"])
+    return {
+        "id": row["id"],
+        "status": row["status"],
+        "channel_id": row["chat_id"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "parts_total": len(parts),
+        "parts_sent": sum(1 for p in parts if p.get("status") == "sent"),
+        "parts": parts,
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "error": row["error"],
+    }
+
+
+class PublishJobQueue:
+    """In-process worker pool running publishes in the background.
+
+    With a shared ``state``, every uvicorn worker runs a pool over the same
+    journal: a job runs in the worker it was submitted to, each job is claimed
+    before it runs so a resumed job runs in one worker only, and progress
+    streams for jobs running elsewhere follow the journal.
+    """
+
+    def __init__(self, state: SharedState) -> None:
+        self.state = state
+        self.store: Optional[JobStore] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._queued: Set[str] = set()
+        # job id -> queues of (event, data) for live progress streams
+        self._watchers: Dict[str, Set[asyncio.Queue]] = {}
+        # Awaited with the final job whenever a job finishes
+        self._listeners: List[Callable[[Dict[str, Any]], Awaitable[None]]] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self, path: Optional[Path] = None, workers: Optional[int] = None) -> None:
+        if self._workers:
+            return
+        self.store = JobStore(path or settings.jobs_db_path or settings.data_dir / "jobs.sqlite3")
+        await self.store.prune(time.time() - settings.jobs_retention_seconds)
+        self._queue = asyncio.Queue()
+        for _ in range(max(1, workers or settings.jobs_workers)):
+            self._workers.append(asyncio.create_task(self._worker()))
+        # Resume whatever was queued or running when the process stopped
+        for job_id in await self.store.unfinished():
+            self._enqueue(job_id)
+
+    async def stop(self) -> None:
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._queued.clear()
+        if self.store is not None:
+            # Interrupted jobs stay "running" in the journal and resume on next start
+            self.store.close()
+            self.store = None
+
+    async def submit(self, *, token: str, chat_id: str, html_content: str, title: str, verify_channel: bool = True,
+               job_id: Optional[str] = None, note_id: Optional[str] = None, edit: bool = True) -> Dict[str, Any]:
+        if self.store is None:
+            raise RuntimeError("Publish job queue is not running")
+        job_id = job_id or uuid.uuid4().hex
+        await self.store.create(job_id, chat_id, {
+            "token": token,
+            "chat_id": chat_id,
+            "html_content": html_content,
+            "title": title,
+            "verify_channel": verify_channel,
+            "note_id": note_id,
+            "edit": edit,
+        })
+        self._enqueue(job_id)
+        return await self.store.get(job_id)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.store.get(job_id) if self.store is not None else None
+
+    async def watch(self, job_id: str, heartbeat: Optional[float] = None) -> AsyncIterator[Tuple[Optional[str], Any]]:
+        """Live progress of a job as ``(event, data)`` pairs.
+
+        Starts with a ``job`` snapshot, then ``status``, ``parts`` and one
+        ``part`` event per part as it completes, and ends with ``done`` or
+        ``failed`` carrying the final job. ``(None, None)`` is yielded after
+        ``heartbeat`` idle seconds so callers can keep the connection alive.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        # Subscribe before the snapshot so no event falls in between
+        self._watchers.setdefault(job_id, set()).add(queue)
+        try:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            yield "job", job
+            if job["status"] in FINISHED:
+                yield job["status"], job
+                return
+            if self.state.shared and job_id not in self._queued:
+                # Running in another worker
+                async for item in self._follow(job, heartbeat):
+                    yield item
+                return
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None, None
+                    continue
+                yield event, data
+                if event in FINISHED:
+                    return
+        finally:
+            watchers = self._watchers.get(job_id)
+            if watchers is not None:
+                watchers.discard(queue)
+                if not watchers:
+                    del self._watchers[job_id]
+
+    async def _follow(self, job: Dict[str, Any], heartbeat: Optional[float]) -> AsyncIterator[Tuple[Optional[str], Any]]:
+        """``watch`` events of a job another worker runs, read from the journal."""
+        idle = 0.0
+        while True:
+            await asyncio.sleep(settings.shared_state_poll)
+            current = await self.get(job["id"])
+            if current is None:
+                return
+            events = list(_job_events(job, current))
+            job = current
+            if not events:
+                idle += settings.shared_state_poll
+                if heartbeat is not None and idle >= heartbeat:
+                    idle = 0.0
+                    yield None, None
+                continue
+            idle = 0.0
+            for event in events:
+                yield event
+            if current["status"] in FINISHED:
+                return
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        self._listeners.append(callback)
+
+    def _emit(self, job_id: str, event: str, data: Any) -> None:
+        for queue in self._watchers.get(job_id, ()):
+            queue.put_nowait((event, data))
+
+    async def _finish(self, job_id: str, status: str, **fields: Any) -> None:
+        await self.store.update(job_id, status=status, **fields)
+        job = await self.store.get(job_id)
+        self._emit(job_id, status, job)
+        for callback in self._listeners:
+            try:
+                await callback(job)
+            except Exception:
+                logger.exception("Job listener failed for %s", job_id)
+
+    def _enqueue(self, job_id: str) -> None:
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self._finish(job_id, FAILED, error=describe_error(e))
+            finally:
+                self._queued.discard(job_id)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        lease = None
+        if self.state.shared:
+            # Every worker resumes unfinished jobs on start; only one may run each
+            lease = Lease(self.state, f"job:{job_id}", settings.shared_state_lock_ttl)
+            if not await lease.try_acquire():
+                return
+        try:
+            await self._publish(job_id)
+        finally:
+            if lease is not None:
+                await lease.release()
+
+    async def _publish(self, job_id: str) -> None:
+        store = self.store
+        job = await store.get(job_id)
+        payload = await store.payload(job_id)
+        if job is None or payload is None:
+            return
+        parts = job["parts"]
+        resumed = any(p.get("status") == "sent" for p in parts)
+        await store.update(job_id, status=RUNNING)
+        self._emit(job_id, "status", {"status": RUNNING})
+        token, chat_id = payload["token"], payload["chat_id"]
+
+        if payload.get("verify_channel", True) and not resumed:
+            verification = await verify_channel_access(token, chat_id)
+            if not verification.get("accessible", False):
+                await self._finish(job_id, FAILED, error=f"Cannot access channel: {verification.get('error', 'Unknown error')}")
+                return
+
+        post = await prepare_post(payload["html_content"], payload["title"])
+        try:
+            if len(parts) != post.part_count:
+                parts = [dict(p, status="pending") for p in post.describe_parts()]
+                await store.update(job_id, parts=parts)
+            self._emit(job_id, "parts", {"parts": parts})
+            # Resume with every part Telegram has not accepted yet, wherever it is
+            sent = frozenset(i for i, p in enumerate(parts) if p.get("status") == "sent")
+
+            def on_part(index: int, result: Optional[dict], error: Optional[Exception], elapsed: float) -> None:
+                parts[index].update(
+                    status="sent" if error is None else "failed",
+                    latency_ms=round(elapsed * 1000, 1),
+                    error=describe_error(error) if error is not None else None,
+                )
+                store.update_nowait(job_id, parts=parts)
+                self._emit(job_id, "part", {
+                    **parts[index],
+                    "parts_sent": sum(1 for p in parts if p.get("status") == "sent"),
+                    "parts_total": len(parts),
+                })
+
+            result = await deliver_note(post, token, chat_id, note_id=payload.get("note_id"),
+                                        edit=payload.get("edit", True), skip=sent, on_part=on_part)
+        finally:
+            post.close()
+        await self._finish(job_id, DONE, result=result, error=None)
+
+
+def _job_events(before: Dict[str, Any], after: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """The events ``watch`` sends for the progress between two snapshots of a job."""
+    if after["status"] != before["status"] and after["status"] not in FINISHED:
+        yield "status", {"status": after["status"]}
+    parts, previous = after["parts"], before["parts"]
+    if [p.get("kind") for p in parts] != [p.get("kind") for p in previous]:
+        yield "parts", {"parts": parts}
+        previous = [{}] * len(parts)
+    for part, old in zip(parts, previous):
+        if part != old and part.get("status") in ("sent", "failed"):
+            yield "part", {**part, "parts_sent": after["parts_sent"], "parts_total": after["parts_total"]}
+    if after["status"] in FINISHED:
+        yield after["status"], after
+
+
+publish_jobs = PublishJobQueue(shared_state)
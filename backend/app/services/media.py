@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import binascii
+import hashlib
+import io
+import re
+import tempfile
+import threading
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from ..core.config import settings
+
+# Base64 characters decoded per step; a multiple of 4 so chunks decode independently
+_DECODE_CHUNK_CHARS = 256 * 1024
+_WHITESPACE_RE = re.compile(r"\s+")
+# Headers are short; never scan a multi-megabyte payload looking for the comma
+_MAX_HEADER_CHARS = 256
+
+# Bytes of decoded image data currently held in RAM (spilled buffers live on disk)
+_memory = {"current": 0, "peak": 0}
+_memory_lock = threading.Lock()
+
+
+def memory_stats() -> Dict[str, int]:
+    """Current and peak decoded image bytes held in memory across all publishes."""
+    with _memory_lock:
+        return dict(_memory)
+
+
+def reset_memory_peak() -> None:
+    with _memory_lock:
+        _memory["peak"] = _memory["current"]
+
+
+def parse_data_url_header(data_url: str) -> Tuple[str, int]:
+    """Return ``(mime, payload_offset)`` for a base64 ``data:`` URL."""
+    comma = data_url.find(",", 0, _MAX_HEADER_CHARS)
+    if data_url[:5].lower() != "data:" or comma == -1:
+        raise ValueError("Unsupported data URL format")
+    params = data_url[5:comma].split(";")
+    if "base64" not in (p.strip().lower() for p in params[1:]):
+        raise ValueError("Unsupported data URL format")
+    mime = params[0].strip() or "application/octet-stream"
+    return mime, comma + 1
+
+
+class DecodedImage:
+    """Decoded image bytes in a spooled buffer.
+
+    Data stays in a ``BytesIO`` up to ``media_spool_max_bytes`` and moves to an
+    anonymous temp file beyond that, so memory per image is bounded. ``file``
+    can be passed straight to httpx, which streams it into the multipart body.
+    """
+
+    def __init__(self, mime: str, max_memory: Optional[int] = None) -> None:
+        self.mime = mime
+        self.size = 0
+        self.file: BinaryIO = io.BytesIO()
+        self._hash = hashlib.sha256()
+        self._max_memory = settings.media_spool_max_bytes if max_memory is None else max_memory
+        self._in_memory = True
+        self.closed = False
+
+    @property
+    def filename(self) -> str:
+        return f"image.{self.mime.split('/')[-1]}"
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def in_memory(self) -> bool:
+        return self._in_memory
+
+    def write(self, chunk: bytes) -> None:
+        if self._in_memory and self.size + len(chunk) > self._max_memory:
+            self._spill()
+        self.file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if self._in_memory:
+            _track(len(chunk))
+
+    def _spill(self) -> None:
+        spooled = tempfile.TemporaryFile()
+        with self.file.getbuffer() as view:
+            spooled.write(view)
+        self.file.close()
+        self.file = spooled
+        self._in_memory = False
+        _track(-self.size)
+
+    def rewind(self) -> BinaryIO:
+        self.file.seek(0)
+        return self.file
+
+    def read(self) -> bytes:
+        return self.rewind().read()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self._in_memory:
+            _track(-self.size)
+        self.file.close()
+
+    def __enter__(self) -> "DecodedImage":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _track(delta: int) -> None:
+    # Decoding runs in worker threads
+    with _memory_lock:
+        _memory["current"] += delta
+        if _memory["current"] > _memory["peak"]:
+            _memory["peak"] = _memory["current"]
+
+
+def decode_data_url(data_url: str, *, max_memory: Optional[int] = None) -> DecodedImage:
+    """Decode a base64 data URL chunk by chunk into a :class:`DecodedImage`.
+
+    Never materialises the whole payload as one ``bytes`` object; the content
+    hash is computed on the way through.
+    """
+    mime, offset = parse_data_url_header(data_url)
+    image = DecodedImage(mime, max_memory)
+    carry = ""
+    try:
+        end = len(data_url)
+        pos = offset
+        while pos < end:
+            chunk = data_url[pos:pos + _DECODE_CHUNK_CHARS]
+            pos += _DECODE_CHUNK_CHARS
+            if _WHITESPACE_RE.search(chunk):
+                chunk = _WHITESPACE_RE.sub("", chunk)
+            if carry:
+                chunk = carry + chunk
+            usable = len(chunk) - len(chunk) % 4
+            carry = chunk[usable:]
+            if usable:
+                image.write(binascii.a2b_base64(chunk[:usable]))
+        if carry.rstrip("="):
+            # Browsers accept unpadded payloads; pad the tail instead of failing
+            image.write(binascii.a2b_base64(carry + "=" * (-len(carry) % 4)))
+    except (binascii.Error, ValueError) as e:
+        image.close()
+        raise ValueError(f"Invalid base64 data URL: {e}") from e
+    except BaseException:
+        image.close()
+        raise
+    image.rewind()
+    return image
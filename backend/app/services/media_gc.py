@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import List, Optional, Set, Tuple
+
+from ..core.config import settings
+from . import drafts
+from .blobs import BlobStore, blob_store, referenced_digests
+from .jobs import PublishJobQueue, publish_jobs
+from .scheduler import PostScheduler, post_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class MediaCollector:
+    """Keeps uploaded images within ``MEDIA_MAX_TOTAL_BYTES`` and ``MEDIA_RETENTION_SECONDS``.
+
+    Images embedded in a server-side draft, an unfinished publish job or a
+    scheduled post are never deleted. Anything else may only live in a
+    browser's local draft, so it is kept until it expires or the store is
+    full rather than deleted as soon as nothing on the server refers to it.
+    """
+
+    def __init__(self, store: BlobStore, jobs: PublishJobQueue, scheduler: PostScheduler) -> None:
+        self.store = store
+        self._jobs = jobs
+        self._scheduler = scheduler
+        self._task: Optional[asyncio.Task] = None
+        # Uploads that hit the quota together wait for one sweep
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        if self._task is None and settings.media_gc_interval > 0:
+            self._task = asyncio.create_task(self._main())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def collect(self, room: int = 0) -> Tuple[int, int]:
+        """Sweep the store, freeing ``room`` bytes below the quota if possible; returns ``(blobs, bytes)`` deleted."""
+        max_bytes = settings.media_max_total_bytes
+        async with self._lock:
+            # Read before the sweep thread starts; the job journal answers on its own thread
+            jobs = await self._jobs.store.pending_payloads() if self._jobs.store is not None else []
+            return await asyncio.to_thread(
+                self._sweep, jobs, max(1, max_bytes - room) if max_bytes > 0 else 0, settings.media_retention_seconds,
+            )
+
+    async def reserve(self, size: int) -> bool:
+        """Whether ``size`` more bytes fit under the quota, sweeping once if they don't."""
+        max_bytes = settings.media_max_total_bytes
+        if max_bytes <= 0:
+            return True
+        if await self.store.usage() + size <= max_bytes:
+            return True
+        await self.collect(room=size)
+        return await self.store.usage() + size <= max_bytes
+
+    def _sweep(self, jobs: List[str], max_bytes: int, retention: float) -> Tuple[int, int]:
+        removed, freed = self.store.sweep(self._referenced(jobs), max_bytes=max_bytes, retention=retention)
+        if removed:
+            logger.info("Deleted %d unused images (%d bytes)", removed, freed)
+        return removed, freed
+
+    def _referenced(self, jobs: List[str]) -> Set[str]:
+        texts: List[str] = list(jobs)
+        draft_store = drafts.get_store()
+        if draft_store is not None:
+            texts.extend(draft_store.contents())
+        if self._scheduler.store is not None:
+            texts.extend(self._scheduler.store.pending_payloads())
+        return referenced_digests(texts)
+
+    async def _main(self) -> None:
+        while True:
+            try:
+                await self.collect()
+            except Exception:
+                logger.exception("Media sweep failed")
+            await asyncio.sleep(settings.media_gc_interval)
+
+
+media_collector = MediaCollector(blob_store, publish_jobs, post_scheduler)
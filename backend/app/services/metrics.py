@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Latency buckets from 5 ms to 2 minutes; publishes with large albums take seconds
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_BYTES_BUCKETS = (1024, 16 * 1024, 128 * 1024, 512 * 1024, 1024 ** 2, 4 * 1024 ** 2, 10 * 1024 ** 2, 50 * 1024 ** 2)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time to serve an HTTP request, by route template.",
+    ("method", "route", "status"),
+    buckets=_LATENCY_BUCKETS,
+)
+telegram_request_duration = Histogram(
+    "telegram_request_duration_seconds",
+    "Time for one Bot API HTTP call, excluding rate-limit waits.",
+    ("method", "status"),
+    buckets=_LATENCY_BUCKETS,
+)
+telegram_upload_bytes = Histogram(
+    "telegram_upload_bytes",
+    "Request body size of Bot API calls.",
+    ("method",),
+    buckets=_BYTES_BUCKETS,
+)
+telegram_retries = Counter(
+    "telegram_retries_total",
+    "Bot API calls retried, by reason (429, stale_file_id).",
+    ("method", "reason"),
+)
+telegram_rate_limited = Counter(
+    "telegram_rate_limited_total",
+    "Bot API calls answered with 429 Too Many Requests.",
+    ("method",),
+)
+publish_part_failures = Counter(
+    "publish_part_failures_total",
+    "Post parts that failed to send while the rest of the post went out.",
+    ("kind",),
+)
+publish_edits = Counter(
+    "publish_edits_total",
+    "Bot API edit calls made while republishing a note, by part kind.",
+    ("kind",),
+)
+conversion_duration = Histogram(
+    "html_conversion_seconds",
+    "Time to convert note HTML to Telegram HTML.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+image_normalize_duration = Histogram(
+    "image_normalize_seconds",
+    "Time to downscale / re-encode one image in the worker pool.",
+    buckets=_LATENCY_BUCKETS,
+)
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """Observe the duration of the ``with`` block, even when it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        (histogram.labels(**labels) if labels else histogram).observe(time.perf_counter() - started)
+
+
+def render() -> tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording ``http_request_duration_seconds``.
+
+    Requests are labelled by route template (``/api/publish/jobs/{job_id}``) so
+    path parameters do not explode label cardinality; anything not matched by
+    an API route (static files, 404s) is grouped under ``other``.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "other"
+            http_request_duration.labels(scope["method"], route, str(status)).observe(time.perf_counter() - started)
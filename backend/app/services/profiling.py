@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import logging
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from ..core.config import settings
+from .sse import accepts_event_stream
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # pyinstrument is optional; profiling is then unavailable
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+
+
+def profiles_dir() -> Path:
+    return settings.data_dir / "profiles"
+
+
+def _prune(directory: Path, keep: int) -> None:
+    files = sorted(directory.glob("*.html"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in files[max(0, keep):]:
+        path.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """Opt-in sampling profiler for slow requests.
+
+    With ``PROFILING_ENABLED`` every request under ``PROFILING_PATHS`` is sampled
+    and the profile is kept when it took at least ``PROFILING_MIN_SECONDS``.
+    With ``PROFILING_HEADER`` a client can send ``X-Profile: 1`` to always keep
+    one; the file name is returned in the ``X-Profile`` response header. Only
+    one request is profiled at a time to bound the overhead.
+
+    Profiles are pyinstrument HTML reports in ``<data_dir>/profiles``.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self._active = False
+
+    def _wanted(self, scope) -> Optional[bool]:
+        """``None`` to skip, else whether the profile is kept regardless of duration."""
+        if scope["type"] != "http" or Profiler is None or self._active:
+            return None
+        if accepts_event_stream(scope):
+            # A stream stays open as long as the client listens; its duration says nothing
+            return None
+        if settings.profiling_header:
+            for name, value in scope.get("headers") or ():
+                if name == PROFILE_HEADER and value.strip() not in (b"", b"0", b"false"):
+                    return True
+        if settings.profiling_enabled and any(scope["path"].startswith(p) for p in settings.profiling_paths):
+            return False
+        return None
+
+    async def __call__(self, scope, receive, send) -> None:
+        forced = self._wanted(scope)
+        if forced is None:
+            await self.app(scope, receive, send)
+            return
+
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.html"
+
+        async def send_wrapper(message) -> None:
+            if forced and message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (PROFILE_HEADER, name.encode())]}
+            await send(message)
+
+        self._active = True
+        profiler = Profiler(interval=settings.profiling_interval, async_mode="enabled")
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            self._active = False
+            elapsed = time.perf_counter() - started
+            if forced or elapsed >= settings.profiling_min_seconds:
+                self._save(profiler, name, scope, elapsed)
+
+    @staticmethod
+    def _save(profiler, name: str, scope, elapsed: float) -> None:
+        try:
+            directory = profiles_dir()
+            directory.mkdir(parents=True, exist_ok=True)
+            (directory / name).write_text(profiler.output_html(), encoding="utf-8")
+            _prune(directory, settings.profiling_max_files)
+            logger.info("Profiled %s %s (%.3fs) -> %s", scope["method"], scope["path"], elapsed, directory / name)
+        except Exception:
+            logger.exception("Failed to write profile %s", name)
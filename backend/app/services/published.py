@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from ..core.config import settings
+from .cache import token_hash
+
+T = TypeVar("T")
+
+
+class PublishedStore:
+    """Message ids a note was published as, per bot and chat.
+
+    Each part is stored with the message ids Telegram returned and hashes of
+    what was sent (text, caption, image digests or URLs), so a republish can
+    edit only the parts that changed.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        # Queries run on one thread that owns the connection, never on the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="published-notes")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS published_notes ("
+            " note_id TEXT NOT NULL, token_hash TEXT NOT NULL, chat_id TEXT NOT NULL,"
+            " parts TEXT NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (note_id, token_hash, chat_id))"
+        )
+
+    async def _run(self, call: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, call, *args)
+
+    async def get(self, note_id: str, token: str, chat_id: str) -> Optional[List[Dict[str, Any]]]:
+        return await self._run(self._get, note_id, token_hash(token), chat_id)
+
+    async def put(self, note_id: str, token: str, chat_id: str, parts: List[Dict[str, Any]]) -> None:
+        await self._run(self._put, note_id, token_hash(token), chat_id, json.dumps(parts))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._db.close()
+
+    def _get(self, note_id: str, token_key: str, chat_id: str) -> Optional[List[Dict[str, Any]]]:
+        row = self._db.execute(
+            "SELECT parts FROM published_notes WHERE note_id = ? AND token_hash = ? AND chat_id = ?",
+            (note_id, token_key, chat_id),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, note_id: str, token_key: str, chat_id: str, parts: str) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO published_notes (note_id, token_hash, chat_id, parts, updated_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (note_id, token_key, chat_id, parts, time.time()),
+        )
+
+
+# Opened on startup when REPUBLISH_ENABLED is set
+_store: Optional[PublishedStore] = None
+
+
+def init_store(path: Optional[Path] = None) -> PublishedStore:
+    global _store
+    if _store is None:
+        _store = PublishedStore(path or settings.published_db_path or settings.data_dir / "published.sqlite3")
+    return _store
+
+
+def get_store() -> Optional[PublishedStore]:
+    return _store
+
+
+def close_store() -> None:
+    global _store
+    store, _store = _store, None
+    if store is not None:
+        store.close()
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+from typing import AsyncContextManager, Dict, Optional, Tuple
+
+from ..core.config import settings
+from .cache import token_hash
+from .state import SharedLock, SharedState, shared_state
+
+# Unheld chat locks are dropped once this many chats have been seen
+_MAX_CHAT_LOCKS = 10000
+
+
+def is_private_chat(chat_id: str) -> bool:
+    # Groups and channels have negative ids or @usernames; users have positive ids
+    return chat_id.lstrip().isdigit()
+
+
+class TelegramRateLimiter:
+    """Telegram's send limits as token buckets.
+
+    One global bucket per bot (~30 messages/s) and one bucket per chat (~20
+    messages/min for groups and channels, ~1/s for private chats). Per-chat
+    locks let callers keep a chat's messages in order across concurrent posts.
+
+    Buckets live in ``state``, so with a shared backend all workers draw from
+    the same budget, and chat locks are held across workers too.
+    """
+
+    def __init__(self, state: SharedState) -> None:
+        self.state = state
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+    def _global_bucket(self) -> Tuple[float, float]:
+        rate = settings.telegram_global_rate
+        return rate, max(1.0, rate)
+
+    def _chat_bucket(self, chat_id: str) -> Tuple[float, float]:
+        if is_private_chat(chat_id):
+            return settings.telegram_private_chat_rate, max(1.0, settings.telegram_private_chat_rate)
+        return settings.telegram_group_chat_rate_per_minute / 60.0, max(1.0, float(settings.telegram_group_chat_burst))
+
+    async def acquire(self, token: str, chat_id: Optional[str] = None, cost: float = 1.0) -> None:
+        """Wait until ``cost`` messages may be sent (to ``chat_id`` if given)."""
+        if not settings.telegram_rate_limit:
+            return
+        key = token_hash(token)
+        if chat_id is not None:
+            wait = await self.state.reserve(f"rate:{key}:{chat_id}", *self._chat_bucket(str(chat_id)), cost)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        # Only once the chat allows it, so a send held back by its chat does not sit on global budget
+        wait = await self.state.reserve(f"rate:{key}", *self._global_bucket(), cost)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def retry_after(self, token: str, chat_id: Optional[str], seconds: float) -> None:
+        """Apply a 429 ``retry_after`` to the chat it came from, or the whole bot."""
+        key = token_hash(token)
+        if chat_id is not None:
+            await self.state.pause(f"rate:{key}:{chat_id}", *self._chat_bucket(str(chat_id)), seconds)
+        else:
+            await self.state.pause(f"rate:{key}", *self._global_bucket(), seconds)
+
+    def chat_lock(self, token: str, chat_id: str) -> AsyncContextManager:
+        """FIFO lock serialising sends to one chat."""
+        lock_key = (token_hash(token), str(chat_id))
+        lock = self._locks.get(lock_key)
+        if lock is None:
+            if len(self._locks) >= _MAX_CHAT_LOCKS:
+                for unused in [k for k, held in self._locks.items() if not held.locked()]:
+                    del self._locks[unused]
+            lock = self._locks[lock_key] = asyncio.Lock()
+        if not self.state.shared:
+            return lock
+        return SharedLock(lock, self.state, f"chat-lock:{lock_key[0]}:{lock_key[1]}", settings.shared_state_lock_ttl)
+
+
+rate_limiter = TelegramRateLimiter(shared_state)
@@ -0,0 +1,432 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from .jobs import DONE, FAILED, FINISHED, PublishJobQueue, publish_jobs
+from .state import Lease, SharedState, shared_state
+
+SCHEDULED = "scheduled"
+QUEUED = "queued"  # Handed to the publish job queue; the job has the post's id
+CANCELLED = "cancelled"
+
+# Rows written this long before the last sync are read again, in case their commit was late
+_SYNC_MARGIN = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduleConflict(Exception):
+    """The post is no longer scheduled (already handed off, finished or cancelled)."""
+
+
+class ScheduleStore:
+    """SQLite store of scheduled posts.
+
+    Like the job journal, the payload (including the bot token) is kept only
+    until the post is handed to the job queue.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scheduled_posts ("
+            " id TEXT PRIMARY KEY, channel_id TEXT NOT NULL, title TEXT NOT NULL DEFAULT '',"
+            " publish_at REAL NOT NULL, status TEXT NOT NULL,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL,"
+            " payload TEXT, job_id TEXT, error TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS scheduled_posts_due ON scheduled_posts (status, publish_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS scheduled_posts_channel ON scheduled_posts (channel_id, publish_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS scheduled_posts_updated ON scheduled_posts (status, updated_at)")
+
+    def create(self, post_id: str, channel_id: str, title: str, publish_at: float, payload: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO scheduled_posts (id, channel_id, title, publish_at, status, created_at, updated_at, payload)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (post_id, channel_id, title, publish_at, SCHEDULED, now, now, json.dumps(payload)),
+            )
+
+    def update(self, post_id: str, **fields: Any) -> None:
+        if fields.get("status") not in (None, SCHEDULED):
+            fields["payload"] = None
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE scheduled_posts SET {columns} WHERE id = ?", (*fields.values(), post_id))
+
+    def get(self, post_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM scheduled_posts WHERE id = ?", (post_id,)).fetchone()
+        return _row_to_post(row) if row else None
+
+    def payload(self, post_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT payload FROM scheduled_posts WHERE id = ?", (post_id,)).fetchone()
+        return json.loads(row["payload"]) if row and row["payload"] else None
+
+    def list(self, *, channel_id: Optional[str] = None, status: Optional[str] = None,
+             after: Optional[Tuple[float, str]] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Posts ordered by ``(publish_at, id)``, starting after the ``after`` key."""
+        clauses, params = [], []
+        if channel_id is not None:
+            clauses.append("channel_id = ?")
+            params.append(channel_id)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if after is not None:
+            clauses.append("(publish_at, id) > (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM scheduled_posts {where} ORDER BY publish_at, id LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [_row_to_post(row) for row in rows]
+
+    def pending(self, updated_after: Optional[float] = None) -> List[Tuple[float, str]]:
+        """``(publish_at, id)`` of every post still waiting for its time (changed after ``updated_after``)."""
+        with self._lock:
+            if updated_after is None:
+                rows = self._db.execute(
+                    "SELECT publish_at, id FROM scheduled_posts WHERE status = ?", (SCHEDULED,)
+                ).fetchall()
+            else:
+                rows = self._db.execute(
+                    "SELECT publish_at, id FROM scheduled_posts WHERE status = ? AND updated_at > ?",
+                    (SCHEDULED, updated_after),
+                ).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def handed_off(self) -> List[Tuple[str, str, str]]:
+        """``(id, channel_id, job_id)`` of posts whose job may still be running."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, channel_id, job_id FROM scheduled_posts WHERE status = ?", (QUEUED,)
+            ).fetchall()
+        return [(row[0], row[1], row[2]) for row in rows]
+
+    def pending_payloads(self) -> List[str]:
+        """Raw JSON payloads of posts still waiting for their time."""
+        with self._lock:
+            rows = self._db.execute("SELECT payload FROM scheduled_posts WHERE payload IS NOT NULL").fetchall()
+        return [row[0] for row in rows]
+
+    def prune(self, older_than: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM scheduled_posts WHERE status IN (?, ?, ?) AND updated_at < ?",
+                (DONE, FAILED, CANCELLED, older_than),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def _row_to_post(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "channel_id": row["channel_id"],
+        "title": row["title"],
+        "publish_at": row["publish_at"],
+        "status": row["status"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "job_id": row["job_id"],
+        "error": row["error"],
+    }
+
+
+class PostScheduler:
+    """Publishes stored posts at their scheduled time through the job queue.
+
+    Pending posts live in SQLite; memory holds only a heap of
+    ``(publish_at, id)`` pairs, so tens of thousands of posts cost a few MB
+    and a restart rebuilds the heap with one indexed query. A single task
+    sleeps until the earliest entry is due and is woken early only when a
+    sooner post is scheduled. Cancelled and rescheduled posts leave their old
+    heap entry behind; it is recognized as stale when it comes up, and the
+    heap is rebuilt once stale entries outnumber live ones.
+
+    Due posts become publish jobs (with the post's id as job id) with at most
+    ``SCHEDULER_CHANNEL_CONCURRENCY`` jobs per channel in flight; the rest
+    wait in a per-channel queue in due order. A job may finish in any worker,
+    so while jobs are in flight their status is also read back from the job
+    journal every ``SHARED_STATE_POLL`` seconds to free their slots.
+
+    With a shared ``state``, every worker serves the API from the store but
+    only the worker holding the ``scheduler`` lease keeps the heap and hands
+    posts off; another takes over if it dies. The leader reads posts changed
+    through other workers every ``SHARED_STATE_POLL`` seconds.
+    """
+
+    def __init__(self, jobs: PublishJobQueue, state: SharedState) -> None:
+        self.jobs = jobs
+        self.state = state
+        self.store: Optional[ScheduleStore] = None
+        self.leading = False
+        self._lease: Optional[Lease] = None
+        self._synced = 0.0
+        # Heap entries pushed in the last sync window, so a sync does not add them twice
+        self._recent: Dict[Tuple[float, str], float] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._stale = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # channel -> ids of due posts waiting for a free slot
+        self._waiting: Dict[str, Deque[Tuple[float, str]]] = defaultdict(deque)
+        self._in_flight: Dict[str, int] = defaultdict(int)
+        # job id -> channel, for posts handed to the job queue
+        self._handed_off: Dict[str, str] = {}
+        jobs.add_listener(self._on_job_finished)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self, path: Optional[Path] = None) -> None:
+        if self._task is not None:
+            return
+        self.store = ScheduleStore(path or settings.scheduler_db_path or settings.data_dir / "schedule.sqlite3")
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._main())
+
+    async def _main(self) -> None:
+        if self.state.shared:
+            self._lease = Lease(self.state, "scheduler", settings.shared_state_lock_ttl)
+            await self._lease.acquire(poll=settings.shared_state_lock_ttl / 3)
+        self._synced = time.time()
+        self.store.prune(self._synced - settings.jobs_retention_seconds)
+        # Reattach posts whose jobs were still running when the process stopped
+        for post_id, channel_id, job_id in self.store.handed_off():
+            job = await self.jobs.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                self._settle(post_id, job)
+            else:
+                self._handed_off[job_id] = channel_id
+                self._in_flight[channel_id] += 1
+        self._heap = self.store.pending()
+        heapq.heapify(self._heap)
+        self.leading = True
+        await self._run()
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if self._lease is not None:
+            await self._lease.release()
+            self._lease = None
+        self.leading = False
+        self._heap, self._stale = [], 0
+        self._recent.clear()
+        self._waiting.clear()
+        self._in_flight.clear()
+        self._handed_off.clear()
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def _require_store(self) -> ScheduleStore:
+        if self.store is None:
+            raise RuntimeError("Scheduler is not running")
+        return self.store
+
+    def schedule(self, *, token: str, chat_id: str, html_content: str, title: str, publish_at: float,
+                 verify_channel: bool = True) -> Dict[str, Any]:
+        store = self._require_store()
+        post_id = uuid.uuid4().hex
+        store.create(post_id, chat_id, title, publish_at, {
+            "token": token,
+            "html_content": html_content,
+            "verify_channel": verify_channel,
+        })
+        self._push(publish_at, post_id)
+        return store.get(post_id)
+
+    def reschedule(self, post_id: str, publish_at: float) -> Optional[Dict[str, Any]]:
+        store = self._require_store()
+        post = store.get(post_id)
+        if post is None:
+            return None
+        if post["status"] != SCHEDULED:
+            raise ScheduleConflict(f"Post is {post['status']}")
+        store.update(post_id, publish_at=publish_at)
+        self._stale += 1
+        self._push(publish_at, post_id)
+        return store.get(post_id)
+
+    def cancel(self, post_id: str) -> Optional[Dict[str, Any]]:
+        store = self._require_store()
+        post = store.get(post_id)
+        if post is None:
+            return None
+        if post["status"] != SCHEDULED:
+            raise ScheduleConflict(f"Post is {post['status']}")
+        store.update(post_id, status=CANCELLED)
+        self._stale += 1
+        self._compact()
+        return store.get(post_id)
+
+    def get(self, post_id: str) -> Optional[Dict[str, Any]]:
+        return self._require_store().get(post_id)
+
+    def list(self, **filters: Any) -> List[Dict[str, Any]]:
+        return self._require_store().list(**filters)
+
+    def _push(self, publish_at: float, post_id: str) -> None:
+        if not self.leading:
+            # The leader picks the post up from the store
+            return
+        if self.state.shared:
+            self._recent[(publish_at, post_id)] = time.time()
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (publish_at, post_id))
+        if earliest is None or publish_at < earliest:
+            self._wakeup.set()
+        self._compact()
+
+    def _compact(self) -> None:
+        if self.leading and self._stale > 1024 and self._stale * 2 > len(self._heap):
+            self._heap = self.store.pending()
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+    def _sync(self) -> None:
+        """Add posts scheduled or rescheduled through other workers to the heap."""
+        now = time.time()
+        since, self._synced = self._synced - _SYNC_MARGIN, now
+        self._recent = {entry: pushed_at for entry, pushed_at in self._recent.items() if pushed_at > since}
+        for entry in self.store.pending(updated_after=since):
+            if entry not in self._recent:
+                self._recent[entry] = now
+                heapq.heappush(self._heap, entry)
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if self.state.shared:
+                self._sync()
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                publish_at, post_id = heapq.heappop(self._heap)
+                try:
+                    await self._due(publish_at, post_id)
+                except Exception:
+                    logger.exception("Failed to hand off scheduled post %s", post_id)
+            await self._reap()
+            timeout = self._heap[0][0] - now if self._heap else None
+            if self.state.shared or self._handed_off:
+                timeout = min(timeout, settings.shared_state_poll) if timeout is not None else settings.shared_state_poll
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _live(self, publish_at: float, post_id: str) -> Optional[Dict[str, Any]]:
+        """The stored post, if a heap or queue entry still matches it."""
+        post = self.store.get(post_id)
+        if post is None or post["status"] != SCHEDULED or post["publish_at"] != publish_at:
+            return None
+        return post
+
+    def _has_slot(self, channel_id: str) -> bool:
+        return self._in_flight.get(channel_id, 0) < max(1, settings.scheduler_channel_concurrency)
+
+    async def _due(self, publish_at: float, post_id: str) -> None:
+        post = self._live(publish_at, post_id)
+        if post is None:
+            self._stale = max(0, self._stale - 1)
+        elif self._has_slot(post["channel_id"]):
+            await self._dispatch(post)
+        else:
+            self._waiting[post["channel_id"]].append((publish_at, post_id))
+
+    async def _dispatch(self, post: Dict[str, Any]) -> None:
+        post_id, channel_id = post["id"], post["channel_id"]
+        # Take the slot before waiting on the journal, so a slot freed meanwhile is not handed out twice
+        self._in_flight[channel_id] += 1
+        try:
+            # The job id is the post id, so a crash between these steps cannot publish twice
+            job = await self.jobs.get(post_id)
+            if job is None:
+                payload = self.store.payload(post_id)
+                job = await self.jobs.submit(
+                    token=payload["token"],
+                    chat_id=channel_id,
+                    html_content=payload["html_content"],
+                    title=post["title"],
+                    verify_channel=payload.get("verify_channel", True),
+                    job_id=post_id,
+                )
+            self.store.update(post_id, status=QUEUED, job_id=job["id"])
+        except BaseException:
+            self._free(channel_id)
+            raise
+        if job["status"] in FINISHED:
+            self._settle(post_id, job)
+            self._free(channel_id)
+            return
+        self._handed_off[job["id"]] = channel_id
+
+    def _free(self, channel_id: str) -> None:
+        self._in_flight[channel_id] -= 1
+        if self._in_flight[channel_id] <= 0:
+            del self._in_flight[channel_id]
+
+    def _settle(self, post_id: str, job: Optional[Dict[str, Any]]) -> None:
+        if job is None:
+            self.store.update(post_id, status=FAILED, error="Publish job was lost")
+        else:
+            self.store.update(post_id, status=job["status"], error=job.get("error"))
+
+    async def _reap(self) -> None:
+        """Free the slots of handed-off jobs that finished, wherever they ran."""
+        if self.jobs.store is None:
+            return
+        for job_id in list(self._handed_off):
+            job = await self.jobs.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                await self._release(job_id, job)
+
+    async def _on_job_finished(self, job: Dict[str, Any]) -> None:
+        # Jobs finishing in this worker free their slot right away
+        await self._release(job["id"], job)
+
+    async def _release(self, job_id: str, job: Optional[Dict[str, Any]]) -> None:
+        channel_id = self._handed_off.pop(job_id, None)
+        if channel_id is None or self.store is None:
+            return
+        self._settle(job_id, job)
+        self._free(channel_id)
+        # Hand the channel's next due post the freed slot
+        waiting = self._waiting.get(channel_id)
+        while waiting and self._has_slot(channel_id):
+            post = self._live(*waiting.popleft())
+            if post is not None:
+                await self._dispatch(post)
+        if waiting is not None and not waiting:
+            del self._waiting[channel_id]
+
+
+post_scheduler = PostScheduler(publish_jobs, shared_state)
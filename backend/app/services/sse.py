@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+
+EVENT_STREAM = "text/event-stream"
+# Sent as an SSE comment so proxies and browsers keep an idle stream open
+KEEP_ALIVE = b": keep-alive\n\n"
+
+
+def format_event(event: str, data: Any, event_id: Optional[str] = None) -> bytes:
+    """One Server-Sent Event with a JSON ``data`` line."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def accepts_event_stream(scope) -> bool:
+    """Whether the request asks for an event stream (``EventSource`` always does)."""
+    for name, value in scope.get("headers") or ():
+        if name == b"accept" and EVENT_STREAM.encode() in value:
+            return True
+    return False
+
+
+class _GZipResponder(GZipResponder):
+    """Skips images and weakens the ETag of bodies it compresses.
+
+    Images (``/media`` uploads) are already compressed, and responses that
+    carry ``Content-Encoding`` (precompressed frontend files) pass through
+    as in Starlette. A gzipped body is not byte-identical to the one its
+    strong ETag names, so that ETag becomes weak; ``etag_matches`` compares
+    weakly, so revalidation still yields 304.
+    """
+
+    async def send_with_gzip(self, message) -> None:
+        if message["type"] == "http.response.start":
+            await super().send_with_gzip(message)
+            if Headers(raw=message["headers"]).get("content-type", "").startswith("image/"):
+                self.content_encoding_set = True
+            return
+        if message["type"] == "http.response.body" and not self.started and not self.content_encoding_set:
+            if message.get("more_body", False) or len(message.get("body", b"")) >= self.minimum_size:
+                headers = MutableHeaders(raw=self.initial_message["headers"])
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["etag"] = "W/" + etag
+        await super().send_with_gzip(message)
+
+
+class EventStreamGZipMiddleware(GZipMiddleware):
+    """``GZipMiddleware`` that leaves event streams and images alone.
+
+    Starlette's gzip responder never flushes the compressor between chunks,
+    so small events would sit in the deflate buffer until kilobytes more
+    followed.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or accepts_event_stream(scope):
+            await self.app(scope, receive, send)
+            return
+        if "gzip" not in Headers(scope=scope).get("accept-encoding", ""):
+            await self.app(scope, receive, send)
+            return
+        responder = _GZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+        await responder(scope, receive, send)
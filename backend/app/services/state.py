@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Idle buckets are dropped once this many have been seen
+_MAX_BUCKETS = 10000
+# Expired keys are purged every this many writes
+_PURGE_EVERY = 1000
+# SQLite waits this long for another worker's write lock before the call is retried
+_BUSY_TIMEOUT = 0.05
+# ...and gives up after retrying for this long
+_LOCK_WAIT = 10.0
+
+T = TypeVar("T")
+
+
+def _refill(tokens: float, last: float, now: float, rate: float, capacity: float) -> Tuple[float, float]:
+    if now > last:
+        return min(capacity, tokens + (now - last) * rate), now
+    return tokens, last
+
+
+class TokenBucket:
+    """Reservation-based token bucket.
+
+    ``reserve`` always succeeds and returns how long the caller must wait, so
+    callers are served in the order they reserved (tokens may go negative).
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+
+    def reserve(self, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        self.tokens, self.last = _refill(self.tokens, self.last, now, self.rate, self.capacity)
+        self.tokens -= cost
+        ready_at = self.last + max(0.0, -self.tokens) / self.rate
+        return max(0.0, ready_at - now)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for ``seconds`` (Telegram's ``retry_after``)."""
+        self.tokens = min(self.tokens, 0.0)
+        self.last = max(self.last, time.monotonic() + seconds)
+
+    @property
+    def idle(self) -> bool:
+        return self.tokens >= self.capacity and self.last <= time.monotonic()
+
+
+class SharedState(ABC):
+    """Keys and token buckets that every worker of the app sees.
+
+    The operations map onto Redis commands, so a Redis-compatible server can
+    back them: ``set``/``add`` are ``SET PX`` / ``SET NX PX``, ``delete`` and
+    ``extend`` compare the value first (``GET`` + ``DEL`` / ``PEXPIRE`` in a
+    script), and ``reserve``/``pause`` update a bucket hash in one script.
+    Values are strings; callers encode them. ``ttl`` is in seconds. Every
+    operation is a coroutine, so a backend doing I/O never blocks the loop.
+    """
+
+    # Whether other processes see this state; callers skip the round trip when not
+    shared = False
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        """Value of ``key``, or ``None`` if it is absent or expired."""
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """Set ``key``, expiring after ``ttl`` seconds when one is given."""
+
+    @abstractmethod
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """Set ``key`` only if it is absent (or expired)."""
+
+    @abstractmethod
+    async def delete(self, key: str, value: Optional[str] = None) -> bool:
+        """Delete ``key``, only if it still holds ``value`` when one is given."""
+
+    @abstractmethod
+    async def extend(self, key: str, value: str, ttl: float) -> bool:
+        """Push back the expiry of ``key`` if it still holds ``value``."""
+
+    @abstractmethod
+    async def reserve(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens from a bucket; returns the seconds to wait for them."""
+
+    @abstractmethod
+    async def pause(self, key: str, rate: float, capacity: float, seconds: float) -> None:
+        """Hand out no tokens from a bucket for ``seconds``."""
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryState(SharedState):
+    """State of this process only; the default for a single worker."""
+
+    def __init__(self) -> None:
+        self._values: Dict[str, Tuple[str, float]] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._writes = 0
+
+    def _write(self, key: str, value: str, ttl: Optional[float]) -> None:
+        self._values[key] = (value, time.monotonic() + ttl if ttl is not None else float("inf"))
+        self._writes += 1
+        if self._writes % _PURGE_EVERY == 0:
+            now = time.monotonic()
+            for expired in [k for k, (_, expires_at) in self._values.items() if expires_at <= now]:
+                del self._values[expired]
+
+    def _get(self, key: str) -> Optional[str]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._values[key]
+            return None
+        return entry[0]
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._get(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._write(key, value, ttl)
+
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        if self._get(key) is not None:
+            return False
+        self._write(key, value, ttl)
+        return True
+
+    async def delete(self, key: str, value: Optional[str] = None) -> bool:
+        current = self._get(key)
+        if current is None or (value is not None and current != value):
+            return False
+        del self._values[key]
+        return True
+
+    async def extend(self, key: str, value: str, ttl: float) -> bool:
+        if self._get(key) != value:
+            return False
+        self._values[key] = (value, time.monotonic() + ttl)
+        return True
+
+    def _bucket(self, key: str, rate: float, capacity: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= _MAX_BUCKETS:
+                for idle in [k for k, b in self._buckets.items() if b.idle]:
+                    del self._buckets[idle]
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+        return bucket
+
+    async def reserve(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        return self._bucket(key, rate, capacity).reserve(cost)
+
+    async def pause(self, key: str, rate: float, capacity: float, seconds: float) -> None:
+        self._bucket(key, rate, capacity).pause(seconds)
+
+
+class SQLiteState(SharedState):
+    """State shared by the workers on one host through a SQLite database in WAL mode.
+
+    Each call is one short transaction; bucket updates take the write lock
+    (``BEGIN IMMEDIATE``) so concurrent workers never hand out the same
+    tokens. Times are wall-clock, since monotonic clocks differ per process.
+
+    Calls run on a dedicated thread, never on the event loop. A call that
+    finds the database locked by another worker waits ``_BUSY_TIMEOUT`` and
+    is then retried with backoff for up to ``_LOCK_WAIT`` seconds.
+    """
+
+    shared = True
+
+    def __init__(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), timeout=_BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+        # One thread owns the connection, so calls never interleave
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-state")
+        self._writes = 0
+        self._retrying(self._db.execute, "PRAGMA journal_mode=WAL")
+        # Losing the last moments of rate-limit state in a power cut is harmless
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._retrying(
+            self._db.execute,
+            "CREATE TABLE IF NOT EXISTS shared_values ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)",
+        )
+        self._retrying(
+            self._db.execute,
+            "CREATE TABLE IF NOT EXISTS token_buckets ("
+            " key TEXT PRIMARY KEY, tokens REAL NOT NULL, last REAL NOT NULL)",
+        )
+
+    def _retrying(self, call: Callable[..., T], *args: Any) -> T:
+        deadline = time.monotonic() + _LOCK_WAIT
+        delay = 0.005
+        while True:
+            try:
+                return call(*args)
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e) or time.monotonic() >= deadline:
+                    raise
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    async def _run(self, call: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._retrying, call, *args)
+
+    def _expiry(self, ttl: Optional[float]) -> Optional[float]:
+        return time.time() + ttl if ttl is not None else None
+
+    def _wrote(self) -> None:
+        self._writes += 1
+        if self._writes % _PURGE_EVERY == 0:
+            now = time.time()
+            try:
+                self._db.execute("DELETE FROM shared_values WHERE expires_at <= ?", (now,))
+                # Any bucket untouched for an hour has refilled
+                self._db.execute("DELETE FROM token_buckets WHERE last < ?", (now - 3600,))
+            except sqlite3.OperationalError:
+                # Busy; the next round purges instead
+                pass
+
+    def _get(self, key: str) -> Optional[str]:
+        row = self._db.execute(
+            "SELECT value FROM shared_values WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO shared_values (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, self._expiry(ttl)),
+        )
+        self._wrote()
+
+    def _add(self, key: str, value: str, ttl: Optional[float]) -> bool:
+        cursor = self._db.execute(
+            "INSERT INTO shared_values (key, value, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at"
+            " WHERE shared_values.expires_at <= ?",
+            (key, value, self._expiry(ttl), time.time()),
+        )
+        self._wrote()
+        return cursor.rowcount > 0
+
+    def _delete(self, key: str, value: Optional[str]) -> bool:
+        if value is None:
+            cursor = self._db.execute("DELETE FROM shared_values WHERE key = ?", (key,))
+        else:
+            cursor = self._db.execute("DELETE FROM shared_values WHERE key = ? AND value = ?", (key, value))
+        return cursor.rowcount > 0
+
+    def _extend(self, key: str, value: str, ttl: float) -> bool:
+        now = time.time()
+        cursor = self._db.execute(
+            "UPDATE shared_values SET expires_at = ?"
+            " WHERE key = ? AND value = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (now + ttl, key, value, now),
+        )
+        return cursor.rowcount > 0
+
+    def _update_bucket(self, key: str, rate: float, capacity: float, cost: float, pause: float) -> float:
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = self._db.execute("SELECT tokens, last FROM token_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, last = row if row else (capacity, now)
+            if pause:
+                tokens, last = min(tokens, 0.0), max(last, now + pause)
+                wait = 0.0
+            else:
+                tokens, last = _refill(tokens, last, now, rate, capacity)
+                tokens -= cost
+                wait = max(0.0, last + max(0.0, -tokens) / rate - now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO token_buckets (key, tokens, last) VALUES (?, ?, ?)", (key, tokens, last)
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._wrote()
+        return wait
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await self._run(self._set, key, value, ttl)
+
+    async def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return await self._run(self._add, key, value, ttl)
+
+    async def delete(self, key: str, value: Optional[str] = None) -> bool:
+        return await self._run(self._delete, key, value)
+
+    async def extend(self, key: str, value: str, ttl: float) -> bool:
+        return await self._run(self._extend, key, value, ttl)
+
+    async def reserve(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        return await self._run(self._update_bucket, key, rate, capacity, cost, 0.0)
+
+    async def pause(self, key: str, rate: float, capacity: float, seconds: float) -> None:
+        await self._run(self._update_bucket, key, rate, capacity, 0.0, seconds)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._db.close()
+
+
+class Lease:
+    """A key held in shared state while its owner works.
+
+    The holder renews it every ``ttl / 3`` seconds, so the lease of a worker
+    that died expires after ``ttl`` and another worker can take over.
+    """
+
+    def __init__(self, state: SharedState, key: str, ttl: float, value: Optional[str] = None) -> None:
+        self.state = state
+        self.key = key
+        self.ttl = ttl
+        self.value = value or f"{os.getpid()}:{uuid.uuid4().hex}"
+        self._renewer: Optional[asyncio.Task] = None
+
+    @property
+    def held(self) -> bool:
+        return self._renewer is not None
+
+    async def try_acquire(self) -> bool:
+        if not await self.state.add(self.key, self.value, self.ttl):
+            return False
+        self._renewer = asyncio.create_task(self._renew())
+        return True
+
+    async def acquire(self, poll: float = 0.05) -> None:
+        while not await self.try_acquire():
+            await asyncio.sleep(poll)
+
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            if not await self.state.extend(self.key, self.value, self.ttl):
+                logger.warning("Lost shared lease %s", self.key)
+                return
+
+    async def release(self, replace_with: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        """Give the lease up, or leave ``replace_with`` under its key for ``ttl`` seconds."""
+        renewer, self._renewer = self._renewer, None
+        if renewer is None:
+            return
+        renewer.cancel()
+        if replace_with is not None:
+            await self.state.set(self.key, replace_with, ttl)
+        else:
+            await self.state.delete(self.key, self.value)
+
+
+class SharedLock:
+    """``local`` lock of this process, then a lease other workers respect.
+
+    Waiters in this process queue on ``local`` in FIFO order; only its holder
+    polls the shared key, so a busy lock costs one poller per worker.
+    """
+
+    def __init__(self, local: asyncio.Lock, state: SharedState, key: str, ttl: float) -> None:
+        self.local = local
+        self.lease = Lease(state, key, ttl)
+
+    async def __aenter__(self) -> "SharedLock":
+        await self.local.acquire()
+        try:
+            await self.lease.acquire()
+        except BaseException:
+            self.local.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        try:
+            await self.lease.release()
+        finally:
+            self.local.release()
+
+
+def create_state(backend: Optional[str] = None, path: Optional[Path] = None) -> SharedState:
+    backend = (backend or settings.shared_state).lower()
+    if backend == "memory":
+        return MemoryState()
+    if backend == "sqlite":
+        return SQLiteState(path or settings.shared_state_path or settings.data_dir / "state.sqlite3")
+    raise ValueError(f"Unknown SHARED_STATE backend: {backend!r} (expected 'memory' or 'sqlite')")
+
+
+shared_state = create_state()
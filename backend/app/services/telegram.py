@@ -1,199 +1,327 @@
 from __future__ import annotations
 
 import asyncio
-import html
-import os
-import re
-from pathlib import Path
-from typing import Iterable, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import AbstractSet, BinaryIO, Callable, Dict, List, Optional, Tuple, Union
 
 import httpx
 
 from ..core.config import settings
+from .blobs import blob_store, media_digest
+from .cache import TTLCache, token_hash
+from .formatting import ConvertedContent, convert_html, split_html
+from .images import image_normalizer
+from .file_ids import file_id_cache, photo_file_id
+from .media import DecodedImage, decode_data_url
+from .metrics import publish_edits, publish_part_failures, telegram_rate_limited, telegram_request_duration, telegram_retries, telegram_upload_bytes
+from .published import get_store as get_published_store
+from .ratelimit import rate_limiter
+from .state import shared_state
 
-TELEGRAM_API_BASE = "https://api.telegram.org"
+TELEGRAM_API_BASE = settings.telegram_api_base
+# sendMediaGroup accepts 2-10 items per album
+MEDIA_GROUP_LIMIT = 10
+# Telegram limits in UTF-16 code units of visible text
+TEXT_LIMIT = 4096
+CAPTION_LIMIT = 1024
+
+logger = logging.getLogger(__name__)
+
+# Process-wide HTTP client shared by every Telegram call so connections to
+# api.telegram.org are kept alive instead of re-handshaking per request.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def create_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Build a keep-alive client configured from settings.
+
+    Pass ``transport`` (e.g. ``httpx.MockTransport``) to route calls elsewhere in tests.
+    """
+    http2 = settings.telegram_http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            # HTTP/2 needs the optional ``h2`` package (``httpx[http2]``)
+            http2 = False
+    limits = httpx.Limits(
+        max_connections=settings.telegram_max_connections,
+        max_keepalive_connections=settings.telegram_max_keepalive_connections,
+        keepalive_expiry=settings.telegram_keepalive_expiry,
+    )
+    timeout = httpx.Timeout(settings.telegram_timeout, connect=settings.telegram_connect_timeout)
+    return httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout, transport=transport)
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily outside of the app lifecycle."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_client()
+    return _client
+
+
+def set_client(client: Optional[httpx.AsyncClient]) -> None:
+    """Install a client (e.g. one with a mock transport); ``None`` resets to lazy creation."""
+    global _client
+    _client = client
+
+
+async def init_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_client(transport)
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    client, _client = _client, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+# getMe/getChat results keyed by (token hash, chat_id); chat_id is None for getMe
+_info_cache = TTLCache(
+    ttl=settings.telegram_info_cache_ttl,
+    stale_ttl=settings.telegram_info_cache_stale_ttl,
+    maxsize=settings.telegram_info_cache_size,
+    state=shared_state,
+    namespace="telegram-info",
+)
+
+
+def _api_url(token: str, method: str) -> str:
+    return f"{TELEGRAM_API_BASE}/bot{token}/{method}"
+
+
+def _retry_after(resp: httpx.Response) -> float:
+    try:
+        return float(resp.json()["parameters"]["retry_after"])
+    except Exception:
+        pass
+    try:
+        return float(resp.headers.get("Retry-After", 1))
+    except ValueError:
+        return 1.0
+
+
+async def _call(token: str, method: str, *, send_to: Optional[str] = None, cost: float = 1.0, http_method: str = "POST", **kwargs) -> dict:
+    """Call a Bot API method, honouring 429 ``retry_after`` with scheduled retries.
+
+    ``send_to`` marks a sending method: the call waits for the global and per-chat
+    rate limits of that chat before every attempt.
+    """
+    retries = max(0, settings.telegram_max_retries)
+    for attempt in range(retries + 1):
+        if send_to is not None:
+            await rate_limiter.acquire(token, send_to, cost)
+        started = time.perf_counter()
+        try:
+            resp = await get_client().request(http_method, _api_url(token, method), **kwargs)
+        except httpx.HTTPError as e:
+            telegram_request_duration.labels(method, type(e).__name__).observe(time.perf_counter() - started)
+            raise
+        telegram_request_duration.labels(method, str(resp.status_code)).observe(time.perf_counter() - started)
+        length = resp.request.headers.get("content-length")
+        if length:
+            telegram_upload_bytes.labels(method).observe(int(length))
+        if resp.status_code == 429:
+            telegram_rate_limited.labels(method).inc()
+        if resp.status_code == 429 and attempt < retries:
+            delay = _retry_after(resp)
+            if delay <= settings.telegram_max_retry_after:
+                telegram_retries.labels(method, "429").inc()
+                if send_to is not None and settings.telegram_rate_limit:
+                    # Also holds back other senders to this chat
+                    await rate_limiter.retry_after(token, send_to, delay)
+                else:
+                    await asyncio.sleep(delay)
+                continue
+        resp.raise_for_status()
+        return resp.json()
+    raise AssertionError("unreachable")
 
 
 def extract_image_srcs(html_content: str) -> List[str]:
-    if not html_content:
-        return []
-    return re.findall(r"<img[^>]+src=\"([^\"]+)\"", html_content)
+    return convert_html(html_content).images
 
 def is_data_url(url: str) -> bool:
     return url.startswith("data:")
 
+def is_remote_url(url: str) -> bool:
+    return url.startswith("http://") or url.startswith("https://")
+
 def parse_data_url(data_url: str) -> Tuple[str, bytes]:
     # Returns (mime, bytes)
     # Example: data:image/png;base64,AAA...
-    m = re.match(r"data:([^;]+);base64,(.*)", data_url, flags=re.I | re.S)
-    if not m:
-        raise ValueError("Unsupported data URL format")
-    mime = m.group(1)
-    b64 = m.group(2)
-    import base64
-    return mime, base64.b64decode(b64)
+    # Prefer media.decode_data_url, which never holds the whole payload in memory
+    with decode_data_url(data_url) as image:
+        return image.mime, image.read()
 
 def html_to_telegram_text(html_content: str) -> str:
-    """Convert HTML to plain text suitable for Telegram."""
-    if not html_content:
-        return ""
-    
-    # Remove all HTML tags and convert to plain text
-    text = html_content
-    
-    # Remove images
-    text = re.sub(r"<(?:img|video|audio)[^>]*>", "", text, flags=re.I)
-    
-    # Convert line breaks
-    text = re.sub(r"<\s*br\s*/?>", "\n", text, flags=re.I)
-    text = re.sub(r"<\s*/?p[^>]*>", "\n", text, flags=re.I)
-    text = re.sub(r"<\s*/?div[^>]*>", "\n", text, flags=re.I)
-    text = re.sub(r"<\s*/?li[^>]*>", "\n• ", text, flags=re.I)
-    text = re.sub(r"<\s*/?ol[^>]*>", "\n", text, flags=re.I)
-    text = re.sub(r"<\s*/?ul[^>]*>", "\n", text, flags=re.I)
-    
-    # Convert HTML entities
-    text = re.sub(r"&nbsp;", " ", text, flags=re.I)
-    text = re.sub(r"&amp;", "&", text, flags=re.I)
-    text = re.sub(r"&lt;", "<", text, flags=re.I)
-    text = re.sub(r"&gt;", ">", text, flags=re.I)
-    text = re.sub(r"&quot;", '"', text, flags=re.I)
-    
-    # Remove all remaining HTML tags
-    text = re.sub(r"<[^>]+>", "", text)
-    
-    # Clean up whitespace
-    text = re.sub(r"\n\s*\n", "\n\n", text)  # Multiple newlines to double newlines
-    text = re.sub(r"[ \t]+", " ", text)  # Multiple spaces to single space
-    text = text.strip()
-    
-    return text
+    """Convert HTML to Telegram HTML (see ``formatting.convert_html``)."""
+    return convert_html(html_content).text
 
 
-def validate_content_length(html_content: str, title: str = "", has_images: bool = False) -> dict:
-    """Validate content length against Telegram limits."""
-    text = html_to_telegram_text(html_content)
-    full_text = f"{title}\n\n{text}" if title else text
-    
-    # Telegram limits
-    TEXT_LIMIT = 4096
-    IMAGE_CAPTION_LIMIT = 1024
-    
+def check_content_length(content_length: int, has_images: bool = False, parts: Optional[int] = None) -> dict:
+    """Check a visible text length against Telegram limits.
+
+    Text longer than one message (or a photo caption) is sent as follow-up
+    messages, up to ``PUBLISH_MAX_TEXT_PARTS``. ``parts`` is the exact count
+    from ``plan_text_parts``; without it the count is estimated from the length.
+    """
     if has_images:
-        limit = IMAGE_CAPTION_LIMIT
+        limit = CAPTION_LIMIT
         limit_type = "image caption"
     else:
         limit = TEXT_LIMIT
         limit_type = "text message"
-    
-    is_valid = len(full_text) <= limit
-    exceeded_by = len(full_text) - limit if not is_valid else 0
-    
+    if parts is None:
+        parts = 1 + max(0, -(-(content_length - limit) // TEXT_LIMIT))
+    max_parts = max(1, settings.publish_max_text_parts)
+
+    is_valid = parts <= max_parts
+    capacity = limit + (max_parts - 1) * TEXT_LIMIT
+    exceeded_by = max(0, content_length - capacity) if not is_valid else 0
+    message = f"Content length: {content_length} characters (limit: {limit} for {limit_type})"
+    if parts > 1:
+        message += f", needs {parts} messages"
+
     return {
         "is_valid": is_valid,
-        "content_length": len(full_text),
+        "content_length": content_length,
         "limit": limit,
         "limit_type": limit_type,
         "exceeded_by": exceeded_by,
-        "message": f"Content length: {len(full_text)} characters (limit: {limit} for {limit_type})"
+        "parts": parts,
+        "max_parts": max_parts,
+        "message": message,
     }
 
 
-def split_message(text: str, max_length: int = 4000) -> List[str]:
-    """Split long text into multiple messages that fit Telegram's limits."""
-    if len(text) <= max_length:
+def plan_text_parts(text: str, has_images: bool = False, length: Optional[int] = None) -> List[str]:
+    """Split post text into messages; with images the first part is the caption.
+
+    ``length`` is the visible length when already known (``ConvertedContent.full_length``);
+    text that fits in one part is then returned without scanning it.
+    """
+    first_limit = CAPTION_LIMIT if has_images else TEXT_LIMIT
+    if length is not None and length <= first_limit:
         return [text]
-    
-    messages = []
-    current_message = ""
-    
-    # Split by paragraphs first
-    paragraphs = text.split('\n\n')
-    
-    for paragraph in paragraphs:
-        # If adding this paragraph would exceed limit
-        if len(current_message) + len(paragraph) + 2 > max_length:
-            if current_message:
-                messages.append(current_message.strip())
-                current_message = ""
-            
-            # If single paragraph is too long, split by sentences
-            if len(paragraph) > max_length:
-                sentences = paragraph.split('. ')
-                for sentence in sentences:
-                    if len(current_message) + len(sentence) + 2 > max_length:
-                        if current_message:
-                            messages.append(current_message.strip())
-                            current_message = ""
-                    current_message += sentence + ". "
-            else:
-                current_message = paragraph
-        else:
-            if current_message:
-                current_message += "\n\n" + paragraph
-            else:
-                current_message = paragraph
-    
-    if current_message:
-        messages.append(current_message.strip())
-    
-    return messages
+    return split_html(text, TEXT_LIMIT, first_limit=first_limit)
+
+
+def validate_converted(converted: ConvertedContent, title: str = "", has_images: Optional[bool] = None) -> dict:
+    if has_images is None:
+        has_images = converted.has_images
+    length = converted.full_length(title)
+    parts = plan_text_parts(converted.full_text(title), has_images, length)
+    return check_content_length(length, has_images, parts=len(parts))
+
+
+def validate_content_length(html_content: str, title: str = "", has_images: bool = False) -> dict:
+    """Validate content length against Telegram limits."""
+    return validate_converted(convert_html(html_content), title, has_images)
+
+
+def split_message(text: str, max_length: int = TEXT_LIMIT) -> List[str]:
+    """Split long Telegram HTML into messages that fit Telegram's limits (see ``split_html``)."""
+    return split_html(text, max_length)
 
 async def send_message(token: str, chat_id: str, text: str, disable_web_page_preview: bool = False) -> dict:
-    url = f"{TELEGRAM_API_BASE}/bot{token}/sendMessage"
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.post(url, data={
-            "chat_id": chat_id,
-            "text": text,
-            "parse_mode": "HTML",
-            "disable_web_page_preview": disable_web_page_preview,
-        })
-        resp.raise_for_status()
-        return resp.json()
+    return await _call(token, "sendMessage", send_to=chat_id, data={
+        "chat_id": chat_id,
+        "text": text,
+        "parse_mode": "HTML",
+        "disable_web_page_preview": disable_web_page_preview,
+    })
 
-async def send_photo_file(token: str, chat_id: str, filename: str, content_bytes: bytes, mime: str, caption: Optional[str] = None) -> dict:
-    url = f"{TELEGRAM_API_BASE}/bot{token}/sendPhoto"
-    async with httpx.AsyncClient(timeout=60) as client:
-        files = {"photo": (filename, content_bytes, mime)}
-        data = {"chat_id": chat_id}
-        if caption:
-            data["caption"] = caption
-            data["parse_mode"] = "HTML"
-        resp = await client.post(url, data=data, files=files)
-        resp.raise_for_status()
-        return resp.json()
+async def send_photo_file(token: str, chat_id: str, filename: str, content_bytes: Union[bytes, BinaryIO], mime: str, caption: Optional[str] = None) -> dict:
+    files = {"photo": (filename, content_bytes, mime)}
+    data = {"chat_id": chat_id}
+    if caption:
+        data["caption"] = caption
+        data["parse_mode"] = "HTML"
+    # httpx rewinds file objects, so retries re-stream the same upload
+    return await _call(token, "sendPhoto", send_to=chat_id, data=data, files=files, timeout=settings.telegram_upload_timeout)
 
 async def send_photo_url(token: str, chat_id: str, photo_url: str, caption: Optional[str] = None) -> dict:
-    url = f"{TELEGRAM_API_BASE}/bot{token}/sendPhoto"
-    async with httpx.AsyncClient(timeout=60) as client:
-        data = {"chat_id": chat_id, "photo": photo_url}
-        if caption:
-            data["caption"] = caption
-            data["parse_mode"] = "HTML"
-        resp = await client.post(url, data=data)
-        resp.raise_for_status()
-        return resp.json()
+    data = {"chat_id": chat_id, "photo": photo_url}
+    if caption:
+        data["caption"] = caption
+        data["parse_mode"] = "HTML"
+    return await _call(token, "sendPhoto", send_to=chat_id, data=data, timeout=settings.telegram_upload_timeout)
+
+async def send_media_group(token: str, chat_id: str, media: List[dict], files: Optional[dict] = None) -> dict:
+    """Send 2-10 photos as one album.
+
+    Items reference uploads as ``attach://<name>`` with the file in ``files`` or carry
+    a remote URL directly, so mixed sets go out in a single multipart request.
+    """
+    data = {"chat_id": chat_id, "media": json.dumps(media)}
+    # Each album item counts as a message towards the limits
+    return await _call(token, "sendMediaGroup", send_to=chat_id, cost=len(media), data=data, files=files or None, timeout=settings.telegram_upload_timeout)
+
+async def edit_message_text(token: str, chat_id: str, message_id: int, text: str, disable_web_page_preview: bool = False) -> dict:
+    return await _call(token, "editMessageText", send_to=chat_id, data={
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": text,
+        "parse_mode": "HTML",
+        "disable_web_page_preview": disable_web_page_preview,
+    })
+
+async def edit_message_caption(token: str, chat_id: str, message_id: int, caption: str) -> dict:
+    return await _call(token, "editMessageCaption", send_to=chat_id, data={
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "caption": caption,
+        "parse_mode": "HTML",
+    })
+
+async def edit_message_media(token: str, chat_id: str, message_id: int, media: dict, files: Optional[dict] = None) -> dict:
+    """Replace a photo (and its caption) in place; uploads use ``attach://<name>`` like albums."""
+    data = {"chat_id": chat_id, "message_id": message_id, "media": json.dumps(media)}
+    return await _call(token, "editMessageMedia", send_to=chat_id, data=data, files=files or None, timeout=settings.telegram_upload_timeout)
+
+async def delete_message(token: str, chat_id: str, message_id: int) -> dict:
+    return await _call(token, "deleteMessage", send_to=chat_id, data={"chat_id": chat_id, "message_id": message_id})
+
+def is_not_modified(e: Exception) -> bool:
+    """Telegram rejects edits that change nothing; for a republish that is success."""
+    return isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 400 and "not modified" in describe_error(e)
 
 async def get_bot_info(token: str) -> dict:
     """Get bot information to verify token and connection."""
-    url = f"{TELEGRAM_API_BASE}/bot{token}/getMe"
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.get(url)
-        resp.raise_for_status()
-        return resp.json()
+    return await _call(token, "getMe", http_method="GET")
 
 async def get_chat_info(token: str, chat_id: str) -> dict:
     """Get chat information to verify bot has access to the channel."""
-    url = f"{TELEGRAM_API_BASE}/bot{token}/getChat"
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.post(url, data={"chat_id": chat_id})
-        resp.raise_for_status()
-        return resp.json()
+    return await _call(token, "getChat", data={"chat_id": chat_id})
 
-async def verify_channel_access(token: str, chat_id: str) -> dict:
-    """Verify that the bot can access the specified channel."""
+async def get_bot_info_cached(token: str, *, refresh: bool = False) -> dict:
+    """``get_bot_info`` served from the TTL cache (``refresh`` bypasses it)."""
+    return await _info_cache.get_or_fetch((token_hash(token), None), lambda: get_bot_info(token), refresh=refresh)
+
+async def get_chat_info_cached(token: str, chat_id: str, *, refresh: bool = False) -> dict:
+    """``get_chat_info`` served from the TTL cache (``refresh`` bypasses it)."""
+    return await _info_cache.get_or_fetch((token_hash(token), chat_id), lambda: get_chat_info(token, chat_id), refresh=refresh)
+
+async def verify_channel_access(token: str, chat_id: str, *, cached: bool = False, refresh: bool = False) -> dict:
+    """Verify that the bot can access the specified channel.
+
+    With ``cached`` the ``getChat`` result may come from the info cache.
+    """
     try:
-        chat_info = await get_chat_info(token, chat_id)
+        if cached:
+            chat_info = await get_chat_info_cached(token, chat_id, refresh=refresh)
+        else:
+            chat_info = await get_chat_info(token, chat_id)
         return {
             "ok": True,
             "chat": chat_info.get("result", {}),
@@ -221,63 +349,474 @@ async def verify_channel_access(token: str, chat_id: str) -> dict:
             "accessible": False
         }
 
-async def publish_content(html_content: str, title: str, *, chat_id: Optional[str] = None, token: Optional[str] = None) -> dict:
-    if not token:
-        token = settings.telegram_bot_token
-    if not chat_id:
-        chat_id = settings.telegram_channel_id
-    if not token or not chat_id:
-        raise ValueError("Telegram credentials not configured")
+@dataclass
+class _AlbumItem:
+    src: str
+    image: Optional[DecodedImage] = None  # decoded upload for data URLs
+    upload: Optional[DecodedImage] = None  # ``image`` fitted to Telegram's limits
+    # Held while these bytes are uploaded so concurrent deliveries reuse the file_id
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def digest(self) -> str:
+        # Always the source bytes' hash, so file_ids survive re-encoding
+        return self.image.sha256
+
+    def close(self) -> None:
+        if self.upload is not None and self.upload is not self.image:
+            self.upload.close()
+        if self.image is not None:
+            self.image.close()
+
+
+@dataclass
+class PreparedPost:
+    """A note converted, validated and decoded once, deliverable to any number of chats."""
+    caption: str
+    albums: List[List[_AlbumItem]] = field(default_factory=list)
+    text_parts: List[str] = field(default_factory=list)
+
+    @property
+    def part_count(self) -> int:
+        return len(self.albums) + len(self.text_parts)
+
+    def describe_parts(self) -> List[dict]:
+        """One entry per API call ``deliver_post`` makes, in order."""
+        parts = [
+            {"index": i, "kind": "album" if len(items) > 1 else "photo", "items": len(items)}
+            for i, items in enumerate(self.albums)
+        ]
+        offset = len(parts)
+        parts.extend({"index": offset + i, "kind": "text", "items": 1} for i in range(len(self.text_parts)))
+        return parts
+
+    def signatures(self) -> List[dict]:
+        """What each part sends, hashed, so a republish can tell which parts changed."""
+        parts = [
+            {
+                "kind": "album" if len(items) > 1 else "photo",
+                "media": [item.digest if item.image is not None else item.src for item in items],
+                "caption": _content_hash(self.caption) if i == 0 else None,
+            }
+            for i, items in enumerate(self.albums)
+        ]
+        parts.extend({"kind": "text", "text": _content_hash(text)} for text in self.text_parts)
+        return parts
+
+    def close(self) -> None:
+        for album in self.albums:
+            for item in album:
+                item.close()
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def _unsent(signature: dict) -> dict:
+    """Placeholder for a part that failed, keeping later parts aligned."""
+    return {"kind": signature["kind"], "message_ids": []}
+
+
+def _message_ids(result: Optional[dict]) -> List[int]:
+    """Ids of the messages a send call created."""
+    sent = (result or {}).get("result")
+    messages = sent if isinstance(sent, list) else [sent]
+    return [m["message_id"] for m in messages if isinstance(m, dict) and "message_id" in m]
+
+
+# Called after every part with (index, result, error, seconds taken)
+PartCallback = Callable[[int, Optional[dict], Optional[Exception], float], None]
 
-    text = html_to_telegram_text(html_content)
-    # Extract images hosted on this server and send first image with caption, rest separately
-    image_srcs = extract_image_srcs(html_content)
-    has_images = len(image_srcs) > 0
 
-    # Validate content length
-    validation = validate_content_length(html_content, title, has_images)
+def _prepare_album(srcs: List[str]) -> List[_AlbumItem]:
+    """Open stored ``/media`` images and decode data-URL images of one album."""
+    items: List[_AlbumItem] = []
+    try:
+        for src in srcs:
+            item = _AlbumItem(src)
+            digest = media_digest(src)
+            if digest and blob_store.exists(digest):
+                # Streamed from disk; nothing to decode
+                item.image = blob_store.open(digest)
+            elif digest and not is_remote_url(src):
+                raise ValueError(f"Image not found: {src}")
+            elif is_data_url(src):
+                item.image = decode_data_url(src)
+            items.append(item)
+    except BaseException:
+        for item in items:
+            item.close()
+        raise
+    return items
+
+def _album_request(items: List[_AlbumItem], caption: Optional[str], file_ids: Dict[int, str]) -> Tuple[List[dict], dict]:
+    media: List[dict] = []
+    files: dict = {}
+    for i, item in enumerate(items):
+        if i in file_ids:
+            entry = {"type": "photo", "media": file_ids[i]}
+        elif item.image is not None:
+            upload = item.upload or item.image
+            # File objects are streamed into the multipart body chunk by chunk
+            files[f"file{i}"] = (upload.filename, upload.rewind(), upload.mime)
+            entry = {"type": "photo", "media": f"attach://file{i}"}
+        else:
+            entry = {"type": "photo", "media": item.src}
+        if caption and i == 0:
+            entry["caption"] = caption
+            entry["parse_mode"] = "HTML"
+        media.append(entry)
+    return media, files
+
+async def _send_album_once(token: str, chat_id: str, items: List[_AlbumItem], caption: Optional[str], file_ids: Dict[int, str]) -> dict:
+    media, files = _album_request(items, caption, file_ids)
+    if len(media) > 1:
+        result = await send_media_group(token, chat_id, media, files)
+        messages = result.get("result") or []
+    else:
+        # A single photo cannot be an album
+        photo = media[0]["media"]
+        if files:
+            filename, fileobj, mime = files["file0"]
+            result = await send_photo_file(token, chat_id, filename, fileobj, mime, caption=caption)
+        else:
+            result = await send_photo_url(token, chat_id, photo, caption=caption)
+        messages = [result.get("result")]
+    # Remember what Telegram assigned to uploaded bytes so re-sends skip the upload
+    for i, (item, message) in enumerate(zip(items, messages)):
+        if item.image is not None and i not in file_ids:
+            file_id = photo_file_id(message)
+            if file_id:
+                await file_id_cache.put(token, item.digest, file_id)
+    return result
+
+async def _send_album(token: str, chat_id: str, items: List[_AlbumItem], caption: Optional[str]) -> dict:
+    stale: set = set()
+    for attempt in range(2):
+        file_ids: Dict[int, str] = {}
+        claimed: List[_AlbumItem] = []
+        try:
+            for i, item in enumerate(items):
+                if item.image is None:
+                    continue
+                file_id = await file_id_cache.get(token, item.digest)
+                if file_id is None or file_id in stale:
+                    await item.lock.acquire()
+                    # Another delivery may have uploaded these bytes while we waited
+                    file_id = await file_id_cache.get(token, item.digest)
+                    if file_id in stale:
+                        await file_id_cache.discard(token, item.digest)
+                        file_id = None
+                    if file_id is None:
+                        claimed.append(item)
+                    else:
+                        item.lock.release()
+                if file_id:
+                    file_ids[i] = file_id
+            for item in claimed:
+                if item.upload is None:
+                    # CPU-heavy re-encoding runs in a process pool, only for bytes actually uploaded
+                    item.upload = await image_normalizer.normalize(item.image)
+            try:
+                return await _send_album_once(token, chat_id, items, caption, file_ids)
+            except httpx.HTTPStatusError as e:
+                if attempt or e.response.status_code != 400 or not file_ids:
+                    raise
+                # A cached file_id was rejected (e.g. expired); upload those bytes instead
+                stale.update(file_ids.values())
+                telegram_retries.labels("sendMediaGroup" if len(items) > 1 else "sendPhoto", "stale_file_id").inc()
+        finally:
+            for item in claimed:
+                item.lock.release()
+    raise AssertionError("unreachable")
+
+async def prepare_post(html_content: str, title: str) -> PreparedPost:
+    """Convert, validate and decode a note once. Raises ``ValueError`` if it is too long."""
+    # Single pass: Telegram text, image sources and visible length together
+    converted = convert_html(html_content)
+
+    # Text beyond the caption or one message continues in follow-up messages
+    image_srcs = [src for src in converted.images if is_data_url(src) or is_remote_url(src) or media_digest(src)]
+    length = converted.full_length(title)
+    text_parts = plan_text_parts(converted.full_text(title), bool(image_srcs), length)
+    validation = check_content_length(length, bool(image_srcs), parts=len(text_parts))
     if not validation["is_valid"]:
         raise ValueError(f"Content exceeds Telegram limit: {validation['message']}. Please reduce content by {validation['exceeded_by']} characters.")
 
-    results: List[dict] = []
+    # Unrecognized src schemes are skipped; without any sendable image fall back to text
     if image_srcs:
-        first = image_srcs[0]
-        caption = f"{title}\n\n{text}" if title else text
-        if is_data_url(first):
-            mime, bytes_content = parse_data_url(first)
-            filename = f"image.{mime.split('/')[-1]}"
-            results.append(await send_photo_file(token, chat_id, filename, bytes_content, mime, caption=caption))
-        elif first.startswith("http://") or first.startswith("https://"):
-            results.append(await send_photo_url(token, chat_id, first, caption=caption))
-        else:
-            # Unrecognized src scheme; fallback to text
-            pass
-        # Send remaining images without captions
-        for src in image_srcs[1:]:
-            try:
-                if is_data_url(src):
-                    mime, bytes_content = parse_data_url(src)
-                    filename = f"image.{mime.split('/')[-1]}"
-                    results.append(await send_photo_file(token, chat_id, filename, bytes_content, mime, caption=None))
-                elif src.startswith("http://") or src.startswith("https://"):
-                    results.append(await send_photo_url(token, chat_id, src, caption=None))
-            except Exception:
-                # Skip bad images but continue
-                continue
-        if results:
-            return {"ok": True, "results": results}
+        post = PreparedPost(caption=text_parts[0], text_parts=text_parts[1:])
+        albums = [image_srcs[i:i + MEDIA_GROUP_LIMIT] for i in range(0, len(image_srcs), MEDIA_GROUP_LIMIT)]
+        # Decode every album up front in worker threads
+        decoded = await asyncio.gather(
+            *(asyncio.to_thread(_prepare_album, album) for album in albums), return_exceptions=True
+        )
+        post.albums = [items for items in decoded if not isinstance(items, BaseException)]
+        errors = [e for e in decoded if isinstance(e, BaseException)]
+        if errors:
+            post.close()
+            raise errors[0]
+    else:
+        post = PreparedPost(caption="", text_parts=text_parts)
+    return post
 
-    # Send text-only message(s) - split if too long
-    full_text = f"{title}\n\n{text}" if title else text
-    message_parts = split_message(full_text)
-    
-    for i, message_part in enumerate(message_parts):
+async def deliver_post(post: PreparedPost, token: str, chat_id: str, *, skip: AbstractSet[int] = frozenset(),
+                       on_part: Optional[PartCallback] = None) -> dict:
+    """Send a prepared post to one chat. Does not close ``post``.
+
+    ``skip`` holds the indices of parts already delivered (e.g. when resuming
+    a job) and ``on_part`` is told about each part as it completes or fails.
+    """
+    # Parts of concurrent posts to the same chat must not interleave
+    async with rate_limiter.chat_lock(token, chat_id):
+        return await _deliver_post(post, token, chat_id, skip, on_part)
+
+async def _deliver_post(post: PreparedPost, token: str, chat_id: str, skip: AbstractSet[int], on_part: Optional[PartCallback]) -> dict:
+    results: List[dict] = []
+    albums = len(post.albums)
+    # Albums go out first and in order because Telegram shows them in the order received
+    for index in range(post.part_count):
+        if index in skip:
+            continue
+        started = time.perf_counter()
         try:
-            result = await send_message(token, chat_id, message_part)
-            results.append(result)
+            if index < albums:
+                result = await _send_album(token, chat_id, post.albums[index], post.caption if index == 0 else None)
+            else:
+                result = await send_message(token, chat_id, post.text_parts[index - albums])
         except Exception as e:
-            print(f"Failed to send message part {i+1}: {e}")
+            if on_part:
+                on_part(index, None, e, time.perf_counter() - started)
+            if index == 0 and albums:
+                # The captioned album carries the text; without it the post is lost
+                raise
+            publish_part_failures.labels("album" if index < albums else "text").inc()
+            logger.warning("Failed to send message part %d to %s: %s", index + 1, chat_id, describe_error(e))
             # Continue with remaining parts
             continue
+        results.append(result)
+        if on_part:
+            on_part(index, result, None, time.perf_counter() - started)
     
     return {"ok": True, "results": results}
+
+async def _edit_photo(token: str, chat_id: str, message_id: int, item: _AlbumItem, caption: Optional[str]) -> dict:
+    """Swap the photo of one sent message, reusing a cached ``file_id`` when there is one."""
+    async with item.lock:
+        for attempt in range(2):
+            file_id = await file_id_cache.get(token, item.digest) if item.image is not None and not attempt else None
+            files = None
+            if item.image is not None and file_id is None:
+                if item.upload is None:
+                    item.upload = await image_normalizer.normalize(item.image)
+                files = {"file0": (item.upload.filename, item.upload.rewind(), item.upload.mime)}
+                media = {"type": "photo", "media": "attach://file0"}
+            else:
+                media = {"type": "photo", "media": file_id or item.src}
+            if caption:
+                media["caption"] = caption
+                media["parse_mode"] = "HTML"
+            try:
+                result = await edit_message_media(token, chat_id, message_id, media, files)
+            except httpx.HTTPStatusError as e:
+                if file_id is None or e.response.status_code != 400 or is_not_modified(e):
+                    raise
+                # Cached file_id rejected; upload the bytes instead
+                await file_id_cache.discard(token, item.digest)
+                continue
+            if files:
+                file_id = photo_file_id(result.get("result"))
+                if file_id:
+                    await file_id_cache.put(token, item.digest, file_id)
+            return result
+    raise AssertionError("unreachable")
+
+async def update_post(post: PreparedPost, previous: List[dict], token: str, chat_id: str, *,
+                      on_part: Optional[PartCallback] = None) -> Optional[Tuple[dict, List[dict]]]:
+    """Edit the messages a note was published as so they match ``post``.
+
+    Only parts whose hashes differ from ``previous`` are edited; unchanged
+    parts cost no API calls. Extra text parts are sent as new messages and
+    surplus ones deleted. Albums can't gain or lose photos in place, so when
+    the album layout differs nothing is sent and ``None`` is returned (the
+    caller replaces the post). Returns the result and the updated part records.
+    """
+    current = post.signatures()
+    old_albums = [p for p in previous if p["kind"] != "text"]
+    old_texts = [p for p in previous if p["kind"] == "text"]
+    # Albums that failed to send have no media or message ids recorded
+    if [len(p.get("media", ())) for p in old_albums] != [len(items) for items in post.albums]:
+        return None
+    if any(len(p["message_ids"]) != len(p["media"]) for p in old_albums):
+        return None
+
+    counts = {"edited": 0, "sent": 0, "deleted": 0, "unchanged": 0}
+    results: List[dict] = []
+    records: List[dict] = []
+    albums = len(post.albums)
+    async with rate_limiter.chat_lock(token, chat_id):
+        for index, signature in enumerate(current):
+            started = time.perf_counter()
+            old = old_albums[index] if index < albums else (old_texts[index - albums] if index - albums < len(old_texts) else None)
+            record = dict(old or {}, message_ids=(old or {}).get("message_ids", []))
+            calls = 0
+            try:
+                if index < albums:
+                    for i, item in enumerate(post.albums[index]):
+                        caption = post.caption if index == 0 and i == 0 else None
+                        message_id = old["message_ids"][i]
+                        if old["media"][i] != signature["media"][i]:
+                            # Replacing the photo replaces its caption too
+                            await _ignore_not_modified(_edit_photo(token, chat_id, message_id, item, caption))
+                            calls += 1
+                        elif caption is not None and old.get("caption") != signature["caption"]:
+                            await _ignore_not_modified(edit_message_caption(token, chat_id, message_id, caption))
+                            calls += 1
+                    record.update(signature, message_ids=old["message_ids"])
+                    result = {"ok": True, "edited": calls}
+                    counts["edited" if calls else "unchanged"] += 1
+                elif old is None or not old["message_ids"]:
+                    result = await send_message(token, chat_id, post.text_parts[index - albums])
+                    record = dict(signature, message_ids=_message_ids(result))
+                    calls = 1
+                    counts["sent"] += 1
+                elif old.get("text") != signature["text"]:
+                    result = await _ignore_not_modified(edit_message_text(token, chat_id, old["message_ids"][0], post.text_parts[index - albums]))
+                    record.update(signature)
+                    calls = 1
+                    counts["edited"] += 1
+                else:
+                    result = {"ok": True, "edited": 0}
+                    counts["unchanged"] += 1
+            except Exception as e:
+                if on_part:
+                    on_part(index, None, e, time.perf_counter() - started)
+                publish_part_failures.labels("album" if index < albums else "text").inc()
+                logger.warning("Failed to update message part %d in %s: %s", index + 1, chat_id, describe_error(e))
+                # Keep the old record so the next republish retries this part
+                records.append(old if old is not None else _unsent(signature))
+                continue
+            if calls:
+                publish_edits.labels("album" if index < albums else "text").inc(calls)
+            records.append(record)
+            results.append(result)
+            if on_part:
+                on_part(index, result, None, time.perf_counter() - started)
+
+        surplus = old_texts[len(post.text_parts):]
+        await _delete_parts(token, chat_id, surplus)
+        counts["deleted"] += len(surplus)
+
+    return {"ok": True, "mode": "edited", **counts, "results": results}, records
+
+async def _delete_parts(token: str, chat_id: str, records: List[dict]) -> None:
+    """Delete the messages of recorded parts; failures are logged, not raised."""
+    for record in records:
+        for message_id in record.get("message_ids", ()):
+            try:
+                await delete_message(token, chat_id, message_id)
+            except Exception as e:
+                logger.warning("Failed to delete message %s in %s: %s", message_id, chat_id, describe_error(e))
+
+async def _ignore_not_modified(call) -> dict:
+    try:
+        return await call
+    except httpx.HTTPStatusError as e:
+        if is_not_modified(e):
+            return {"ok": True, "result": True}
+        raise
+
+async def deliver_note(post: PreparedPost, token: str, chat_id: str, *, note_id: Optional[str] = None,
+                       edit: bool = True, skip: AbstractSet[int] = frozenset(), on_part: Optional[PartCallback] = None) -> dict:
+    """Deliver ``post``, or edit the messages ``note_id`` was published as in this chat.
+
+    Message ids are recorded per note, bot and chat when the published-messages
+    store is enabled. Without ``note_id`` or with ``edit=False``, the post is
+    sent as new messages. When the album layout changed, it is sent as new
+    messages and the old ones are then deleted, so the note shows up once.
+    """
+    store = get_published_store() if note_id else None
+    previous = await store.get(note_id, token, chat_id) if store is not None and edit else None
+    if previous is not None:
+        # A resumed edit starts over: parts edited before the restart are no-ops now
+        updated = await update_post(post, previous, token, chat_id, on_part=on_part)
+        if updated is not None:
+            result, records = updated
+            await store.put(note_id, token, chat_id, records)
+            return result
+
+    sent: Dict[int, dict] = {}
+
+    def record(index: int, result: Optional[dict], error: Optional[Exception], elapsed: float) -> None:
+        if result is not None:
+            sent[index] = result
+        if on_part:
+            on_part(index, result, error, elapsed)
+
+    result = await deliver_post(post, token, chat_id, skip=skip, on_part=record)
+    if previous is not None:
+        # Sent first, so a failed send never leaves the chat without the note
+        async with rate_limiter.chat_lock(token, chat_id):
+            await _delete_parts(token, chat_id, previous)
+        result = {**result, "mode": "replaced", "deleted": len(previous)}
+    # A resumed job lacks the ids of parts sent before the restart; don't record a partial post
+    if store is not None and not skip:
+        await store.put(note_id, token, chat_id, [
+            dict(signature, message_ids=_message_ids(sent[index])) if index in sent else _unsent(signature)
+            for index, signature in enumerate(post.signatures())
+        ])
+    return result
+
+async def publish_content(html_content: str, title: str, *, chat_id: Optional[str] = None, token: Optional[str] = None,
+                          note_id: Optional[str] = None, edit: bool = True) -> dict:
+    if not token:
+        token = settings.telegram_bot_token
+    if not chat_id:
+        chat_id = settings.telegram_channel_id
+    if not token or not chat_id:
+        raise ValueError("Telegram credentials not configured")
+
+    post = await prepare_post(html_content, title)
+    try:
+        return await deliver_note(post, token, chat_id, note_id=note_id, edit=edit)
+    finally:
+        post.close()
+
+def describe_error(e: Exception) -> str:
+    """Human-readable error without the request URL (which embeds the bot token)."""
+    if isinstance(e, httpx.HTTPStatusError):
+        try:
+            description = e.response.json().get("description")
+        except Exception:
+            description = None
+        return description or f"Telegram API returned HTTP {e.response.status_code}"
+    if isinstance(e, httpx.HTTPError):
+        return f"Telegram API request failed: {type(e).__name__}"
+    return str(e)
+
+async def publish_to_channels(html_content: str, title: str, *, token: str, chat_ids: List[str], verify_channel: bool = True,
+                              note_id: Optional[str] = None, edit: bool = True) -> List[dict]:
+    """Prepare a note once and deliver it to several chats concurrently.
+
+    Images are uploaded once; other chats reuse the returned ``file_id``s. Returns
+    one ``{"channel_id", "ok", "result" | "error"}`` entry per chat, in input order.
+    """
+    post = await prepare_post(html_content, title)
+    semaphore = asyncio.Semaphore(max(1, settings.fanout_concurrency))
+
+    async def deliver_one(chat_id: str) -> dict:
+        async with semaphore:
+            try:
+                if verify_channel:
+                    verification = await verify_channel_access(token, chat_id, cached=True)
+                    if not verification.get("accessible", False):
+                        return {"channel_id": chat_id, "ok": False, "error": f"Cannot access channel: {verification.get('error', 'Unknown error')}"}
+                return {"channel_id": chat_id, "ok": True, "result": await deliver_note(post, token, chat_id, note_id=note_id, edit=edit)}
+            except Exception as e:
+                return {"channel_id": chat_id, "ok": False, "error": describe_error(e)}
+
+    try:
+        return list(await asyncio.gather(*(deliver_one(chat_id) for chat_id in dict.fromkeys(chat_ids))))
+    finally:
+        post.close()
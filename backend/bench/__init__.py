@@ -0,0 +1 @@
+# Benchmarks and load tests; run from the backend directory, e.g. `python -m bench.micro`
@@ -0,0 +1,32 @@
+"""Synthetic notes shaped like what the editor produces."""
+from __future__ import annotations
+
+import base64
+import random
+
+_WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua 🚀 café naïve"
+).split()
+
+
+def data_url(size_kb: int, seed: int = 0) -> str:
+    payload = random.Random(seed).randbytes(size_kb * 1024)
+    return "data:image/jpeg;base64," + base64.b64encode(payload).decode("ascii")
+
+
+def make_note(paragraphs: int = 20, images: int = 0, image_kb: int = 256, remote_images: int = 0, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = []
+    for i in range(paragraphs):
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(20, 60))]
+        words[rng.randrange(len(words))] = f"<b>{words[0]}</b>"
+        words[rng.randrange(len(words))] = f'<a href="https://example.com/{i}?a=1&amp;b=2">link</a>'
+        parts.append(f"<div>{' '.join(words)}. Done &amp; dusted &lt;ok&gt;.</div>")
+        if i % 5 == 4:
+            parts.append("<div><br></div>")
+    for i in range(images):
+        parts.append(f'<img src="{data_url(image_kb, seed + i)}">')
+    for i in range(remote_images):
+        parts.append(f'<img src="https://example.com/image-{i}.jpg">')
+    return "".join(parts)
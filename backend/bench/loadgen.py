@@ -0,0 +1,159 @@
+"""Load generator for the publish path against a mock Telegram Bot API.
+
+    python -m bench.loadgen --requests 200 --concurrency 20 --images 2 --latency 0.05
+    python -m bench.loadgen --target service --rate-429 0.05
+
+``--target http`` drives ``POST /api/publish`` through the ASGI app in-process;
+``--target service`` calls ``publish_content`` directly. Reports throughput,
+p50/p95/p99 latency, outbound calls and peak RSS.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+from typing import List
+
+os.environ.setdefault("JOBS_ENABLED", "false")
+
+import httpx  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.services import media, telegram  # noqa: E402
+
+from .content import make_note  # noqa: E402
+from .mock_telegram import MockBotAPI  # noqa: E402
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def run(args: argparse.Namespace) -> dict:
+    settings.telegram_rate_limit = args.rate_limit
+    mock = MockBotAPI(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429, retry_after=args.retry_after, seed=1)
+    await telegram.init_client(mock.transport())
+
+    notes = [
+        make_note(paragraphs=args.paragraphs, images=args.images, image_kb=args.image_kb,
+                  remote_images=args.remote_images, seed=i if args.unique_images else 0)
+        for i in range(min(args.requests, args.distinct_notes))
+    ]
+
+    app_client = None
+    if args.target == "http":
+        from app.main import app
+        await app.router.startup()
+        app_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None)
+
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        note = notes[i % len(notes)]
+        chat_id = f"-100{i % args.channels}"
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if app_client is not None:
+                    resp = await app_client.post("/api/publish", json={
+                        "telegram_channel": f"Bench={chat_id}",
+                        "telegram_bot_token": "bench",
+                        "channel_id": chat_id,
+                        "content_html": note,
+                        "verify_channel": args.verify,
+                    })
+                    resp.raise_for_status()
+                else:
+                    await telegram.publish_content(note, "", chat_id=chat_id, token="bench")
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    print(f"request {i} failed: {e}", file=sys.stderr)
+                return
+            latencies.append(time.perf_counter() - started)
+
+    media.reset_memory_peak()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    wall = time.perf_counter() - started
+
+    if app_client is not None:
+        await app_client.aclose()
+        from app.main import app
+        await app.router.shutdown()
+    await telegram.close_client()
+
+    return {
+        "target": args.target,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1e3, 2) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1e3, 2),
+            "p95": round(percentile(latencies, 95) * 1e3, 2),
+            "p99": round(percentile(latencies, 99) * 1e3, 2),
+        },
+        "telegram_calls": dict(mock.calls),
+        "telegram_429s": sum(mock.rejected.values()),
+        "uploaded_mb": round(mock.bytes_received / 1e6, 2),
+        "peak_decoded_in_memory_mb": round(media.memory_stats()["peak"] / 1e6, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("http", "service"), default="http")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--channels", type=int, default=10, help="distinct chat ids to spread posts over")
+    parser.add_argument("--paragraphs", type=int, default=2, help="keep small with images: captions are capped at 1024 characters")
+    parser.add_argument("--images", type=int, default=1, help="data-URL images per note")
+    parser.add_argument("--image-kb", type=int, default=256)
+    parser.add_argument("--remote-images", type=int, default=0)
+    parser.add_argument("--distinct-notes", type=int, default=10)
+    parser.add_argument("--unique-images", action="store_true", help="different image bytes per note (defeats file_id reuse)")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock Bot API latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="probability a send is rejected with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--rate-limit", action="store_true", help="enable the outbound rate limiter")
+    parser.add_argument("--verify", action="store_true", help="verify channel access per publish")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    lat = report["latency_ms"]
+    print(f"{report['requests']} requests ({report['errors']} errors) in {report['wall_s']} s "
+          f"-> {report['throughput_rps']} req/s at concurrency {report['concurrency']}")
+    print(f"latency ms: mean {lat['mean']}  p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}")
+    print(f"telegram calls: {report['telegram_calls']}  429s: {report['telegram_429s']}  uploaded: {report['uploaded_mb']} MB")
+    print(f"peak decoded images in memory: {report['peak_decoded_in_memory_mb']} MB  peak RSS: {report['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Micro-benchmarks for the publish hot path.
+
+    python -m bench.micro [--quick] [--filter split]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Callable, List, Tuple
+
+os.environ.setdefault("JOBS_ENABLED", "false")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.routers.publish import PublishRequest  # noqa: E402
+from app.services import telegram  # noqa: E402
+from app.services.fastjson import FastJSONResponse, orjson  # noqa: E402
+
+from .content import data_url, make_note  # noqa: E402
+from .mock_telegram import MockBotAPI  # noqa: E402
+
+
+def measure(fn: Callable[[], object], min_time: float = 0.5, repeat: int = 5) -> List[float]:
+    """Seconds per call for ``repeat`` rounds, each long enough to be stable."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / repeat or number >= 1 << 20:
+            break
+        number *= 2
+    rounds = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - started) / number)
+    return rounds
+
+
+def _publish_result(messages: int, text: str) -> dict:
+    """A fanout-style response: one Telegram message object per part."""
+    chunks = telegram.split_message(text) or [""]
+    return {
+        "success": True,
+        "results": [
+            {
+                "channel_id": f"-100{i % 10}",
+                "ok": True,
+                "result": {
+                    "message_id": i,
+                    "date": 1700000000 + i,
+                    "chat": {"id": -1000 - i % 10, "type": "channel", "title": "Benchmark"},
+                    "text": chunks[i % len(chunks)],
+                    "entities": [{"type": "bold", "offset": j * 10, "length": 5} for j in range(20)],
+                    "photo": [{"file_id": f"AgAC{i:08d}{j}", "file_unique_id": f"AQAD{i}{j}", "width": 90 * j, "height": 60 * j, "file_size": 1000 * j} for j in range(1, 4)],
+                },
+            }
+            for i in range(messages)
+        ],
+    }
+
+
+def _json_cases(quick: bool) -> List[Tuple[str, int, Callable[[], object]]]:
+    """Request decoding and response encoding, FastAPI's default path vs orjson."""
+    note = make_note(paragraphs=50 if quick else 1000, images=2, image_kb=256 if quick else 1024)
+    body = json.dumps({"telegram_channel": "Bench=-100", "telegram_bot_token": "bench", "channel_id": "-100", "title": "Benchmark", "content_html": note}).encode()
+    result = _publish_result(50 if quick else 500, telegram.html_to_telegram_text(make_note(paragraphs=20)))
+    encoded = len(JSONResponse(jsonable_encoder(result)).body)
+
+    cases = [
+        ("request json/stdlib", len(body), lambda: PublishRequest.model_validate(json.loads(body))),
+        ("response json/stdlib", encoded, lambda: JSONResponse(jsonable_encoder(result))),
+    ]
+    if orjson is not None:
+        cases[1:1] = [("request json/orjson", len(body), lambda: PublishRequest.model_validate(orjson.loads(body)))]
+        cases.append(("response json/orjson", encoded, lambda: FastJSONResponse(result)))
+    return cases
+
+
+def _hostile_cases(quick: bool) -> List[Tuple[str, int, Callable[[], object]]]:
+    """Inputs that used to make the converter quadratic; they should stay in MB/s."""
+    scale = 2000 if quick else 20000
+    inputs = [
+        ("unclosed tags", "<a x" * scale),
+        ("unclosed quoted attrs", '<a "x' * (scale // 2)),
+        ("unclosed nesting", "<b><i>x" * scale),
+        ("interleaved closes", "<b>" * (scale // 2) + "<i>x</b>" * (scale // 2)),
+    ]
+    return [
+        (f"html_to_telegram_text/{name}", len(source), lambda source=source: telegram.html_to_telegram_text(source))
+        for name, source in inputs
+    ]
+
+
+def _cases(quick: bool) -> List[Tuple[str, int, Callable[[], object]]]:
+    small = make_note(paragraphs=5)
+    large = make_note(paragraphs=50 if quick else 2000)
+    with_images = make_note(paragraphs=10, images=3, image_kb=512 if quick else 2048)
+    text = telegram.html_to_telegram_text(large)
+    image = data_url(1024 if quick else 8192)
+
+    mock = MockBotAPI(latency=0.0)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(telegram.init_client(mock.transport()))
+    settings.telegram_rate_limit = False
+    note = make_note(paragraphs=2, images=4, image_kb=256)
+
+    def publish() -> None:
+        loop.run_until_complete(telegram.publish_content(note, "Benchmark", chat_id="-100", token="bench"))
+
+    return [
+        ("html_to_telegram_text/small", len(small), lambda: telegram.html_to_telegram_text(small)),
+        ("html_to_telegram_text/large", len(large), lambda: telegram.html_to_telegram_text(large)),
+        ("extract_image_srcs/images", len(with_images), lambda: telegram.extract_image_srcs(with_images)),
+        ("validate_content_length/large", len(large), lambda: telegram.validate_content_length(large)),
+        ("split_message/large", len(text), lambda: telegram.split_message(text)),
+        *_hostile_cases(quick),
+        ("parse_data_url", len(image), lambda: telegram.parse_data_url(image)),
+        ("publish_content/4 images (mock, 0 ms)", len(note), publish),
+        *_json_cases(quick),
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="smaller inputs and shorter runs")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    args = parser.parse_args()
+
+    print(f"{'case':45} {'input':>10} {'median':>12} {'min':>12} {'MB/s':>9} {'ms/MB':>9}")
+    for name, size, fn in _cases(args.quick):
+        if args.filter not in name:
+            continue
+        rounds = measure(fn, min_time=0.2 if args.quick else 1.0)
+        median = statistics.median(rounds)
+        rate = size / median / 1e6 if median else float("inf")
+        per_mb = median * 1e3 / (size / 1e6) if size else 0.0
+        print(f"{name:45} {size / 1e6:>8.2f}MB {median * 1e3:>10.3f}ms {min(rounds) * 1e3:>10.3f}ms {rate:>9.1f} {per_mb:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Stand-in for the Telegram Bot API.
+
+Use ``MockBotAPI().transport()`` with ``telegram.set_client`` for in-process
+runs, or serve it over HTTP and point ``TELEGRAM_API_BASE`` at it::
+
+    python -m uvicorn bench.mock_telegram:app --port 8081
+    TELEGRAM_API_BASE=http://127.0.0.1:8081 python -m uvicorn app.main:app
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import os
+import random
+from collections import Counter
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+import httpx
+
+
+class MockBotAPI:
+    """Answers Bot API calls with canned results after a configurable delay.
+
+    ``rate_429`` is the probability that a sending call is rejected with
+    ``429 Too Many Requests`` and ``retry_after`` seconds.
+    """
+
+    SENDING_METHODS = {"sendMessage", "sendPhoto", "sendMediaGroup", "editMessageText", "editMessageCaption", "editMessageMedia"}
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, rate_429: float = 0.0, retry_after: float = 1.0, seed: Optional[int] = None) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self.rejected: Counter = Counter()
+        self.bytes_received = 0
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.rejected.clear()
+        self.bytes_received = 0
+
+    async def handle(self, method: str, body: bytes, content_type: str) -> httpx.Response:
+        self.calls[method] += 1
+        self.bytes_received += len(body)
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if method in self.SENDING_METHODS and self.rate_429 and self._random.random() < self.rate_429:
+            self.rejected[method] += 1
+            return httpx.Response(429, json={
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after:g}",
+                "parameters": {"retry_after": self.retry_after},
+            })
+        return httpx.Response(200, json={"ok": True, "result": self._result(method, body, content_type)})
+
+    def _result(self, method: str, body: bytes, content_type: str) -> object:
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Mock", "username": "mock_bot"}
+        fields = self._form(body, content_type)
+        chat = {"id": fields.get("chat_id", "0"), "type": "channel", "title": "Mock channel"}
+        if method == "getChat":
+            return chat
+        if method == "sendMediaGroup":
+            media = json.loads(fields.get("media", "[]"))
+            return [self._message(chat, photo=True) for _ in media]
+        if method == "deleteMessage":
+            return True
+        return self._message(chat, photo=method in ("sendPhoto", "editMessageMedia"))
+
+    def _message(self, chat: dict, photo: bool) -> dict:
+        message = {"message_id": next(self._message_ids), "chat": chat}
+        if photo:
+            file_id = f"mock-file-{next(self._file_ids)}"
+            message["photo"] = [{"file_id": f"{file_id}-s", "width": 90, "height": 90}, {"file_id": file_id, "width": 1280, "height": 960}]
+        return message
+
+    @staticmethod
+    def _form(body: bytes, content_type: str) -> Dict[str, str]:
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return {k: v[0] for k, v in parse_qs(body.decode("utf-8", "replace")).items()}
+        if content_type.startswith("multipart/form-data"):
+            # Only the small text fields are needed; skip file parts
+            boundary = content_type.split("boundary=", 1)[-1].encode()
+            fields: Dict[str, str] = {}
+            for part in body.split(b"--" + boundary):
+                head, _, value = part.partition(b"\r\n\r\n")
+                if b"filename=" in head or b'name="' not in head:
+                    continue
+                name = head.split(b'name="', 1)[1].split(b'"', 1)[0].decode()
+                fields[name] = value.rstrip(b"\r\n").decode("utf-8", "replace")
+            return fields
+        return {}
+
+    def transport(self) -> httpx.MockTransport:
+        async def handler(request: httpx.Request) -> httpx.Response:
+            body = await request.aread()
+            method = request.url.path.rsplit("/", 1)[-1]
+            return await self.handle(method, body, request.headers.get("content-type", ""))
+        return httpx.MockTransport(handler)
+
+    def asgi_app(self):
+        """Minimal ASGI app serving ``/bot<token>/<method>``."""
+        async def app(scope, receive, send):
+            if scope["type"] != "http":
+                return
+            chunks = []
+            while True:
+                message = await receive()
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            headers = dict(scope.get("headers") or [])
+            method = scope["path"].rsplit("/", 1)[-1]
+            resp = await self.handle(method, b"".join(chunks), headers.get(b"content-type", b"").decode())
+            await send({"type": "http.response.start", "status": resp.status_code, "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": resp.content})
+        return app
+
+
+def _from_env() -> MockBotAPI:
+    return MockBotAPI(
+        latency=float(os.getenv("MOCK_LATENCY", "0.05")),
+        jitter=float(os.getenv("MOCK_JITTER", "0")),
+        rate_429=float(os.getenv("MOCK_RATE_429", "0")),
+        retry_after=float(os.getenv("MOCK_RETRY_AFTER", "1")),
+    )
+
+
+mock = _from_env()
+app = mock.asgi_app()
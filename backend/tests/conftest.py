@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import base64
+import io
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services import published, telegram
+from app.services.file_ids import file_id_cache
+
+
+class FakeTelegram:
+    """Bot API stand-in: answers every method with success and records the calls."""
+
+    def __init__(self) -> None:
+        # (method, form fields); uploaded files are listed under "files"
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        # method -> errors to answer matching calls with, as (status, description, chat_id, retry_after)
+        self.errors: Dict[str, List[Tuple[int, str, Optional[str], Optional[float]]]] = {}
+        self._message_id = 100
+
+    def methods(self, *names: str) -> List[str]:
+        return [method for method, _ in self.calls if not names or method in names]
+
+    def texts(self) -> List[str]:
+        return [params["text"] for method, params in self.calls if method in ("sendMessage", "editMessageText")]
+
+    def fail(self, method: str, status: int = 400, description: str = "Bad Request", *,
+             chat_id: Optional[str] = None, retry_after: Optional[float] = None) -> None:
+        """Answer the next ``method`` call (to ``chat_id``, if given) with an error."""
+        self.errors.setdefault(method, []).append((status, description, chat_id, retry_after))
+
+    def _message(self, photo: bool = False) -> Dict[str, Any]:
+        self._message_id += 1
+        message: Dict[str, Any] = {"message_id": self._message_id, "chat": {"id": -100}, "date": 0}
+        if photo:
+            message["photo"] = [{"file_id": f"small-{self._message_id}"}, {"file_id": f"photo-{self._message_id}"}]
+        return message
+
+    def _error(self, method: str, params: Dict[str, Any]) -> Optional[httpx.Response]:
+        for i, (status, description, chat_id, retry_after) in enumerate(self.errors.get(method, ())):
+            if chat_id is None or params.get("chat_id") == chat_id:
+                del self.errors[method][i]
+                body: Dict[str, Any] = {"ok": False, "error_code": status, "description": description}
+                if retry_after is not None:
+                    body["parameters"] = {"retry_after": retry_after}
+                return httpx.Response(status, json=body)
+        return None
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        method = request.url.path.rsplit("/", 1)[-1]
+        params = _form(request)
+        self.calls.append((method, params))
+        error = self._error(method, params)
+        if error is not None:
+            return error
+        if method == "getMe":
+            result: Any = {"id": 1, "is_bot": True, "username": "test_bot"}
+        elif method == "getChat":
+            result = {"id": -100, "type": "channel", "title": "Test"}
+        elif method == "sendMessage":
+            result = self._message()
+        elif method == "sendPhoto":
+            result = self._message(photo=True)
+        elif method == "sendMediaGroup":
+            result = [self._message(photo=True) for _ in json.loads(params["media"])]
+        elif method == "editMessageMedia":
+            result = self._message(photo=True)
+        else:
+            result = True
+        return httpx.Response(200, json={"ok": True, "result": result})
+
+
+def _form(request: httpx.Request) -> Dict[str, Any]:
+    content_type = request.headers.get("content-type", "")
+    body = request.read()
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        return dict(parse_qsl(body.decode()))
+    if content_type.startswith("multipart/form-data"):
+        text = body.decode("latin-1")
+        params: Dict[str, Any] = {
+            name: value.encode("latin-1").decode() for name, value in _FIELD_RE.findall(text)
+        }
+        params["files"] = _FILE_RE.findall(text)
+        return params
+    return {}
+
+
+_FIELD_RE = re.compile(r'name="([^"]+)"\r\n\r\n(.*?)\r\n--', re.S)
+_FILE_RE = re.compile(r'name="([^"]+)"; filename=')
+
+
+@pytest.fixture(autouse=True)
+def _no_rate_limit(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "telegram_rate_limit", False)
+
+
+@pytest.fixture
+def fake_telegram() -> Any:
+    fake = FakeTelegram()
+    telegram.set_client(telegram.create_client(httpx.MockTransport(fake.handle)))
+    yield fake
+    telegram.set_client(None)
+    # Cached getChat results and file_ids belong to this fake
+    telegram._info_cache._data.clear()
+    file_id_cache._data.clear()
+
+
+@pytest.fixture
+def published_store(tmp_path: Any) -> Optional[published.PublishedStore]:
+    store = published.init_store(tmp_path / "published.sqlite3")
+    yield store
+    published.close_store()
+
+
+def png_data_url(color: str = "red", size: Tuple[int, int] = (32, 32)) -> str:
+    """A small PNG as a ``data:`` URL, as the editor embeds pasted images."""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+@pytest.fixture
+def image() -> str:
+    return png_data_url()
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any
+
+from app.services.telegram import MEDIA_GROUP_LIMIT, prepare_post, publish_content
+
+from .conftest import png_data_url
+
+TOKEN = "123:test"
+CHAT = "-1001"
+
+
+def images(count: int) -> str:
+    # Distinct sizes, so every image has its own bytes
+    return "".join(f'<img src="{png_data_url(size=(8 + i, 8))}">' for i in range(count))
+
+
+def test_images_go_out_as_albums_of_up_to_ten(fake_telegram: Any) -> None:
+    asyncio.run(publish_content(f"<p>Caption</p><p>{images(12)}</p>", "", chat_id=CHAT, token=TOKEN))
+
+    assert fake_telegram.methods() == ["sendMediaGroup", "sendMediaGroup"]
+    (_, first), (_, second) = fake_telegram.calls
+    first_media, second_media = json.loads(first["media"]), json.loads(second["media"])
+    assert [len(first_media), len(second_media)] == [MEDIA_GROUP_LIMIT, 2]
+    # Uploaded as attachments of the same request
+    assert [m["media"] for m in first_media] == [f"attach://file{i}" for i in range(10)]
+    assert first["files"] == [f"file{i}" for i in range(10)]
+    # Only the first photo carries the caption
+    assert first_media[0]["caption"] == "Caption"
+    assert not any("caption" in m for m in first_media[1:] + second_media)
+
+
+def test_single_remote_image_is_sent_by_url(fake_telegram: Any) -> None:
+    asyncio.run(publish_content('<p>Hi</p><img src="https://example.com/a.png">', "", chat_id=CHAT, token=TOKEN))
+    assert fake_telegram.methods() == ["sendPhoto"]
+    params = fake_telegram.calls[0][1]
+    assert params["photo"] == "https://example.com/a.png"
+    assert params["caption"] == "Hi"
+
+
+def test_parts_are_described_in_send_order() -> None:
+    async def run() -> list:
+        post = await prepare_post(f"<p>{'x' * 1500}</p><p>{images(11)}</p>", "")
+        try:
+            return post.describe_parts()
+        finally:
+            post.close()
+
+    parts = asyncio.run(run())
+    assert [(p["kind"], p["items"]) for p in parts] == [("album", 10), ("photo", 1), ("text", 1)]
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Dict, List
+
+import pytest
+
+from app.services.cache import LRUCache, TTLCache
+from app.services.state import create_state
+
+
+def counting_fetch(calls: List[int], delay: float = 0.0):
+    async def fetch() -> int:
+        calls.append(len(calls))
+        await asyncio.sleep(delay)
+        return len(calls)
+    return fetch
+
+
+def test_concurrent_misses_share_one_fetch() -> None:
+    cache = TTLCache(ttl=60)
+    calls: List[int] = []
+
+    async def run() -> List[Any]:
+        fetch = counting_fetch(calls, delay=0.05)
+        return await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(5)))
+
+    assert asyncio.run(run()) == [1] * 5
+    assert len(calls) == 1
+
+
+def test_stale_entries_are_served_while_one_refresh_runs() -> None:
+    cache = TTLCache(ttl=0.2, stale_ttl=10)
+    calls: List[int] = []
+
+    async def run() -> List[Any]:
+        fetch = counting_fetch(calls, delay=0.05)
+        first = await cache.get_or_fetch("k", fetch)
+        await asyncio.sleep(0.25)
+        # Stale: answered at once from memory, refreshed in the background
+        started = time.monotonic()
+        stale = [await cache.get_or_fetch("k", fetch) for _ in range(3)]
+        assert time.monotonic() - started < 0.03
+        await asyncio.sleep(0.1)
+        return [first, *stale, await cache.get_or_fetch("k", fetch)]
+
+    assert asyncio.run(run()) == [1, 1, 1, 1, 2]
+    assert len(calls) == 2
+
+
+def test_failures_are_not_cached_and_refresh_bypasses_the_cache() -> None:
+    cache = TTLCache(ttl=60)
+    attempts: Dict[str, int] = {"n": 0}
+
+    async def flaky() -> str:
+        attempts["n"] += 1
+        if attempts["n"] == 1:
+            raise RuntimeError("down")
+        return f"v{attempts['n']}"
+
+    async def run() -> None:
+        with pytest.raises(RuntimeError):
+            await cache.get_or_fetch("k", flaky)
+        assert await cache.get_or_fetch("k", flaky) == "v2"
+        assert await cache.get_or_fetch("k", flaky) == "v2"
+        assert await cache.get_or_fetch("k", flaky, refresh=True) == "v3"
+
+    asyncio.run(run())
+
+
+def test_shared_entries_serve_other_workers(tmp_path: Any) -> None:
+    state = create_state("sqlite", tmp_path / "state.sqlite3")
+    first, second = TTLCache(ttl=60, state=state), TTLCache(ttl=60, state=state)
+    calls: List[int] = []
+
+    async def run() -> None:
+        assert await first.get_or_fetch(("bot", 1), counting_fetch(calls)) == 1
+        assert await second.get_or_fetch(("bot", 1), counting_fetch(calls)) == 1
+
+    try:
+        asyncio.run(run())
+    finally:
+        state.close()
+    assert len(calls) == 1
+
+
+def test_lru_cache_evicts_least_recently_used() -> None:
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.core.config import settings
+from app.services import channels as channels_module
+from app.services.channels import ChannelRegistry
+
+TOKEN = "123:test"
+
+
+@pytest.fixture
+def env(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Path:
+    """A scratch ``.env``; the variables the registry reloads are restored afterwards."""
+    path = tmp_path / ".env"
+    monkeypatch.setattr(channels_module, "env_file", path)
+    monkeypatch.delenv("TELEGRAM_CHANNELS", raising=False)
+    monkeypatch.delenv("TELEGRAM_BOT_TOKEN", raising=False)
+    monkeypatch.setattr(settings, "telegram_bot_token", None)
+    return path
+
+
+def write_env(path: Path, text: str) -> None:
+    # A distinct mtime each time, however fast the test runs
+    mtime = path.stat().st_mtime_ns + 1_000_000 if path.exists() else None
+    path.write_text(text)
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+
+def test_configured_channels_come_from_env(fake_telegram: Any, env: Path) -> None:
+    write_env(env, f"TELEGRAM_BOT_TOKEN={TOKEN}\nTELEGRAM_CHANNELS=News=-1001\n")
+    registry = ChannelRegistry()
+    assert registry._reload_env()
+    assert os.environ["TELEGRAM_CHANNELS"] == "News=-1001"
+    assert settings.telegram_bot_token == TOKEN
+    channels, _ = registry.channels()
+    assert channels == [{"id": "-1001", "name": "News"}]
+    # Unchanged file: nothing to do
+    assert not registry._reload_env()
+
+
+def test_removed_variables_are_unset(fake_telegram: Any, env: Path) -> None:
+    write_env(env, f"TELEGRAM_BOT_TOKEN={TOKEN}\nTELEGRAM_CHANNELS=News=-1001\n")
+    registry = ChannelRegistry()
+    registry._reload_env()
+    registry._load()
+
+    write_env(env, f"TELEGRAM_BOT_TOKEN={TOKEN}\n")
+    assert registry._reload_env()
+    registry._load()
+    assert "TELEGRAM_CHANNELS" not in os.environ
+    assert registry.channels()[0] == []
+
+
+def test_request_channels_do_not_join_the_configuration(fake_telegram: Any, env: Path) -> None:
+    write_env(env, f"TELEGRAM_BOT_TOKEN={TOKEN}\nTELEGRAM_CHANNELS=News=-1001\n")
+    registry = ChannelRegistry()
+    registry._reload_env()
+    registry._load()
+
+    status = asyncio.run(registry.status(TOKEN, [{"id": "-1001", "name": "News"}, {"id": "-1002", "name": "Other"}]))
+    assert [(c["id"], c["accessible"]) for c in status["channels"]] == [("-1001", True), ("-1002", True)]
+    assert registry._configured_bot.names == {"-1001": "News"}
+    assert [c["id"] for c in asyncio.run(registry.configured_status())["channels"]] == ["-1001"]
+
+
+def test_client_bot_channels_are_answered_from_memory(fake_telegram: Any, env: Path) -> None:
+    registry = ChannelRegistry()
+    request = [{"id": "-1001", "name": "News"}]
+    first = asyncio.run(registry.status(TOKEN, request))
+    calls = len(fake_telegram.calls)
+    second = asyncio.run(registry.status(TOKEN, request))
+    assert len(fake_telegram.calls) == calls
+    assert second["version"] == first["version"]
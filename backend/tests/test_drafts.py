@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import drafts
+from app.services import drafts as draft_store
+
+CHANNEL = "-1001"
+
+
+@pytest.fixture
+def client(tmp_path: Path) -> TestClient:
+    draft_store.init_store(tmp_path / "drafts.sqlite3")
+    app = FastAPI()
+    app.include_router(drafts.router, prefix="/api")
+    yield TestClient(app)
+    draft_store.close_store()
+
+
+def put(client: TestClient, draft_id: str, html: str, **headers: str):
+    return client.put(f"/api/drafts/{draft_id}", json={"channel_id": CHANNEL, "content_html": html},
+                      headers={k.replace("_", "-"): v for k, v in headers.items()})
+
+
+def test_versions_and_conditional_writes(client: TestClient) -> None:
+    created = put(client, "a", "<p>one</p>")
+    assert created.status_code == 200
+    etag = created.headers["etag"]
+
+    updated = put(client, "a", "<p>two</p>", If_Match=etag)
+    assert updated.json()["version"] > created.json()["version"]
+    # An identical save is not a new version
+    assert put(client, "a", "<p>two</p>").json()["version"] == updated.json()["version"]
+
+    # Written from a stale copy: rejected with the current draft
+    stale = put(client, "a", "<p>lost</p>", If_Match=etag)
+    assert stale.status_code == 412
+    assert stale.json()["detail"]["draft"]["content_html"] == "<p>two</p>"
+    assert put(client, "a", "<p>x</p>", If_Match="nonsense").status_code == 400
+
+    fetched = client.get("/api/drafts/a")
+    assert fetched.json()["content_html"] == "<p>two</p>"
+    assert client.get("/api/drafts/a", headers={"If-None-Match": fetched.headers["etag"]}).status_code == 304
+
+
+def test_delta_sync_lists_changes_and_tombstones(client: TestClient) -> None:
+    put(client, "a", "<p>a</p>")
+    put(client, "b", "<p>b</p>")
+    full = client.get("/api/drafts", params={"channel_id": CHANNEL})
+    assert full.json()["full"]
+    assert sorted(d["id"] for d in full.json()["drafts"]) == ["a", "b"]
+    cursor = full.json()["cursor"]
+
+    assert client.get("/api/drafts", params={"channel_id": CHANNEL},
+                      headers={"If-None-Match": full.headers["etag"]}).status_code == 304
+
+    put(client, "b", "<p>b2</p>")
+    assert client.delete("/api/drafts/a").json() == {"success": True}
+    delta = client.get("/api/drafts", params={"channel_id": CHANNEL, "since": cursor}).json()
+    assert [d["id"] for d in delta["drafts"]] == ["b"]
+    assert delta["deleted"] == ["a"]
+    assert delta["cursor"] > cursor
+    assert client.get("/api/drafts/a").status_code == 404
+
+
+def test_delete_honours_if_match(client: TestClient) -> None:
+    etag = put(client, "a", "<p>a</p>").headers["etag"]
+    put(client, "a", "<p>newer</p>")
+    assert client.delete("/api/drafts/a", headers={"If-Match": etag}).status_code == 412
+    assert client.delete("/api/drafts/missing").status_code == 404
+
+
+def test_drafts_disabled(tmp_path: Path) -> None:
+    app = FastAPI()
+    app.include_router(drafts.router, prefix="/api")
+    assert TestClient(app).get("/api/drafts/a").status_code == 404
+
+
+def test_workers_sharing_the_database_never_reuse_a_cursor(tmp_path: Path) -> None:
+    first = draft_store.DraftStore(tmp_path / "drafts.sqlite3")
+    second = draft_store.DraftStore(tmp_path / "drafts.sqlite3")
+    try:
+        cursors = []
+        for i in range(5):
+            for n, store in enumerate((first, second)):
+                store.put(f"{n}-{i}", channel_id=CHANNEL, title="", content_html=f"<p>{i}</p>")
+                cursors.append(store.cursor(CHANNEL))
+        assert cursors == sorted(set(cursors))
+        assert len(first.changes(CHANNEL)[0]) == 10
+    finally:
+        first.close()
+        second.close()
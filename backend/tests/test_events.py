@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, List, Tuple
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import publish
+from app.services.jobs import DONE, PublishJobQueue, publish_jobs
+from app.services.sse import EventStreamGZipMiddleware, format_event
+from app.services.state import MemoryState
+
+TOKEN = "123:test"
+CHAT = "-1001"
+
+
+def three_part_note() -> str:
+    # Three paragraphs of ~3000 visible characters: one message each
+    return "".join(f"<p>{'part%d ' % i * 500}</p>" for i in range(3))
+
+
+def parse(stream: str) -> List[Tuple[str, Any]]:
+    events = []
+    for block in stream.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_format_event() -> None:
+    assert format_event("part", {"a": 1}, "7") == b'id: 7\nevent: part\ndata: {"a":1}\n\n'
+
+
+def test_watch_streams_every_part_as_it_is_sent(fake_telegram: Any, tmp_path: Path) -> None:
+    async def run() -> List[Tuple[Any, Any]]:
+        jobs = PublishJobQueue(MemoryState())
+        await jobs.start(tmp_path / "jobs.sqlite3", workers=1)
+        try:
+            await jobs.store.create("job-1", CHAT, {"token": TOKEN, "chat_id": CHAT, "html_content": three_part_note(),
+                                                   "title": "", "verify_channel": False})
+            stream = jobs.watch("job-1")
+            # Subscribed with the queued snapshot before the job is picked up
+            events = [await stream.__anext__()]
+            jobs._enqueue("job-1")
+            events.extend([item async for item in stream])
+            return events
+        finally:
+            await jobs.stop()
+
+    events = asyncio.run(run())
+    assert [event for event, _ in events] == ["job", "status", "parts", "part", "part", "part", "done"]
+    assert [data["parts_sent"] for event, data in events if event == "part"] == [1, 2, 3]
+    assert events[-1][1]["status"] == DONE
+
+
+@pytest.fixture
+def client(tmp_path: Path) -> TestClient:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        await publish_jobs.start(tmp_path / "jobs.sqlite3", workers=1)
+        yield
+        await publish_jobs.stop()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(publish.router, prefix="/api")
+    app.add_middleware(EventStreamGZipMiddleware, minimum_size=10)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_events_endpoint_streams_uncompressed_until_done(fake_telegram: Any, client: TestClient) -> None:
+    job = client.post("/api/publish", json={
+        "telegram_channel": f"Test={CHAT}", "telegram_bot_token": TOKEN, "channel_id": CHAT,
+        "content_html": three_part_note(), "verify_channel": False, "background": True,
+    }).json()
+    response = client.get(f"/api/publish/jobs/{job['job_id']}/events",
+                          headers={"Accept": "text/event-stream", "Accept-Encoding": "gzip"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "content-encoding" not in response.headers
+    events = parse(response.text)
+    # However far the job got before the stream opened, it starts with a snapshot and ends with the result
+    assert events[0][0] == "job"
+    assert events[-1][0] == "done"
+    assert events[-1][1]["parts_sent"] == 3
+
+    assert client.get("/api/publish/jobs/missing/events").status_code == 404
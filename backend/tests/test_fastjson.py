@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from fastapi import APIRouter, FastAPI, Response
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.services.fastjson import FastJSONResponse, FastJSONRoute, fast_json_enabled
+
+
+class Note(BaseModel):
+    title: str
+    content_html: str
+
+
+class Public(BaseModel):
+    title: str
+
+
+@pytest.fixture(params=[True, False], ids=["orjson", "stdlib"])
+def client(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> TestClient:
+    monkeypatch.setattr(settings, "fast_json", request.param)
+    router = APIRouter(route_class=FastJSONRoute)
+
+    @router.post("/echo", response_model=None)
+    async def echo(note: Note) -> dict:
+        return {"title": note.title, "length": len(note.content_html), "ids": {1, 2}}
+
+    @router.get("/filtered", response_model=Public)
+    def filtered() -> Any:
+        return {"title": "kept", "token": "secret"}
+
+    @router.get("/headers", response_model=None)
+    def headers(response: Response) -> dict:
+        response.headers["X-Extra"] = "yes"
+        response.status_code = 202
+        return {"ok": True}
+
+    @router.post("/created", status_code=201, response_model=None)
+    def created() -> dict:
+        return {"ok": True}
+
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def test_bodies_round_trip(client: TestClient) -> None:
+    html = "<p>" + "é" * 100_000 + "</p>"
+    response = client.post("/echo", json={"title": "T", "content_html": html})
+    assert response.json() == {"title": "T", "length": len(html), "ids": [1, 2]}
+
+
+def test_malformed_bodies_are_rejected(client: TestClient) -> None:
+    response = client.post("/echo", content=b'{"title": ', headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+    assert client.post("/echo", json={"title": "T"}).status_code == 422
+
+
+def test_response_model_still_filters(client: TestClient) -> None:
+    assert client.get("/filtered").json() == {"title": "kept"}
+
+
+def test_injected_response_and_status_code_apply(client: TestClient) -> None:
+    response = client.get("/headers")
+    assert response.status_code == 202
+    assert response.headers["x-extra"] == "yes"
+    assert client.post("/created").status_code == 201
+
+
+def test_orjson_renders_non_string_keys() -> None:
+    if not fast_json_enabled():
+        pytest.skip("orjson is not installed")
+    assert FastJSONResponse({1: "a"}).body == b'{"1":"a"}'
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+from typing import Any
+
+from app.services.file_ids import FileIdCache, file_id_cache
+from app.services.telegram import publish_content
+
+TOKEN = "123:test"
+
+
+def digest(data_url: str) -> str:
+    return hashlib.sha256(base64.b64decode(data_url.split(",", 1)[1])).hexdigest()
+
+
+def test_second_chat_reuses_the_uploaded_file_id(fake_telegram: Any, image: str) -> None:
+    html = f'<p><img src="{image}"></p>'
+    asyncio.run(publish_content(html, "", chat_id="-1001", token=TOKEN))
+    asyncio.run(publish_content(html, "", chat_id="-1002", token=TOKEN))
+
+    (_, first), (_, second) = [call for call in fake_telegram.calls if call[0] == "sendPhoto"]
+    assert first["files"] == ["photo"]
+    assert "files" not in second
+    assert second["photo"].startswith("photo-")
+
+
+def test_rejected_file_id_is_uploaded_again(fake_telegram: Any, image: str) -> None:
+    asyncio.run(file_id_cache.put(TOKEN, digest(image), "expired"))
+    fake_telegram.fail("sendPhoto", 400, "Bad Request: wrong file identifier")
+    asyncio.run(publish_content(f'<p><img src="{image}"></p>', "", chat_id="-1001", token=TOKEN))
+
+    (_, stale), (_, upload) = fake_telegram.calls
+    assert stale["photo"] == "expired"
+    assert upload["files"] == ["photo"]
+    assert asyncio.run(file_id_cache.get(TOKEN, digest(image))).startswith("photo-")
+
+
+def test_file_ids_survive_a_restart(tmp_path: Any) -> None:
+    async def fill() -> None:
+        cache = FileIdCache(maxsize=2, path=tmp_path / "file_ids.sqlite3")
+        for i in range(3):
+            await cache.put(TOKEN, f"digest-{i}", f"file-{i}")
+        await cache.discard(TOKEN, "digest-2")
+        cache.close()
+
+    asyncio.run(fill())
+    cache = FileIdCache(maxsize=2, path=tmp_path / "file_ids.sqlite3")
+    try:
+        # The oldest entry was evicted from the LRU and the database alike
+        assert asyncio.run(cache.get(TOKEN, "digest-0")) is None
+        assert asyncio.run(cache.get(TOKEN, "digest-1")) == "file-1"
+        assert asyncio.run(cache.get(TOKEN, "digest-2")) is None
+        assert len(cache) == 1
+    finally:
+        cache.close()
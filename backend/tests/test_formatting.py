@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import html
+import re
+import time
+from typing import List
+
+import pytest
+
+from app.services.formatting import convert_html, split_html, utf16_len
+
+_TAG_RE = re.compile(r"<(/?)([a-z-]+)[^>]*>")
+
+
+def visible_length(part: str) -> int:
+    return utf16_len(html.unescape(re.sub(r"<[^>]*>", "", part)))
+
+
+def assert_balanced(part: str) -> None:
+    stack: List[str] = []
+    for closing, name in _TAG_RE.findall(part):
+        if closing:
+            assert stack and stack[-1] == name, f"</{name}> does not close {stack} in {part[:80]!r}"
+            stack.pop()
+        else:
+            stack.append(name)
+    assert not stack, f"unclosed {stack} in {part[:80]!r}"
+
+
+def test_convert_keeps_telegram_tags_and_drops_the_rest() -> None:
+    converted = convert_html(
+        '<h1>Title</h1><p>Hello <b>bold <i>it</i></b> <a href="javascript:alert(1)">bad</a> '
+        '<a href="https://x.y">ok</a><img src="/media/abc"></p><script>alert(1)</script>'
+    )
+    assert converted.text == '<b>Title</b>\n\nHello <b>bold <i>it</i></b> bad <a href="https://x.y">ok</a>'
+    assert converted.images == ["/media/abc"]
+    assert converted.text_length == visible_length(converted.text)
+
+
+def test_convert_closes_misnested_and_unclosed_tags() -> None:
+    converted = convert_html("<b>one <i>two</b> three</i> <u>four")
+    assert_balanced(converted.text)
+    assert "four" in converted.text
+
+
+@pytest.mark.parametrize("hostile", [
+    "<b>" * 50_000,
+    "<a href='https://x.y'>" * 20_000 + "x",
+    "<" * 100_000,
+    '<p title="' + "a" * 100_000,
+    "<pre>" + "<code>" * 30_000,
+])
+def test_convert_is_fast_and_balanced_on_hostile_input(hostile: str) -> None:
+    started = time.perf_counter()
+    converted = convert_html(hostile)
+    assert time.perf_counter() - started < 2.0
+    assert_balanced(converted.text)
+
+
+def long_note(paragraphs: int) -> str:
+    words = " ".join(f"word{i} &amp; more 👍" for i in range(12))
+    blocks = [
+        f'<p>Intro {i}: <b>bold <i>nested {words}</i> tail</b> <a href="https://example.com/{i}">link {words}</a></p>'
+        f"<pre><code>code {i} &lt;x&gt; {words}</code></pre>"
+        for i in range(paragraphs)
+    ]
+    return "".join(blocks)
+
+
+@pytest.mark.parametrize("limit, first_limit", [(4096, None), (4096, 1024), (500, 200)])
+def test_split_parts_fit_the_limit_with_balanced_tags(limit: int, first_limit: int) -> None:
+    text = convert_html(long_note(40)).text
+    parts = split_html(text, limit, first_limit=first_limit)
+    assert len(parts) > 2
+    for i, part in enumerate(parts):
+        assert visible_length(part) <= (first_limit or limit if i == 0 else limit)
+        assert_balanced(part)
+    # Nothing visible is lost or duplicated apart from whitespace at the cuts
+    joined = "".join(html.unescape(re.sub(r"<[^>]*>", "", part)) for part in parts)
+    assert re.sub(r"\s+", "", joined) == re.sub(r"\s+", "", html.unescape(re.sub(r"<[^>]*>", "", text)))
+
+
+def test_split_reopens_entities_cut_in_the_middle() -> None:
+    text = "<b>" + " ".join(["word"] * 300) + "</b>"
+    parts = split_html(text, 100)
+    assert all(part.startswith("<b>") and part.endswith("</b>") for part in parts)
+
+
+def test_split_never_cuts_a_character_reference() -> None:
+    text = "&amp;" * 1000
+    for part in split_html(text, 99):
+        assert_balanced(part)
+        assert re.fullmatch(r"(?:&amp;)+", part)
+
+
+def test_split_short_text_is_one_part() -> None:
+    assert split_html("<b>short</b>", 4096) == ["<b>short</b>"]
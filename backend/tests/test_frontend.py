@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app.services.frontend import IMMUTABLE, REVALIDATE, FrontendFiles
+from app.services.sse import EventStreamGZipMiddleware
+
+SCRIPT = "console.log('hello');\n" * 40
+LARGE = b"x" * 4096
+
+
+@pytest.fixture
+def files(tmp_path: Path) -> FrontendFiles:
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "app.js").write_text(SCRIPT)
+    (tmp_path / "index.html").write_text('<script src="assets/app.js"></script>')
+    files = FrontendFiles(tmp_path)
+    files.load()
+    return files
+
+
+@pytest.fixture
+def client(files: FrontendFiles) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/api/large")
+    def large() -> Response:
+        return Response(LARGE, media_type="text/plain", headers={"ETag": '"large"'})
+
+    @app.get("/media/image")
+    def image() -> Response:
+        return Response(LARGE, media_type="image/png", headers={"ETag": '"image"'})
+
+    app.mount("/", files)
+    app.add_middleware(EventStreamGZipMiddleware, minimum_size=500)
+    return TestClient(app)
+
+
+def test_html_points_at_hashed_immutable_assets(client: TestClient) -> None:
+    index = client.get("/")
+    assert index.headers["cache-control"] == REVALIDATE
+    hashed = index.text.split('src="')[1].split('"')[0]
+    assert hashed.startswith("/assets/app.") and hashed.endswith(".js") and hashed != "/assets/app.js"
+
+    asset = client.get(hashed)
+    assert asset.headers["cache-control"] == IMMUTABLE
+    assert asset.text == SCRIPT
+
+
+def test_revalidation_returns_304(client: TestClient) -> None:
+    first = client.get("/assets/app.js", headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+    again = client.get("/assets/app.js", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+
+
+def test_precompressed_variants_are_served_as_is(client: TestClient) -> None:
+    identity = client.get("/assets/app.js", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/assets/app.js", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.text == SCRIPT
+    # Each encoding has its own strong ETag, and the middleware did not compress twice
+    assert gzipped.headers["etag"] != identity.headers["etag"]
+    assert not gzipped.headers["etag"].startswith("W/")
+    assert int(gzipped.headers["content-length"]) < len(SCRIPT)
+
+
+def test_gzip_weakens_the_etag_of_bodies_it_compresses(client: TestClient) -> None:
+    response = client.get("/api/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"large"'
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.content == LARGE
+
+    identity = client.get("/api/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["etag"] == '"large"'
+
+
+def test_gzip_skips_images(client: TestClient) -> None:
+    response = client.get("/media/image", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"image"'
+    assert response.content == LARGE
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import publish
+from app.services.idempotency import IdempotencyStore
+
+TOKEN = "123:test"
+CHAT = "-1001"
+
+
+def test_publish_replays_idempotent_retry_without_calling_telegram(fake_telegram: Any) -> None:
+    app = FastAPI()
+    app.include_router(publish.router, prefix="/api")
+    body = {
+        "telegram_channel": f"Test={CHAT}",
+        "telegram_bot_token": TOKEN,
+        "channel_id": CHAT,
+        "content_html": "<p>Hello</p>",
+        "verify_channel": False,
+    }
+    headers = {"Idempotency-Key": f"replay-{time.time_ns()}"}
+    with TestClient(app) as client:
+        first = client.post("/api/publish", json=body, headers=headers)
+        calls = len(fake_telegram.calls)
+        second = client.post("/api/publish", json=body, headers=headers)
+        conflict = client.post("/api/publish", json=dict(body, content_html="<p>Other</p>"), headers=headers)
+
+    assert first.status_code == 200 and "Idempotent-Replayed" not in first.headers
+    assert fake_telegram.methods() == ["sendMessage"]
+    assert second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json() == first.json()
+    assert len(fake_telegram.calls) == calls
+    assert conflict.status_code == 422
+
+
+def test_client_errors_are_not_replayed(fake_telegram: Any) -> None:
+    app = FastAPI()
+    app.include_router(publish.router, prefix="/api")
+    body = {
+        "telegram_channel": f"Test={CHAT}",
+        "telegram_bot_token": TOKEN,
+        "channel_id": CHAT,
+        "content_html": "<p>Hello</p>",
+    }
+    headers = {"Idempotency-Key": f"error-{time.time_ns()}"}
+    fake_telegram.fail("getChat", 400, "Bad Request: chat not found")
+    with TestClient(app) as client:
+        first = client.post("/api/publish", json=body, headers=headers)
+        # The bot was added to the channel; the same retry now goes through
+        second = client.post("/api/publish", json=body, headers=headers)
+
+    assert first.status_code == 403
+    assert second.status_code == 200
+    assert "Idempotent-Replayed" not in second.headers
+    assert fake_telegram.methods("sendMessage") == ["sendMessage"]
+
+
+def test_runs_in_flight_are_never_evicted() -> None:
+    store = IdempotencyStore(maxsize=1)
+    calls = []
+
+    async def run() -> None:
+        release = asyncio.Event()
+
+        async def slow() -> str:
+            calls.append("slow")
+            await release.wait()
+            return "slow"
+
+        async def fast() -> str:
+            calls.append("fast")
+            return "fast"
+
+        first = asyncio.create_task(store.run("a", "x", slow))
+        await asyncio.sleep(0)
+        # Over maxsize while "a" is still running
+        assert await store.run("b", "x", fast) == ("fast", False)
+        retry = asyncio.create_task(store.run("a", "x", slow))
+        await asyncio.sleep(0)
+        release.set()
+        assert await first == ("slow", False)
+        assert await retry == ("slow", True)
+        # Completed keys are evicted oldest first
+        await store.run("c", "x", fast)
+        assert len(store) == 1
+
+    asyncio.run(run())
+    assert calls == ["slow", "fast", "fast"]
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import os
+from typing import Any
+
+import pytest
+
+from app.core.config import settings
+from app.services.images import ImageNormalizer, _normalize
+from app.services.media import DecodedImage
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def encode(image: Any, fmt: str, **params: Any) -> bytes:
+    out = io.BytesIO()
+    image.save(out, fmt, **params)
+    return out.getvalue()
+
+
+def noise(size: tuple, mode: str = "RGB") -> Any:
+    # Random pixels don't compress, so the encoded file is large
+    return Image.frombytes(mode, size, os.urandom(size[0] * size[1] * len(mode)))
+
+
+def test_small_images_are_left_alone() -> None:
+    assert _normalize(encode(Image.new("RGB", (64, 64), "red"), "PNG"), 2560, 512 * 1024, 87) is None
+
+
+def test_large_images_are_downscaled_to_jpeg() -> None:
+    encoded, mime = _normalize(encode(Image.new("RGB", (4000, 1000), "red"), "PNG"), 2000, 512 * 1024, 87)
+    assert mime == "image/jpeg"
+    with Image.open(io.BytesIO(encoded)) as im:
+        assert im.format == "JPEG"
+        assert im.size == (2000, 500)
+
+
+def test_heavy_transparent_png_becomes_jpeg_on_white() -> None:
+    image = noise((400, 400), "RGBA")
+    image.putalpha(0)
+    data = encode(image, "PNG")
+    encoded, _ = _normalize(data, 2560, 64 * 1024, 87)
+    assert len(encoded) < len(data)
+    with Image.open(io.BytesIO(encoded)) as im:
+        assert im.mode == "RGB"
+        assert im.getpixel((0, 0)) == pytest.approx((255, 255, 255), abs=2)
+
+
+def test_animations_are_left_alone() -> None:
+    frames = [Image.new("P", (3000, 3000), i) for i in range(2)]
+    data = encode(frames[0], "GIF", save_all=True, append_images=frames[1:])
+    assert _normalize(data, 2560, 0, 87) is None
+
+
+def test_results_are_memoized_by_content(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "image_normalize", True)
+    monkeypatch.setattr(settings, "image_max_side", 100)
+    normalizer = ImageNormalizer()
+    data = encode(Image.new("RGB", (400, 200), "blue"), "PNG")
+
+    async def normalize() -> tuple:
+        with DecodedImage("image/png") as source:
+            source.write(data)
+            with await normalizer.normalize(source) as normalized:
+                return normalized.mime, normalized.read()
+
+    try:
+        first = asyncio.run(normalize())
+        # Answered from the cache: the process pool is not used again
+        monkeypatch.setattr(normalizer, "_pool", None)
+        assert asyncio.run(normalize()) == first
+        assert first[0] == "image/jpeg"
+    finally:
+        normalizer.shutdown()
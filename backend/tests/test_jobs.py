@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Any
+
+from app.services.jobs import DONE, RUNNING, JobStore, PublishJobQueue
+from app.services.state import MemoryState
+from app.services.telegram import deliver_post, prepare_post
+
+TOKEN = "123:test"
+CHAT = "-1001"
+
+
+def three_part_note() -> str:
+    # Three paragraphs of ~3000 visible characters: one message each
+    return "".join(f"<p>{'part%d ' % i * 500}</p>" for i in range(3))
+
+
+def test_deliver_skips_parts_already_sent(fake_telegram: Any) -> None:
+    async def run() -> dict:
+        post = await prepare_post(three_part_note(), "")
+        try:
+            assert post.part_count == 3
+            return await deliver_post(post, TOKEN, CHAT, skip=frozenset({0, 2}))
+        finally:
+            post.close()
+
+    result = asyncio.run(run())
+    assert len(result["results"]) == 1
+    assert fake_telegram.methods() == ["sendMessage"]
+    assert fake_telegram.texts()[0].startswith("part1")
+
+
+def test_resumed_job_sends_only_unsent_parts(fake_telegram: Any, tmp_path: Any) -> None:
+    async def run() -> dict:
+        # A job interrupted after its first and last parts went out
+        store = JobStore(tmp_path / "jobs.sqlite3")
+        await store.create("job-1", CHAT, {"token": TOKEN, "chat_id": CHAT, "html_content": three_part_note(),
+                                           "title": "", "verify_channel": True, "note_id": None, "edit": True})
+        await store.update("job-1", status=RUNNING, parts=[
+            {"index": 0, "kind": "text", "items": 1, "status": "sent"},
+            {"index": 1, "kind": "text", "items": 1, "status": "failed"},
+            {"index": 2, "kind": "text", "items": 1, "status": "sent"},
+        ])
+        store.close()
+
+        jobs = PublishJobQueue(MemoryState())
+        await jobs.start(tmp_path / "jobs.sqlite3", workers=1)
+        try:
+            for _ in range(200):
+                job = await jobs.get("job-1")
+                if job["status"] == DONE:
+                    return job
+                await asyncio.sleep(0.01)
+            raise AssertionError(f"job did not finish: {job}")
+        finally:
+            await jobs.stop()
+
+    job = asyncio.run(run())
+    assert job["parts_sent"] == 3
+    # Resuming does not re-verify the channel or resend parts 0 and 2
+    assert fake_telegram.methods() == ["sendMessage"]
+    assert fake_telegram.texts()[0].startswith("part1")
+
+
+def test_job_store_waits_for_locks_off_the_loop(tmp_path: Any) -> None:
+    store = JobStore(tmp_path / "jobs.sqlite3")
+    other = sqlite3.connect(str(tmp_path / "jobs.sqlite3"), isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    release = threading.Timer(0.3, other.execute, ("COMMIT",))
+
+    async def run() -> int:
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        release.start()
+        await store.create("job-1", CHAT, {})
+        ticker.cancel()
+        assert (await store.get("job-1"))["status"] == "queued"
+        return ticks
+
+    try:
+        # The insert waited for the other connection while the loop kept running
+        started = time.monotonic()
+        assert asyncio.run(run()) >= 10
+        assert time.monotonic() - started >= 0.25
+    finally:
+        release.cancel()
+        other.close()
+        store.close()
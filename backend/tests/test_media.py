@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.routers import media
+from app.services.blobs import BlobStore, blob_store
+
+from .conftest import png_data_url
+
+
+def png(color: str = "red") -> bytes:
+    return base64.b64decode(png_data_url(color).split(",", 1)[1])
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> TestClient:
+    monkeypatch.setattr(settings, "media_dir", tmp_path / "media")
+    monkeypatch.setattr(settings, "media_max_total_bytes", 0)
+    # Usage is scanned again for the new directory
+    monkeypatch.setattr(blob_store, "_usage", None)
+    app = FastAPI()
+    app.include_router(media.router)
+    return TestClient(app)
+
+
+def age(digest: str, seconds: float) -> None:
+    then = time.time() - seconds
+    os.utime(blob_store.path(digest), (then, then))
+
+
+def test_upload_is_stored_once_under_its_hash(client: TestClient) -> None:
+    body = png()
+    digest = hashlib.sha256(body).hexdigest()
+    first = client.post("/api/media", content=body, headers={"Content-Type": "image/png"})
+    assert first.status_code == 201
+    assert first.json()["url"] == f"/media/{digest}"
+    assert first.json()["mime"] == "image/png"
+
+    again = client.post("/api/media", files={"file": ("a.png", body, "image/png")})
+    assert again.status_code == 200
+    assert not again.json()["created"]
+
+    served = client.get(f"/media/{digest}")
+    assert served.content == body
+    assert served.headers["content-type"] == "image/png"
+    assert client.get(f"/media/{digest}", headers={"If-None-Match": served.headers["etag"]}).status_code == 304
+
+
+def test_upload_limits(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    assert client.post("/api/media", content=b"not an image at all").status_code == 415
+    monkeypatch.setattr(settings, "media_max_bytes", 10)
+    assert client.post("/api/media", content=png()).status_code == 413
+    # Rejected uploads leave no temp files behind
+    assert not any(blob_store.tmp_dir.iterdir())
+
+
+def test_full_store_makes_room_from_unused_images(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    first = client.post("/api/media", content=png("red")).json()
+    monkeypatch.setattr(settings, "media_max_total_bytes", first["size"] + 10)
+
+    # Recent uploads may still be unsaved drafts, so they are not deleted to make room
+    assert client.post("/api/media", content=png("blue")).status_code == 507
+
+    age(first["sha256"], 2 * 3600)
+    response = client.post("/api/media", content=png("blue"))
+    assert response.status_code == 201
+    assert not blob_store.exists(first["sha256"])
+
+
+def test_sweep_keeps_referenced_and_recent_blobs(tmp_path: Path) -> None:
+    store = BlobStore(tmp_path)
+
+    def put(body: bytes) -> str:
+        digest = hashlib.sha256(body).hexdigest()
+        store.path(digest).parent.mkdir(parents=True, exist_ok=True)
+        store.path(digest).write_bytes(body)
+        return digest
+
+    old, kept, recent = put(b"old"), put(b"kept"), put(b"recent")
+    for digest in (old, kept):
+        then = time.time() - 3 * 86400
+        os.utime(store.path(digest), (then, then))
+    assert store.sweep({kept}, retention=86400) == (1, 3)
+    assert not store.exists(old)
+    assert store.exists(kept) and store.exists(recent)
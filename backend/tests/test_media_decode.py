@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import os
+
+import pytest
+
+from app.services.media import decode_data_url, memory_stats, parse_data_url_header
+
+PAYLOAD = os.urandom(300_000)
+ENCODED = base64.b64encode(PAYLOAD).decode()
+
+
+def test_header_is_parsed_without_scanning_the_payload() -> None:
+    mime, offset = parse_data_url_header("data:image/png;base64," + ENCODED)
+    assert (mime, offset) == ("image/png", len("data:image/png;base64,"))
+    for bad in ("data:image/png," + ENCODED, "http://x/y.png", "data:image/png;base64" + "A" * 1000):
+        with pytest.raises(ValueError):
+            parse_data_url_header(bad)
+
+
+def test_decodes_in_chunks_and_hashes_on_the_way() -> None:
+    with decode_data_url("data:image/png;base64," + ENCODED) as image:
+        assert image.mime == "image/png"
+        assert image.size == len(PAYLOAD)
+        assert image.sha256 == hashlib.sha256(PAYLOAD).hexdigest()
+        assert image.read() == PAYLOAD
+
+
+def test_whitespace_and_missing_padding_are_tolerated() -> None:
+    data = b"hello world!?"
+    encoded = base64.b64encode(data).decode().rstrip("=")
+    wrapped = "\n".join(encoded[i:i + 4] for i in range(0, len(encoded), 4))
+    with decode_data_url("data:image/gif;base64," + wrapped) as image:
+        assert image.read() == data
+
+
+def test_invalid_base64_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        decode_data_url("data:image/png;base64,abc*def=")
+
+
+def test_large_images_spill_to_disk() -> None:
+    before = memory_stats()["current"]
+    with decode_data_url("data:image/png;base64," + ENCODED, max_memory=64 * 1024) as image:
+        assert not image.in_memory
+        assert memory_stats()["current"] == before
+        assert image.read() == PAYLOAD
+    with decode_data_url("data:image/png;base64," + ENCODED) as image:
+        assert image.in_memory
+        assert memory_stats()["current"] == before + len(PAYLOAD)
+    assert memory_stats()["current"] == before
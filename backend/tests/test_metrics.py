@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.core.config import settings
+from app.services import metrics
+from app.services.profiling import ProfilingMiddleware
+from app.services.telegram import send_message
+
+TOKEN = "123:test"
+
+
+def sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/items/{item_id}")
+    def item(item_id: str) -> dict:
+        return {"id": item_id}
+
+    @app.get("/metrics")
+    def get_metrics() -> Response:
+        body, content_type = metrics.render()
+        return Response(body, media_type=content_type)
+
+    return app
+
+
+def test_requests_are_labelled_by_route_template(app: FastAPI) -> None:
+    app.add_middleware(metrics.MetricsMiddleware)
+    labels = {"method": "GET", "route": "/api/items/{item_id}", "status": "200"}
+    before = sample("http_request_duration_seconds_count", **labels)
+    client = TestClient(app)
+    client.get("/api/items/1")
+    client.get("/api/items/2")
+    client.get("/nowhere")
+    assert sample("http_request_duration_seconds_count", **labels) == before + 2
+    assert sample("http_request_duration_seconds_count", method="GET", route="other", status="404") >= 1
+
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/items/{item_id}",status="200"}' in body
+
+
+def test_telegram_calls_and_429s_are_counted(fake_telegram: Any) -> None:
+    before = sample("telegram_request_duration_seconds_count", method="sendMessage", status="200")
+    limited = sample("telegram_rate_limited_total", method="sendMessage")
+    fake_telegram.fail("sendMessage", 429, "Too Many Requests: retry after 0", retry_after=0)
+    asyncio.run(send_message(TOKEN, "-1001", "hi"))
+    assert sample("telegram_request_duration_seconds_count", method="sendMessage", status="200") == before + 1
+    assert sample("telegram_rate_limited_total", method="sendMessage") == limited + 1
+
+
+def test_profile_is_kept_on_request(app: FastAPI, monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    pytest.importorskip("pyinstrument")
+    monkeypatch.setattr(settings, "data_dir", tmp_path)
+    monkeypatch.setattr(settings, "profiling_header", True)
+    app.add_middleware(ProfilingMiddleware)
+    client = TestClient(app)
+
+    assert "x-profile" not in client.get("/api/items/1").headers
+    name = client.get("/api/items/1", headers={"X-Profile": "1"}).headers["x-profile"]
+    assert (tmp_path / "profiles" / name).is_file()
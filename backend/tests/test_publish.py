@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import publish
+
+TOKEN = "123:test"
+CHAT = "-1001"
+
+
+@pytest.fixture
+def client() -> TestClient:
+    app = FastAPI()
+    app.include_router(publish.router, prefix="/api")
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("channel", ["no-separator", "Name=", "Name=not a chat"])
+def test_publish_rejects_malformed_channel(fake_telegram: Any, client: TestClient, channel: str) -> None:
+    response = client.post("/api/publish", json={
+        "telegram_channel": channel, "telegram_bot_token": TOKEN, "channel_id": CHAT,
+        "content_html": "<p>Hello</p>", "verify_channel": False,
+    })
+    assert response.status_code == 400
+    assert fake_telegram.calls == []
+
+
+def test_publish_accepts_names_containing_equals(fake_telegram: Any, client: TestClient) -> None:
+    response = client.post("/api/publish", json={
+        "telegram_channel": f"a=b={CHAT}", "telegram_bot_token": TOKEN, "channel_id": CHAT,
+        "content_html": "<p>Hello</p>", "verify_channel": False,
+    })
+    assert response.status_code == 200
+    assert fake_telegram.calls[0][1]["chat_id"] == CHAT
+
+
+def test_fanout_delivers_to_every_channel_once(fake_telegram: Any, client: TestClient) -> None:
+    response = client.post("/api/publish/fanout", json={
+        "telegram_bot_token": TOKEN,
+        "channel_ids": ["-1001", "-1002", "-1001", " "],
+        "content_html": "<p>Hello</p>",
+        "verify_channel": False,
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["success"]
+    assert body["message"] == "Published to 2 of 2 channels"
+    # Duplicates and blanks are dropped; results keep the input order
+    assert [(r["channel_id"], r["ok"]) for r in body["results"]] == [("-1001", True), ("-1002", True)]
+    assert sorted(params["chat_id"] for _, params in fake_telegram.calls) == ["-1001", "-1002"]
+
+
+def test_fanout_reports_channels_it_cannot_access(fake_telegram: Any, client: TestClient) -> None:
+    fake_telegram.fail("getChat", 400, "Bad Request: chat not found", chat_id="-1002")
+    response = client.post("/api/publish/fanout", json={
+        "telegram_bot_token": TOKEN, "channel_ids": ["-1001", "-1002"], "content_html": "<p>Hello</p>",
+    })
+    body = response.json()
+    assert not body["success"]
+    assert body["message"] == "Published to 1 of 2 channels"
+    assert [r["ok"] for r in body["results"]] == [True, False]
+    assert body["results"][1]["error"].startswith("Cannot access channel")
+    assert [params["chat_id"] for method, params in fake_telegram.calls if method == "sendMessage"] == ["-1001"]
+
+
+def test_fanout_requires_a_channel(fake_telegram: Any, client: TestClient) -> None:
+    response = client.post("/api/publish/fanout", json={
+        "telegram_bot_token": TOKEN, "channel_ids": [" "], "content_html": "<p>Hello</p>",
+    })
+    assert response.status_code == 400
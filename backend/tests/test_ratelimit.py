@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.services.ratelimit import TelegramRateLimiter, is_private_chat
+from app.services.state import MemoryState
+from app.services.telegram import send_message
+
+TOKEN = "123:test"
+
+
+@pytest.fixture
+def limits(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "telegram_rate_limit", True)
+    monkeypatch.setattr(settings, "telegram_global_rate", 2.0)
+    # One message per second per channel, no burst
+    monkeypatch.setattr(settings, "telegram_group_chat_rate_per_minute", 60.0)
+    monkeypatch.setattr(settings, "telegram_group_chat_burst", 1)
+
+
+def test_private_chats_are_told_apart() -> None:
+    assert is_private_chat("12345")
+    assert not is_private_chat("-1001")
+    assert not is_private_chat("@channel")
+
+
+def test_chat_limit_spaces_sends_to_one_chat(limits: None) -> None:
+    limiter = TelegramRateLimiter(MemoryState())
+
+    async def run() -> float:
+        started = time.monotonic()
+        await limiter.acquire(TOKEN, "-1001")
+        await limiter.acquire(TOKEN, "-1001")
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) == pytest.approx(1.0, abs=0.1)
+
+
+def test_send_waiting_on_its_chat_holds_no_global_budget(limits: None) -> None:
+    limiter = TelegramRateLimiter(MemoryState())
+
+    async def run() -> float:
+        await limiter.acquire(TOKEN, "-1001")
+        # Waits about a second for its chat
+        blocked = asyncio.create_task(limiter.acquire(TOKEN, "-1001"))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        # The global bucket (2/s, burst 2) still has a token for another chat right away
+        await limiter.acquire(TOKEN, "-1002")
+        elapsed = time.monotonic() - started
+        await blocked
+        return elapsed
+
+    assert asyncio.run(run()) < 0.1
+
+
+def test_429_is_retried_after_retry_after(fake_telegram: Any) -> None:
+    fake_telegram.fail("sendMessage", 429, "Too Many Requests: retry after 0.2", retry_after=0.2)
+    started = time.monotonic()
+    result = asyncio.run(send_message(TOKEN, "-1001", "hi"))
+    assert result["ok"]
+    assert fake_telegram.methods() == ["sendMessage", "sendMessage"]
+    assert time.monotonic() - started >= 0.2
+
+
+def test_429_beyond_the_longest_wait_is_raised(fake_telegram: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "telegram_max_retry_after", 1.0)
+    fake_telegram.fail("sendMessage", 429, "Too Many Requests: retry after 30", retry_after=30)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(send_message(TOKEN, "-1001", "hi"))
+    assert fake_telegram.methods() == ["sendMessage"]
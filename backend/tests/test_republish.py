@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+from app.services.telegram import publish_content
+
+from .conftest import png_data_url
+
+TOKEN = "123:test"
+CHAT = "-1001"
+
+
+def three_part_note() -> str:
+    # Three paragraphs of ~3000 visible characters: one message each
+    return "".join(f"<p>{'part%d ' % i * 500}</p>" for i in range(3))
+
+
+def test_republish_edits_only_changed_parts(fake_telegram: Any, published_store: Any) -> None:
+    note = three_part_note()
+    changed = note.replace("part2 ", "PART2 ", 1)
+
+    async def publish(html_content: str) -> dict:
+        return await publish_content(html_content, "", chat_id=CHAT, token=TOKEN, note_id="note-1")
+
+    asyncio.run(publish(note))
+    assert fake_telegram.methods() == ["sendMessage"] * 3
+    sent_ids = [p["message_ids"] for p in asyncio.run(published_store.get("note-1", TOKEN, CHAT))]
+
+    fake_telegram.calls.clear()
+    result = asyncio.run(publish(changed))
+    assert fake_telegram.methods() == ["editMessageText"]
+    assert fake_telegram.calls[0][1]["message_id"] == str(sent_ids[2][0])
+    assert (result["edited"], result["unchanged"], result["sent"]) == (1, 2, 0)
+
+    # Nothing changed: no API calls at all
+    fake_telegram.calls.clear()
+    result = asyncio.run(publish(changed))
+    assert fake_telegram.calls == []
+    assert result["unchanged"] == 3
+
+    # A shorter note edits what remains and deletes the surplus message
+    fake_telegram.calls.clear()
+    result = asyncio.run(publish("<p>Short now</p>"))
+    assert fake_telegram.methods() == ["editMessageText", "deleteMessage", "deleteMessage"]
+    assert result["deleted"] == 2
+
+
+def test_new_album_layout_replaces_the_post(fake_telegram: Any, published_store: Any) -> None:
+    one, two = png_data_url("red"), png_data_url("blue")
+
+    async def publish(html_content: str) -> dict:
+        return await publish_content(html_content, "", chat_id=CHAT, token=TOKEN, note_id="note-1")
+
+    asyncio.run(publish(f'<p><img src="{one}"></p><p>Text</p>'))
+    old_ids = [i for p in asyncio.run(published_store.get("note-1", TOKEN, CHAT)) for i in p["message_ids"]]
+    # The text fits in the photo's caption
+    assert fake_telegram.methods() == ["sendPhoto"]
+
+    # A second photo can't be added to a sent album: send anew, then delete the old messages
+    fake_telegram.calls.clear()
+    result = asyncio.run(publish(f'<p><img src="{one}"><img src="{two}"></p><p>Text</p>'))
+    assert result["mode"] == "replaced"
+    assert fake_telegram.methods() == ["sendMediaGroup", "deleteMessage"]
+    assert [int(params["message_id"]) for method, params in fake_telegram.calls if method == "deleteMessage"] == old_ids
+    records = asyncio.run(published_store.get("note-1", TOKEN, CHAT))
+    assert [len(p["message_ids"]) for p in records] == [2]
+    assert not set(old_ids) & {i for p in records for i in p["message_ids"]}
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+import pytest
+
+from app.core.config import settings
+from app.services.jobs import DONE, PublishJobQueue
+from app.services.scheduler import CANCELLED, SCHEDULED, PostScheduler, ScheduleConflict
+from app.services.state import MemoryState
+
+TOKEN = "123:test"
+
+
+async def wait_for(check: Callable[[], bool], timeout: float = 3.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+def run_scheduler(tmp_path: Any, body: Callable[[PostScheduler], Awaitable[None]], *, listen: bool = True) -> None:
+    async def run() -> None:
+        jobs = PublishJobQueue(MemoryState())
+        scheduler = PostScheduler(jobs, MemoryState())
+        if not listen:
+            # As if every job ran in another worker: no in-process completion callback
+            jobs._listeners.clear()
+        await jobs.start(tmp_path / "jobs.sqlite3", workers=2)
+        await scheduler.start(tmp_path / "schedule.sqlite3")
+        try:
+            await body(scheduler)
+        finally:
+            await scheduler.stop()
+            await jobs.stop()
+
+    asyncio.run(run())
+
+
+def schedule(scheduler: PostScheduler, text: str, at: float, chat_id: str = "-1001") -> dict:
+    return scheduler.schedule(token=TOKEN, chat_id=chat_id, html_content=f"<p>{text}</p>", title="",
+                              publish_at=at, verify_channel=False)
+
+
+def test_posts_go_out_in_due_order(fake_telegram: Any, tmp_path: Any) -> None:
+    async def body(scheduler: PostScheduler) -> None:
+        now = time.time()
+        later = schedule(scheduler, "later", now + 0.3)
+        due = schedule(scheduler, "due", now - 1)
+        await wait_for(lambda: scheduler.get(due["id"])["status"] == DONE)
+        assert scheduler.get(later["id"])["status"] == SCHEDULED
+        await wait_for(lambda: scheduler.get(later["id"])["status"] == DONE)
+
+    run_scheduler(tmp_path, body)
+    assert fake_telegram.texts() == ["due", "later"]
+
+
+def test_cancelled_and_rescheduled_posts(fake_telegram: Any, tmp_path: Any) -> None:
+    async def body(scheduler: PostScheduler) -> None:
+        now = time.time()
+        cancelled = schedule(scheduler, "cancelled", now + 0.1)
+        moved = schedule(scheduler, "moved", now + 60)
+        assert scheduler.cancel(cancelled["id"])["status"] == CANCELLED
+        scheduler.reschedule(moved["id"], now + 0.2)
+        await wait_for(lambda: scheduler.get(moved["id"])["status"] == DONE)
+        with pytest.raises(ScheduleConflict):
+            scheduler.cancel(moved["id"])
+
+    run_scheduler(tmp_path, body)
+    assert fake_telegram.texts() == ["moved"]
+
+
+def test_channel_concurrency_keeps_a_channels_posts_in_order(fake_telegram: Any, tmp_path: Any,
+                                                             monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "scheduler_channel_concurrency", 1)
+
+    async def body(scheduler: PostScheduler) -> None:
+        now = time.time()
+        posts = [schedule(scheduler, f"post{i}", now - 1 + i * 0.001) for i in range(5)]
+        await wait_for(lambda: all(scheduler.get(p["id"])["status"] == DONE for p in posts))
+
+    run_scheduler(tmp_path, body)
+    assert fake_telegram.texts() == [f"post{i}" for i in range(5)]
+
+
+def test_jobs_finishing_in_another_worker_free_their_channel_slot(fake_telegram: Any, tmp_path: Any,
+                                                                  monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "scheduler_channel_concurrency", 1)
+    monkeypatch.setattr(settings, "shared_state_poll", 0.02)
+
+    async def body(scheduler: PostScheduler) -> None:
+        now = time.time()
+        posts = [schedule(scheduler, f"post{i}", now - 1 + i * 0.001) for i in range(3)]
+        await wait_for(lambda: all(scheduler.get(p["id"])["status"] == DONE for p in posts))
+
+    run_scheduler(tmp_path, body, listen=False)
+    assert fake_telegram.texts() == ["post0", "post1", "post2"]
+
+
+def test_pending_posts_survive_a_restart(fake_telegram: Any, tmp_path: Any) -> None:
+    post_ids = []
+
+    async def schedule_and_stop(scheduler: PostScheduler) -> None:
+        post_ids.append(schedule(scheduler, "after restart", time.time() + 0.2)["id"])
+
+    async def wait_for_publish(scheduler: PostScheduler) -> None:
+        await wait_for(lambda: scheduler.get(post_ids[0])["status"] == DONE)
+
+    run_scheduler(tmp_path, schedule_and_stop)
+    assert fake_telegram.calls == []
+    run_scheduler(tmp_path, wait_for_publish)
+    assert fake_telegram.texts() == ["after restart"]
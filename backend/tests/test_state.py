@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Any
+
+import pytest
+
+from app.services.state import Lease, MemoryState, SharedState, SQLiteState, create_state
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request: pytest.FixtureRequest, tmp_path: Any) -> SharedState:
+    state = create_state(request.param, tmp_path / "state.sqlite3")
+    yield state
+    state.close()
+
+
+def test_shared_state_is_abstract() -> None:
+    with pytest.raises(TypeError):
+        SharedState()
+
+
+def test_keys(state: SharedState) -> None:
+    async def run() -> None:
+        assert await state.get("k") is None
+        assert await state.add("k", "a", 10)
+        assert not await state.add("k", "b", 10)
+        assert await state.get("k") == "a"
+        # Compare-and-delete only removes the value it was given
+        assert not await state.delete("k", "b")
+        assert await state.extend("k", "a", 10)
+        assert not await state.extend("k", "b", 10)
+        assert await state.delete("k", "a")
+        assert await state.get("k") is None
+
+        await state.set("short", "v", 0.05)
+        await asyncio.sleep(0.1)
+        assert await state.get("short") is None
+        assert await state.add("short", "w")
+
+    asyncio.run(run())
+
+
+def test_token_bucket(state: SharedState) -> None:
+    async def run() -> None:
+        # 10 tokens/s, burst of 2
+        assert await state.reserve("bucket", 10, 2) == 0
+        assert await state.reserve("bucket", 10, 2) == 0
+        assert await state.reserve("bucket", 10, 2) == pytest.approx(0.1, abs=0.02)
+        # After a pause the bucket refills from empty
+        await state.pause("paused", 10, 2, 1.0)
+        assert await state.reserve("paused", 10, 2) == pytest.approx(1.1, abs=0.05)
+
+    asyncio.run(run())
+
+
+def test_sqlite_state_is_shared_between_workers(tmp_path: Any) -> None:
+    first = SQLiteState(tmp_path / "state.sqlite3")
+    second = SQLiteState(tmp_path / "state.sqlite3")
+
+    async def run() -> None:
+        lease = Lease(first, "job:1", 5.0)
+        assert await lease.try_acquire()
+        assert not await Lease(second, "job:1", 5.0).try_acquire()
+        await lease.release()
+        assert await Lease(second, "job:1", 5.0).try_acquire()
+        # Both workers draw from one bucket
+        assert await first.reserve("rate", 1, 1) == 0
+        assert await second.reserve("rate", 1, 1) > 0
+
+    try:
+        asyncio.run(run())
+    finally:
+        first.close()
+        second.close()
+
+
+def test_memory_state_is_not_shared() -> None:
+    assert not MemoryState().shared
+
+
+def test_sqlite_lock_held_elsewhere_does_not_block_the_loop(tmp_path: Any) -> None:
+    state = SQLiteState(tmp_path / "state.sqlite3")
+    other = sqlite3.connect(str(tmp_path / "state.sqlite3"), isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    release = threading.Timer(0.3, other.execute, ("COMMIT",))
+
+    async def run() -> int:
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        started = time.monotonic()
+        release.start()
+        await state.set("k", "v")
+        assert time.monotonic() - started >= 0.25
+        ticker.cancel()
+        return ticks
+
+    try:
+        # The write waited for the other connection while the loop kept running
+        assert asyncio.run(run()) >= 10
+    finally:
+        release.cancel()
+        other.close()
+        state.close()
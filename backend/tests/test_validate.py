@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from unittest import mock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import publish
+
+
+@pytest.fixture
+def client() -> TestClient:
+    app = FastAPI()
+    app.include_router(publish.router, prefix="/api")
+    return TestClient(app)
+
+
+def test_validation_is_memoized_by_content_hash(client: TestClient) -> None:
+    body = {"title": "T", "content_html": f"<p>{'memo ' * 30}</p>"}
+    with mock.patch.object(publish, "convert_html", wraps=publish.convert_html) as convert:
+        first = client.post("/api/publish/validate", json=body).json()
+        again = client.post("/api/publish/validate", json=body).json()
+        by_hash = client.post("/api/publish/validate", json={"content_hash": first["content_hash"]}).json()
+    assert first["validation"]["is_valid"]
+    assert again == first and by_hash == first
+    assert convert.call_count == 1
+
+
+def test_unknown_hash_asks_for_the_content(client: TestClient) -> None:
+    response = client.post("/api/publish/validate", json={"content_hash": "0" * 64})
+    assert response.status_code == 409
+
+
+def test_stripped_images_count_toward_the_caption_limit(client: TestClient) -> None:
+    html = f"<p>{'x' * 1500}</p>"
+    text_only = client.post("/api/publish/validate", json={"content_html": html}).json()
+    with_images = client.post("/api/publish/validate", json={"content_html": html, "image_count": 2}).json()
+    assert text_only["content_hash"] != with_images["content_hash"]
+    # 1500 characters fit one message, but not one caption
+    assert text_only["validation"]["parts"] == 1
+    assert with_images["validation"]["parts"] == 2
+
+
+def test_too_long_content_is_reported(client: TestClient) -> None:
+    response = client.post("/api/publish/validate", json={"content_html": f"<p>{'y' * 200_000}</p>"}).json()
+    assert not response["validation"]["is_valid"]
+    assert response["validation"]["exceeded_by"] > 0
@@ -4,6 +4,8 @@ const API = {
   publish: '/api/publish',
   testPublish: '/api/publish/test',
   validate: '/api/publish/validate',
+  drafts: '/api/drafts',
+  media: '/api/media',
 };
 
 const state = {
@@ -20,6 +22,18 @@ const context = {
   target: null
 }
 
+// Server-side drafts (DRAFTS_ENABLED on the backend). `enabled` is null until
+// the first sync tells us; when false, drafts stay in localStorage.
+const drafts = {
+  enabled: null,
+  channel: null,
+  cursor: 0,       // latest change of `channel` we have seen
+  items: [],       // every draft of `channel`; state.notes is the filtered view
+  dirty: new Set(),
+  deleted: new Set(),
+  pushTimer: null,
+};
+
 async function http(method, url, body){
   const opts = { method, headers: { 'Content-Type': 'application/json' } };
   if(body !== undefined) opts.body = JSON.stringify(body);
@@ -183,24 +197,123 @@ function updateCharCounter(){
   }
 }
 
-function persistNotes(){
+function persistNotes(changedIds = [], deletedIds = []){
   if(!state.currentChannelId) return;
+
+  if (drafts.enabled) {
+    // Only the notes that changed are sent, shortly after the last edit
+    state.notes.forEach(n => { if (!drafts.items.includes(n)) drafts.items.unshift(n); });
+    drafts.items = drafts.items.filter(n => !deletedIds.includes(n.id));
+    changedIds.forEach(id => drafts.dirty.add(id));
+    deletedIds.forEach(id => { drafts.dirty.delete(id); drafts.deleted.add(id); });
+    if (drafts.pushTimer) clearTimeout(drafts.pushTimer);
+    drafts.pushTimer = setTimeout(() => pushDrafts().catch(e => console.error('Draft sync failed:', e)), 1000);
+    return;
+  }
   
   const key = `drafts:${state.currentChannelId}`;
   localStorage.setItem(key, JSON.stringify(state.notes));
 }
 
+function draftUrl(id){
+  return `${API.drafts}/${encodeURIComponent(id)}`;
+}
+
+async function syncDrafts(){
+  // Pull the drafts changed since our cursor; 304 when nothing changed
+  const channel = state.currentChannelId;
+  if (drafts.channel !== channel) {
+    if (drafts.dirty.size || drafts.deleted.size) await pushDrafts();
+    Object.assign(drafts, { channel, cursor: 0, items: [] });
+  }
+  const headers = drafts.cursor ? { 'If-None-Match': `"${drafts.cursor}"` } : {};
+  const res = await fetch(`${API.drafts}?channel_id=${encodeURIComponent(channel)}&since=${drafts.cursor}`, { headers });
+  if (res.status === 404) { drafts.enabled = false; return; }
+  if (res.status === 304) { drafts.enabled = true; return; }
+  if (!res.ok) throw new Error(await res.text());
+  const firstSync = drafts.enabled === null;
+  drafts.enabled = true;
+
+  const delta = await res.json();
+  const byId = new Map(drafts.items.map(n => [n.id, n]));
+  delta.deleted.forEach(id => { if (!drafts.dirty.has(id)) byId.delete(id); });
+  // Local edits not yet pushed win until the push resolves them with If-Match
+  delta.drafts.forEach(d => { if (!drafts.dirty.has(d.id)) byId.set(d.id, d); });
+  drafts.items = [...byId.values()];
+  drafts.cursor = delta.cursor;
+  if (firstSync) await migrateLocalDrafts();
+}
+
+async function migrateLocalDrafts(){
+  // Move drafts kept by the localStorage-only version to the server once
+  const keys = Object.keys(localStorage).filter(k => k.startsWith('drafts:'));
+  for (const key of keys) {
+    const channel = key === 'drafts:only-notes' ? state.currentChannelId : key.slice('drafts:'.length);
+    const notes = JSON.parse(localStorage.getItem(key) || '[]');
+    for (const n of notes) {
+      const id = String(n.id);
+      const saved = await http('PUT', draftUrl(id), {
+        channel_id: channel,
+        title: n.title || '',
+        content_html: n.content_html || '',
+        is_pinned: !!n.is_pinned,
+        created_at: typeof n.id === 'number' ? n.id / 1000 : null,
+      });
+      if (channel === drafts.channel && !drafts.items.some(d => d.id === id)) drafts.items.push(saved);
+    }
+    localStorage.removeItem(key);
+  }
+}
+
+async function pushDrafts(){
+  if (drafts.pushTimer) { clearTimeout(drafts.pushTimer); drafts.pushTimer = null; }
+  for (const id of [...drafts.deleted]) {
+    drafts.deleted.delete(id);
+    const res = await fetch(draftUrl(id), { method: 'DELETE' });
+    if (!res.ok && res.status !== 404) { drafts.deleted.add(id); throw new Error(await res.text()); }
+  }
+  for (const id of [...drafts.dirty]) {
+    drafts.dirty.delete(id);
+    const note = drafts.items.find(n => n.id === id);
+    if (!note) continue;
+    const headers = { 'Content-Type': 'application/json' };
+    if (note.version) headers['If-Match'] = `"${note.version}"`;
+    const res = await fetch(draftUrl(id), {
+      method: 'PUT',
+      headers,
+      body: JSON.stringify({
+        channel_id: drafts.channel,
+        title: note.title || '',
+        content_html: note.content_html || '',
+        is_pinned: !!note.is_pinned,
+      }),
+    });
+    if (res.status === 412) {
+      // Edited elsewhere since we loaded it: keep the server's copy
+      const current = (await res.json()).detail?.draft;
+      const idx = drafts.items.indexOf(note);
+      if (current) drafts.items[idx] = current; else drafts.items.splice(idx, 1);
+      showNotification('This note was changed elsewhere; loaded the latest version', 'info');
+      await loadNotes();
+      if (state.currentNoteId === id) selectNote(id);
+      continue;
+    }
+    if (!res.ok) { drafts.dirty.add(id); throw new Error(await res.text()); }
+    note.version = (await res.json()).version;
+  }
+}
+
 async function saveCurrentNote(){
   let id = state.currentNoteId;
   const content = document.getElementById('note-content').innerHTML;
   const title = getTitle(content)
   if(!id) {
     if(!state.currentChannelId){ alert('Select a channel first'); return; }
-    const note = { id: Date.now(), title: 'New Note', content_html: content === "" ? '' : content, is_pinned: false, updated_at: Date.now() };
+    const note = { id: String(Date.now()), title: 'New Note', content_html: content === "" ? '' : content, is_pinned: false, updated_at: Date.now() };
     
     state.notes.unshift(note);
     state.currentNoteId = note.id
-    persistNotes();
+    persistNotes([note.id]);
     renderNotes();
     id = state.currentNoteId
   };
@@ -210,7 +323,7 @@ async function saveCurrentNote(){
     state.notes[idx].title = title;
     state.notes[idx].content_html = content;
     state.notes[idx].updated_at = Date.now();
-    persistNotes();
+    persistNotes([id]);
     renderNotes();
   }
 }
@@ -245,17 +358,22 @@ async function loadChannels(){
     }
 
     state.channels = [{name: channel.split("=")[0], id: channel.split("=")[1]}]
-    state.channelsStatus = await http('POST', API.channelsStatus, {
+    // The server answers { unchanged: true } when the status we kept is still current
+    const kept = JSON.parse(localStorage.getItem('CHANNELS_STATUS') || 'null');
+    const status = await http('POST', API.channelsStatus, {
       channels: state.channels,
-      token: token
+      token: token,
+      version: kept?.version
     });
+    state.channelsStatus = status.unchanged ? kept : status;
+    if (!status.unchanged) localStorage.setItem('CHANNELS_STATUS', JSON.stringify(status));
     
     if(state.channels.length && state.currentChannelId == null){
       state.currentChannelId = state.channels[0].id;
     }
     renderFolders();
 
-    loadNotes()
+    await loadNotes()
 
     persistNotes()
 
@@ -269,6 +387,17 @@ async function loadChannels(){
 
 async function loadNotes(){
   if(!state.currentChannelId){ state.notes = []; renderNotes(); return; }
+  if (drafts.enabled !== false) {
+    try {
+      await syncDrafts();
+    } catch (error) {
+      console.error('Draft sync failed:', error);
+    }
+  }
+  if (drafts.enabled) {
+    showNotes(drafts.items);
+    return;
+  }
   const defaultKey = `drafts:only-notes`;
   const defaultSaved = localStorage.getItem(defaultKey)
   const defaultItems = defaultSaved ? JSON.parse(defaultSaved) : [];
@@ -283,7 +412,10 @@ async function loadNotes(){
   }
 
   items = [...items, ...defaultItems]
+  showNotes(items);
+}
 
+function showNotes(items){
   const q = state.searchQuery?.toLowerCase?.() || '';
   state.notes = q ? items.filter(n => (n.title||'').toLowerCase().includes(q) || snippetFromHtml(n.content_html).toLowerCase().includes(q)) : items;
   // Sort: pinned first then updated_at desc
@@ -317,9 +449,9 @@ async function createFolder(){
 
 async function createNote(){
   if(!state.currentChannelId){ alert('Select a channel first'); return; }
-  const note = { id: Date.now(), title: 'New Note', content_html: '', is_pinned: false, updated_at: Date.now() };
+  const note = { id: String(Date.now()), title: 'New Note', content_html: '', is_pinned: false, updated_at: Date.now() };
   state.notes.unshift(note);
-  persistNotes();
+  persistNotes([note.id]);
   renderNotes();
   selectNote(note.id);
 }
@@ -334,27 +466,70 @@ function setBlock(tag){
   scheduleSave();
 }
 
+async function uploadImage(file){
+  // Stored once by content hash; the note only keeps the short /media/<sha256> URL
+  const form = new FormData();
+  form.append('file', file, file.name || 'image');
+  const res = await fetch(API.media, { method: 'POST', body: form });
+  if (!res.ok) throw new Error(`Upload failed: ${res.status}`);
+  return (await res.json()).url;
+}
+
+function readAsDataURL(file){
+  return new Promise((resolve, reject) => {
+    const reader = new FileReader();
+    reader.onload = () => resolve(reader.result);
+    reader.onerror = () => reject(reader.error);
+    reader.readAsDataURL(file);
+  });
+}
+
 async function handleImageUpload(file){
-  const reader = new FileReader();
-  reader.onload = () => {
-    const editor = document.getElementById('note-content');
-    const img = document.createElement('img');
-    img.src = reader.result;
-    editor.appendChild(img);
-    scheduleSave();
-  };
-  reader.readAsDataURL(file);
+  let src;
+  try {
+    src = await uploadImage(file);
+  } catch (error) {
+    // Older servers or rejected uploads: embed the image in the note as before
+    console.warn(error);
+    src = await readAsDataURL(file);
+  }
+  const editor = document.getElementById('note-content');
+  const img = document.createElement('img');
+  img.src = src;
+  editor.appendChild(img);
+  scheduleSave();
 }
 
-async function validateContent(title, content, telegram_channel, telegram_bot_token) {
+// Last content sent to /validate; unchanged content is revalidated by hash only
+const lastValidation = { title: null, html: null, imageCount: 0, hash: null };
+
+function stripImages(content){
+  // Images only matter to validation as a count; don't upload their data URLs
+  let imageCount = 0;
+  const html = content.replace(/<img\b[^>]*>/gi, () => { imageCount++; return ''; });
+  return { html, imageCount };
+}
+
+async function validateContent(title, content, telegram_channel, telegram_bot_token, draftId = null) {
   try {
+    if (draftId) {
+      // The server already holds the note
+      return await http('POST', API.validate, { title, draft_id: draftId });
+    }
+    const { html, imageCount } = stripImages(content);
+    if (lastValidation.hash && lastValidation.title === title && lastValidation.html === html && lastValidation.imageCount === imageCount) {
+      try {
+        return await http('POST', API.validate, { content_hash: lastValidation.hash });
+      } catch (error) {
+        // Server no longer knows the hash (restart or eviction); fall through and resend
+      }
+    }
     const result = await http('POST', API.validate, {
-      channel_id: state.currentChannelId,
       title,
-      content_html: content,
-      telegram_channel: telegram_channel,
-      telegram_bot_token: telegram_bot_token,
+      content_html: html,
+      image_count: imageCount,
     });
+    Object.assign(lastValidation, { title, html, imageCount, hash: result.content_hash || null });
     return result;
   } catch (error) {
     console.error('Validation error:', error);
@@ -395,9 +570,21 @@ async function publishCurrent(){
     return;
   }
   
+  // With server-side drafts, save pending edits and refer to the note by id
+  let draftId = null;
+  if (drafts.enabled) {
+    if (state.saveTimer) { clearTimeout(state.saveTimer); state.saveTimer = null; await saveCurrentNote(); }
+    try {
+      await pushDrafts();
+      draftId = id;
+    } catch (error) {
+      console.error('Draft sync failed:', error);
+    }
+  }
+
   // Validate content length first
   showNotification('Validating content...', 'info');
-  const validation = await validateContent(title, content, telegramChannel, telegramBotToken);
+  const validation = await validateContent(title, content, telegramChannel, telegramBotToken, draftId);
   
   if (!validation.success) {
     showNotification('Validation failed: ' + validation.error, 'error');
@@ -408,19 +595,27 @@ async function publishCurrent(){
     showNotification(validation.recommendation, 'error');
     return;
   }
+  if (validation.validation.parts > 1) {
+    showNotification(validation.recommendation, 'info');
+  }
   
+  const payload = {
+    telegram_channel: telegramChannel,
+    telegram_bot_token: telegramBotToken,
+    channel_id: state.currentChannelId,
+    title,
+    ...(draftId ? { draft_id: draftId } : { content_html: content }),
+    // Publishing the same note again edits the messages already in the channel
+    note_id: id,
+    verify_channel: true
+  };
+  const buttons = document.querySelectorAll('#publish');
+  buttons.forEach(btn => btn.disabled = true);
   try {
     showNotification('Publishing...', 'info');
 
-    const result = await http('POST', API.publish, { 
-      telegram_channel: telegramChannel,
-      telegram_bot_token: telegramBotToken,
-      channel_id: state.currentChannelId, 
-      title, 
-      content_html: content,
-      verify_channel: true
-    });
-    
+    const result = await publishWithProgress(payload);
+
     if (result.success) {
       showNotification('Published to Telegram successfully!', 'success');
     } else {
@@ -429,9 +624,83 @@ async function publishCurrent(){
   } catch (error) {
     console.error('Publish error:', error);
     showNotification('Publish failed: ' + error.message, 'error');
+  } finally {
+    buttons.forEach(btn => btn.disabled = false);
   }
 }
 
+async function publishWithProgress(payload){
+  // Queue the publish and follow its parts live instead of holding one long request.
+  // The same Idempotency-Key on a retry attaches to the first attempt instead of posting twice.
+  const headers = {
+    'Content-Type': 'application/json',
+    'Idempotency-Key': crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`,
+  };
+  const send = (body) => fetch(API.publish, { method: 'POST', headers, body: JSON.stringify(body) })
+    .catch(() => fetch(API.publish, { method: 'POST', headers, body: JSON.stringify(body) }));
+  const res = await send({ ...payload, background: true });
+  if (res.status === 503) {
+    // Background jobs are disabled on this server
+    const fallback = await send(payload);
+    if (!fallback.ok) throw new Error(await fallback.text());
+    return fallback.json();
+  }
+  if (!res.ok) throw new Error(await res.text());
+  const { status_url } = await res.json();
+  const job = await followJob(`${status_url}/events`);
+  if (job.status === 'done') return { success: true, result: job.result };
+  return { success: false, message: job.error };
+}
+
+function followJob(url){
+  const progress = createProgress();
+  return new Promise((resolve, reject) => {
+    const events = new EventSource(url);
+    const finish = (event) => {
+      events.close();
+      progress.close();
+      const job = JSON.parse(event.data);
+      job.status === 'done' ? resolve(job) : reject(new Error(job.error || 'Publish failed'));
+    };
+    // Sent first on every (re)connect, so progress catches up after a dropped connection
+    events.addEventListener('job', (e) => progress.render(JSON.parse(e.data).parts));
+    events.addEventListener('parts', (e) => progress.render(JSON.parse(e.data).parts));
+    events.addEventListener('part', (e) => progress.update(JSON.parse(e.data)));
+    events.addEventListener('done', finish);
+    events.addEventListener('failed', finish);
+    events.onerror = () => {
+      // EventSource retries by itself unless the server refused the stream
+      if (events.readyState === EventSource.CLOSED) {
+        progress.close();
+        reject(new Error('Lost connection to publish progress'));
+      }
+    };
+  });
+}
+
+function createProgress(){
+  const el = document.createElement('div');
+  el.className = 'notification info progress';
+  el.textContent = 'Publishing...';
+  document.body.appendChild(el);
+  let parts = [];
+  const label = (part) => part.kind === 'album' ? `Album (${part.items} images)` : part.kind === 'photo' ? 'Photo' : 'Text';
+  const draw = () => {
+    const sent = parts.filter(p => p.status === 'sent').length;
+    const lines = parts.map(p => {
+      const mark = p.status === 'sent' ? '✓' : p.status === 'failed' ? '✗' : '…';
+      const latency = p.latency_ms != null ? ` — ${Math.round(p.latency_ms)} ms` : '';
+      return `${mark} ${label(p)}${latency}`;
+    });
+    el.textContent = [`Publishing ${sent}/${parts.length}`, ...lines].join('\n');
+  };
+  return {
+    render(all){ if (all?.length) { parts = all.map(p => ({ ...p })); draw(); } },
+    update(part){ parts[part.index] = { ...parts[part.index], ...part }; draw(); },
+    close(){ el.remove(); },
+  };
+}
+
 function showNotification(message, type = 'info') {
   // Create notification element
   const notification = document.createElement('div');
@@ -474,7 +743,7 @@ function deleteNote(e) {
   }
   
   // Persist changes
-  persistNotes();
+  persistNotes([], [noteId]);
   
   // Re-render
   renderNotes();
@@ -495,6 +764,7 @@ function deleteAllNotes() {
   }
   
   // Clear all notes
+  const deletedIds = state.notes.map(n => n.id);
   state.notes = [];
   state.currentNoteId = null;
   
@@ -503,7 +773,7 @@ function deleteAllNotes() {
   document.getElementById('note-content').innerHTML = '';
   
   // Persist changes
-  persistNotes();
+  persistNotes([], deletedIds);
   
   // Re-render
   renderNotes();
@@ -536,6 +806,12 @@ function bindEvents(){
     }
   });
   // document.getElementById('trash-all').onclick = deleteAllNotes;
+  document.getElementById('note-content').addEventListener('paste', (e) => {
+    const files = [...(e.clipboardData?.files || [])].filter(f => f.type.startsWith('image/'));
+    if (!files.length) return;
+    e.preventDefault();
+    files.forEach(handleImageUpload);
+  });
   document.getElementById('note-content').addEventListener('input', () => {
     const editor = document.getElementById('note-content');
     
@@ -559,6 +835,8 @@ function bindEvents(){
   // });
   // document.querySelector('.upload').onclick = () => document.getElementById('image-input').click();
   document.getElementById('publish').onclick = publishCurrent;
+  // Pick up drafts edited in another tab or browser
+  window.addEventListener('focus', () => { if (drafts.enabled) loadNotes(); });
   document.getElementById('global-search').addEventListener('input', async (e) => {
     state.searchQuery = e.target.value; await loadNotes();
   });